@@ -0,0 +1,4 @@
+from splitEx.asgi import create_asgi_app
+import os
+
+app = create_asgi_app(os.environ.get("CONFIG", "prod"))
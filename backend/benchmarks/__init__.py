@@ -0,0 +1,18 @@
+"""synthetic load generator and benchmark suite for the API.
+
+Seeds a synthetic dataset through create_app("test"), drives every route
+(scenarios.py) and a few side by side comparisons (comparisons.py), and
+reports throughput, p50/p95/p99 latency and SQL statements per request.
+Results can be saved as a baseline and later runs compared against it.
+
+    cd backend
+    python -m benchmarks                                  # test client, sqlite file
+    python -m benchmarks --users 500 --expenses 20000 --iterations 200
+    python -m benchmarks --http --threads 8               # real http server, 8 client threads
+    python -m benchmarks --save-baseline bench.json
+    python -m benchmarks --baseline bench.json            # exits 1 on a regression
+    python -m benchmarks --only expenses. --only participants.
+
+--database points it at another database (an empty one, e.g. a scratch
+postgres), the default is a throwaway sqlite file.
+"""
@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from splitEx import create_app
+from splitEx.asgi import AsgiApp
+from splitEx.models import db
+
+from .comparisons import COMPARISONS
+from .runner import AsgiClient, HttpClient, TestClient, compare, format_table, run_scenario, simulate_db_latency
+from .scenarios import SCENARIOS
+from .seed import seed
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmark the splitEx API.')
+    parser.add_argument('--database', help='database url, an empty database (default: a temporary sqlite file)')
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--expenses', type=int, default=5000)
+    parser.add_argument('--groups', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the dataset and the scenarios')
+    parser.add_argument('--iterations', type=int, default=50, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='untimed requests per scenario')
+    parser.add_argument('--http', action='store_true', help='go through a real http server instead of the test client')
+    parser.add_argument('--asgi', choices=['async', 'sync'],
+                        help='go through uvicorn serving asgi.py; sync keeps the async routes on their sync views')
+    parser.add_argument('--db-latency-ms', type=float, default=0,
+                        help='simulated database round trip per statement (sqlite), to see concurrency under I/O wait')
+    parser.add_argument('--pool-size', type=int, help='connection pool size of the sync and async engines')
+    parser.add_argument('--threads', type=int, default=1, help='client threads per scenario')
+    parser.add_argument('--only', action='append', default=[], metavar='PREFIX', help='scenarios starting with PREFIX')
+    parser.add_argument('--read-only', action='store_true', help='skip scenarios that write')
+    parser.add_argument('--no-comparisons', action='store_true', help='skip the side by side comparisons')
+    parser.add_argument('--baseline', help='compare against this saved result, exit 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed p95 slowdown against the baseline (0.5 = 50%%), query counts must not grow at all')
+    parser.add_argument('--save-baseline', metavar='PATH', help='save the results as a baseline')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='splitex-bench-'), 'bench.db')
+
+    latency = simulate_db_latency()
+    pool_overrides = {}
+    if args.pool_size:
+        pool = {'pool_size': args.pool_size, 'max_overflow': 0}
+        pool_overrides = {'SQLALCHEMY_ENGINE_OPTIONS': pool, 'ASYNC_ENGINE_OPTIONS': pool}
+    app = create_app('test', {
+        'SQLALCHEMY_DATABASE_URI': database,
+        'SERVER_TIMING_ENABLED': True,      # query counts come from it
+        'SLOW_QUERY_THRESHOLD_MS': None,
+        'ASYNC_DB_ENABLED': bool(args.asgi),
+        **pool_overrides,
+    })
+    with app.app_context():
+        dataset = seed(users=args.users, expenses=args.expenses, groups=args.groups, seed=args.seed)
+        db.session.remove()
+    latency.seconds = args.db_latency_ms / 1000
+    mode = f'asgi_{args.asgi}' if args.asgi else 'http' if args.http else 'test_client'
+    meta = {
+        'users': args.users, 'expenses': dataset.expense_count, 'participants': dataset.participant_count,
+        'groups': args.groups, 'mode': mode, 'threads': args.threads,
+        'database': database.split(':', 1)[0], 'db_latency_ms': args.db_latency_ms, 'pool_size': args.pool_size,
+    }
+    print(f'seeded {meta["users"]} users, {meta["expenses"]} expenses, {meta["participants"]} participants, '
+          f'{meta["groups"]} groups ({meta["database"]}, {meta["mode"]}, {args.threads} thread(s))', file=sys.stderr)
+
+    scenarios = [
+        scenario for scenario in SCENARIOS
+        if (not args.only or any(scenario.name.startswith(prefix) for prefix in args.only))
+        and not (args.read_only and scenario.writes)
+    ]
+
+    if args.asgi:
+        client = AsgiClient(AsgiApp(app, async_views={} if args.asgi == 'sync' else None))
+    else:
+        client = HttpClient(app) if args.http else TestClient(app)
+    results = {}
+    try:
+        for scenario in scenarios:
+            results[scenario.name] = run_scenario(
+                client, dataset, scenario, args.iterations, args.threads, args.warmup, args.seed
+            )
+        if not args.no_comparisons and not args.only:
+            for run_comparison in COMPARISONS:
+                results.update(run_comparison(app, client, dataset, args.iterations, args.threads))
+    finally:
+        client.close()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            saved = json.load(f)
+        if saved.get('meta') != meta:
+            print(f'warning: baseline was recorded with {saved.get("meta")}', file=sys.stderr)
+        baseline = saved['results']
+
+    print(format_table(results, baseline))
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'meta': meta, 'results': {name: stats.to_dict() for name, stats in results.items()}}, f, indent=2)
+        print(f'baseline saved to {args.save_baseline}', file=sys.stderr)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""side by side measurements of two ways of doing the same thing.
+
+Each comparison returns {name: Stats} entries that go into the report (and
+the baseline) next to the route scenarios:
+
+- inserting expenses one request at a time vs one /bulk request
+- a login storm: many clients logging in at once against the password pool
+- p99 of non-auth reads on their own, during a login storm with hashing
+  inline on the request threads, and during one with the password pool
+- serializing a heavy user's feed: stdlib json vs the configured provider vs columns
+- a monthly report from /api/reports vs downloading the feed and adding it up
+"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from splitEx.models import db
+from splitEx.models.expense import Expense, ExpenseParticipant
+from splitEx.passwords import PasswordPool
+from splitEx.routes.expense_routes import expense_load_options
+from splitEx.serializers import expenses_to_columns, expenses_to_dicts
+
+from .runner import summarize
+from .seed import PASSWORD
+
+COMPARISONS = []
+
+
+def comparison(fn):
+    COMPARISONS.append(fn)
+    return fn
+
+
+def _timed(client, dataset, user_id, method, path, body=None):
+    start = time.perf_counter()
+    response = client.request(method, path, dataset.headers(user_id) if user_id else {}, body)
+    return time.perf_counter() - start, response
+
+
+@comparison
+def insert_single_vs_bulk(app, client, dataset, iterations, threads, batch=50):
+    """`batch` expenses shared with 3 friends: create + 3 adds each, vs one bulk request"""
+    payer = dataset.heavy_user()
+    friends = [dataset.username(friend) for friend in dataset.circle(payer)[:3]]
+    rounds = max(3, iterations // batch)
+
+    single, single_queries, single_errors = [], [], 0
+    for _ in range(rounds):
+        start, queries = time.perf_counter(), 0
+        for i in range(batch):
+            _, response = _timed(client, dataset, payer, 'POST', '/api/expenses/', {'title': f'single {i}', 'total_amount': 900})
+            queries += response.queries
+            single_errors += response.status >= 400
+            for username in friends:
+                _, added = _timed(client, dataset, payer, 'POST', f'/api/participants/{response.json()["expense_id"]}/add',
+                                  {'username': username})
+                queries += added.queries
+                single_errors += added.status >= 400
+        single.append(time.perf_counter() - start)
+        single_queries.append(queries)
+
+    bulk, bulk_queries, bulk_errors = [], [], 0
+    body = {'expenses': [{'title': f'bulk {i}', 'total_amount': 900, 'participants': friends} for i in range(batch)]}
+    for _ in range(rounds):
+        elapsed, response = _timed(client, dataset, payer, 'POST', '/api/expenses/bulk', body)
+        bulk.append(elapsed)
+        bulk_queries.append(response.queries)
+        bulk_errors += response.status >= 400
+
+    return {
+        f'compare.insert_{batch}.single_requests': summarize(single, single_queries, single_errors, sum(single)),
+        f'compare.insert_{batch}.bulk_request': summarize(bulk, bulk_queries, bulk_errors, sum(bulk)),
+    }
+
+
+@comparison
+def login_storm(app, client, dataset, iterations, threads, clients=16):
+    """`clients` threads logging in at the same time; 429s (pool saturated) count as errors"""
+    per_client = max(1, iterations // clients)
+    latencies, queries = [], []
+    errors = 0
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def login(i):
+        nonlocal errors
+        barrier.wait()
+        for k in range(per_client):
+            email = dataset.emails[(i * per_client + k) % len(dataset.emails)]
+            elapsed, response = _timed(client, dataset, None, 'POST', '/api/auth/login', {'email': email, 'password': PASSWORD})
+            with lock:
+                latencies.append(elapsed)
+                queries.append(response.queries)
+                errors += response.status >= 400
+
+    workers = [threading.Thread(target=login, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return {f'compare.login_storm_{clients}_clients': summarize(latencies, queries, errors, time.perf_counter() - start)}
+
+
+def _reads_during(client, dataset, iterations, storm_clients):
+    """stats of `iterations` feed page reads while `storm_clients` threads keep logging in"""
+    stop = threading.Event()
+
+    def storm(i):
+        k = 0
+        while not stop.is_set():
+            email = dataset.emails[(i * 7919 + k) % len(dataset.emails)]
+            _timed(client, dataset, None, 'POST', '/api/auth/login', {'email': email, 'password': PASSWORD})
+            k += 1
+
+    stormers = [threading.Thread(target=storm, args=(i,)) for i in range(storm_clients)]
+    for thread in stormers:
+        thread.start()
+    try:
+        time.sleep(0.2 if storm_clients else 0)
+        latencies, queries, errors = [], [], 0
+        start = time.perf_counter()
+        for i in range(iterations):
+            user_id = dataset.user_ids[i % len(dataset.user_ids)]
+            elapsed, response = _timed(client, dataset, user_id, 'GET', '/api/expenses/page?limit=20')
+            latencies.append(elapsed)
+            queries.append(response.queries)
+            errors += response.status >= 400
+        return summarize(latencies, queries, errors, time.perf_counter() - start)
+    finally:
+        stop.set()
+        for thread in stormers:
+            thread.join()
+
+
+@comparison
+def reads_during_login_storm(app, client, dataset, iterations, threads, clients=16, workers=2, queue_depth=8):
+    """feed page p99 alone, then next to `clients` threads logging in, hashing inline vs on the pool"""
+    configured = app.extensions['password_pool']
+    name = f'compare.storm_reads_{clients}'
+    results = {f'{name}.quiet': _reads_during(client, dataset, iterations, 0)}
+    try:
+        app.extensions['password_pool'] = PasswordPool(0, 0, None)
+        results[f'{name}.inline'] = _reads_during(client, dataset, iterations, clients)
+
+        pool = app.extensions['password_pool'] = PasswordPool(workers, queue_depth, 10)
+        try:
+            results[f'{name}.pooled'] = _reads_during(client, dataset, iterations, clients)
+        finally:
+            pool.shutdown()
+    finally:
+        app.extensions['password_pool'] = configured
+    return results
+
+
+@comparison
+def serializers(app, client, dataset, iterations, threads):
+    """encode the heaviest user's whole feed, in process (no request, no sql)"""
+    results = {}
+    with app.app_context():
+        expenses = db.session.query(Expense).join(Expense.participants).filter(
+            ExpenseParticipant.user_id == dataset.heavy_user()
+        ).options(*expense_load_options()).all()
+
+        encoders = {
+            'stdlib_json': lambda: json.dumps(expenses_to_dicts(expenses)),
+            'app_json': lambda: app.json.dumps(expenses_to_dicts(expenses)),
+            'app_json_columns': lambda: app.json.dumps(expenses_to_columns(expenses)),
+        }
+        rounds = max(5, iterations // 10)
+        for name, encode in encoders.items():
+            timings = []
+            for _ in range(rounds):
+                start = time.perf_counter()
+                encode()
+                timings.append(time.perf_counter() - start)
+            results[f'compare.serialize_{len(expenses)}.{name}'] = summarize(timings, [0], 0, sum(timings))
+        db.session.remove()
+    return results
+
+
+@comparison
+def report_vs_client_side(app, client, dataset, iterations, threads):
+    """totals per month, grouped in sql (uncached: a new range each time) vs aggregated by the client"""
+    user_id = dataset.heavy_user()
+    rounds = max(3, iterations // 10)
+
+    report, report_queries, report_errors = [], [], 0
+    for i in range(rounds):
+        since = (date.today() - timedelta(days=3650 + i)).isoformat()
+        elapsed, response = _timed(client, dataset, user_id, 'GET', f'/api/reports/?by=month&since={since}')
+        report.append(elapsed)
+        report_queries.append(response.queries)
+        report_errors += response.status >= 400
+
+    client_side, client_queries, client_errors = [], [], 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        _, response = _timed(client, dataset, user_id, 'GET', '/api/expenses/')
+        totals = defaultdict(int)
+        for expense in response.json():
+            totals[expense['date'][:7]] += expense['total_amount']
+        client_side.append(time.perf_counter() - start)
+        client_queries.append(response.queries)
+        client_errors += response.status >= 400
+
+    return {
+        'compare.monthly_totals.sql_report': summarize(report, report_queries, report_errors, sum(report)),
+        'compare.monthly_totals.client_side': summarize(client_side, client_queries, client_errors, sum(client_side)),
+    }
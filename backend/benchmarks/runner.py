@@ -0,0 +1,258 @@
+"""drive scenarios through a client and summarize the timings.
+
+Three clients: the flask test client (in process, no sockets, stable numbers
+for comparing changes), an http client against a threaded werkzeug server,
+and the same http client against uvicorn serving the ASGI app (asgi.py), both
+driven from several threads at once for throughput under concurrency. SQL
+statements per request come from the Server-Timing header the
+instrumentation adds, so they are counted the same way in all of them;
+streamed responses (the export) send their headers before running any
+query and show up with 0.
+"""
+
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import asdict, dataclass
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.util import await_only
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+@dataclass
+class Response:
+    status: int
+    body: bytes
+    queries: int
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def _queries(server_timing):
+    match = SERVER_TIMING_QUERIES.search(server_timing or '')
+    return int(match.group(1)) if match else 0
+
+
+class TestClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, headers, body):
+        response = self.client.open(path, method=method, headers=headers, json=body)
+        return Response(response.status_code, response.get_data(), _queries(response.headers.get('Server-Timing')))
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class HttpClient:
+    """urllib against a werkzeug server running the app in a background thread"""
+
+    def __init__(self, app, host='127.0.0.1', port=0):
+        self.server = make_server(host, port, app, threaded=True, request_handler=_QuietHandler)
+        self.base_url = f'http://{host}:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def request(self, method, path, headers, body):
+        data = None
+        headers = dict(headers)
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return Response(response.status, response.read(), _queries(response.headers.get('Server-Timing')))
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.read(), _queries(e.headers.get('Server-Timing')))
+
+    def close(self):
+        self.server.shutdown()
+
+
+class AsgiClient(HttpClient):
+    """urllib against uvicorn running `asgi_app` in a background thread"""
+
+    def __init__(self, asgi_app, host='127.0.0.1'):
+        import socket
+        import uvicorn
+
+        self.socket = socket.socket()
+        self.socket.bind((host, 0))
+        self.base_url = f'http://{host}:{self.socket.getsockname()[1]}'
+        self.server = uvicorn.Server(uvicorn.Config(
+            asgi_app, log_level='warning', access_log=False, backlog=1024, lifespan='on'
+        ))
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [self.socket]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def close(self):
+        self.server.should_exit = True
+        self.thread.join()
+        self.socket.close()
+
+
+class simulate_db_latency:
+    """sleep `seconds` (0 until set) at the start of every sqlite statement, on
+    the thread running it: the request thread for sync engines, aiosqlite's
+    own thread for async ones, like waiting on a database server would
+    """
+
+    def __init__(self):
+        self.seconds = 0
+        event.listen(Engine, 'connect', self.on_connect)
+
+    def trace(self, statement):
+        if self.seconds:
+            time.sleep(self.seconds)
+
+    def on_connect(self, dbapi_connection, connection_record):
+        if isinstance(dbapi_connection, sqlite3.Connection):
+            dbapi_connection.set_trace_callback(self.trace)
+        elif hasattr(dbapi_connection, 'driver_connection'):
+            # aiosqlite: set it from the connection's thread
+            driver_connection = dbapi_connection.driver_connection
+            await_only(driver_connection._execute(driver_connection._conn.set_trace_callback, self.trace))
+
+
+class Context:
+    """what a scenario sees: the dataset, a random generator and untimed setup requests"""
+
+    def __init__(self, client, dataset, rng):
+        self.client = client
+        self.dataset = dataset
+        self.rng = rng
+
+    def headers(self, user_id):
+        return self.dataset.headers(user_id) if user_id else {}
+
+    def setup(self, method, path, user_id, body=None):
+        response = self.client.request(method, path, self.headers(user_id), body)
+        if response.status >= 400:
+            raise RuntimeError(f'setup {method} {path} failed with {response.status}: {response.body[:200]!r}')
+        return response.json()
+
+
+@dataclass
+class Stats:
+    count: int
+    errors: int
+    throughput: float   # requests per second
+    p50: float          # milliseconds
+    p95: float
+    p99: float
+    queries: float      # mean SQL statements per request
+    max_queries: int
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def percentile(sorted_values, fraction):
+    """nearest rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, queries, errors, wall_seconds) -> Stats:
+    latencies = sorted(latencies)
+    return Stats(
+        count=len(latencies),
+        errors=errors,
+        throughput=len(latencies) / wall_seconds if wall_seconds else 0.0,
+        p50=percentile(latencies, 0.50) * 1000,
+        p95=percentile(latencies, 0.95) * 1000,
+        p99=percentile(latencies, 0.99) * 1000,
+        queries=sum(queries) / len(queries) if queries else 0.0,
+        max_queries=max(queries, default=0),
+    )
+
+
+def run_scenario(client, dataset, scenario, iterations, threads=1, warmup=3, seed=0) -> Stats:
+    """time `iterations` requests of the scenario, split over `threads` threads"""
+    latencies, queries = [], []
+    errors = 0
+    lock = threading.Lock()
+
+    def worker(worker_seed, count, record):
+        nonlocal errors
+        ctx = Context(client, dataset, random.Random(worker_seed))
+        for _ in range(count):
+            request = scenario.build(ctx)
+            start = time.perf_counter()
+            response = client.request(request.method, request.path, ctx.headers(request.user_id), request.json)
+            elapsed = time.perf_counter() - start
+            if not record:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                queries.append(response.queries)
+                if response.status >= 400:
+                    errors += 1
+
+    worker(seed, warmup, record=False)
+
+    per_thread = [iterations // threads + (1 if i < iterations % threads else 0) for i in range(threads)]
+    workers = [
+        threading.Thread(target=worker, args=(seed * 1000 + i + 1, count, True))
+        for i, count in enumerate(per_thread)
+    ]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return summarize(latencies, queries, errors, time.perf_counter() - start)
+
+
+def compare(results, baseline, tolerance) -> list[str]:
+    """regressions of `results` against `baseline` ({name: stats dict}).
+
+    latency regresses when p95 is more than `tolerance` (fraction) slower,
+    query counts and errors whenever they go up
+    """
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if stats.p95 > before['p95'] * (1 + tolerance):
+            regressions.append(f'{name}: p95 {before["p95"]:.2f}ms -> {stats.p95:.2f}ms')
+        if stats.queries > before['queries'] + 0.5:
+            regressions.append(f'{name}: queries {before["queries"]:.1f} -> {stats.queries:.1f}')
+        if stats.errors > before['errors']:
+            regressions.append(f'{name}: errors {before["errors"]} -> {stats.errors}')
+    return regressions
+
+
+def format_table(results, baseline=None) -> str:
+    header = f'{"scenario":<40} {"n":>5} {"err":>4} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8}'
+    lines = [header, '-' * len(header)]
+    for name, stats in results.items():
+        line = (f'{name:<40} {stats.count:>5} {stats.errors:>4} {stats.throughput:>9.1f} '
+                f'{stats.p50:>9.2f} {stats.p95:>9.2f} {stats.p99:>9.2f} {stats.queries:>8.1f}')
+        before = (baseline or {}).get(name)
+        if before and before['p95']:
+            line += f'  p95 {(stats.p95 / before["p95"] - 1) * 100:+.0f}%'
+        lines.append(line)
+    return '\n'.join(lines)
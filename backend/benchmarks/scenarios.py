@@ -0,0 +1,291 @@
+"""one scenario per route.
+
+A scenario builds the request to time from the dataset and a random
+generator. Requests needing state of their own (an expense to delete, a
+participant to remove) create it first through `ctx.setup`, which goes
+through the same client but isn't timed.
+"""
+
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from .seed import PASSWORD
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    user_id: Optional[uuid.UUID] = None     # sends that user's token
+    json: object = None
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable     # (ctx) -> Request
+    writes: bool = False
+
+
+SCENARIOS = []
+
+
+def scenario(name, writes=False):
+    def register(build):
+        SCENARIOS.append(Scenario(name, build, writes))
+        return build
+    return register
+
+
+def _payer_with_expenses(ctx):
+    return ctx.rng.choice(list(ctx.dataset.expense_ids))
+
+
+def _own_expense(ctx):
+    payer = _payer_with_expenses(ctx)
+    return payer, ctx.rng.choice(ctx.dataset.expense_ids[payer])
+
+
+def _fresh_expense(ctx, participants=1):
+    """(payer, expense id, friend usernames) of a new expense shared with `participants` friends"""
+    payer = ctx.rng.choice(ctx.dataset.user_ids)
+    expense_id = ctx.setup('POST', '/api/expenses/', payer, {'title': 'bench', 'total_amount': 1000})['expense_id']
+    friends = [ctx.dataset.username(friend) for friend in ctx.rng.sample(ctx.dataset.circle(payer), participants)]
+    for username in friends:
+        ctx.setup('POST', f'/api/participants/{expense_id}/add', payer, {'username': username})
+    return payer, expense_id, friends
+
+
+def _member_group(ctx):
+    group_id = ctx.rng.choice(list(ctx.dataset.group_members))
+    return ctx.rng.choice(ctx.dataset.group_members[group_id]), group_id
+
+
+# auth
+
+@scenario('auth.register', writes=True)
+def register(ctx):
+    name = f'new{uuid.uuid4().hex[:12]}'
+    return Request('POST', '/api/auth/register', json={
+        'username': name, 'email': f'{name}@bench.example', 'password': PASSWORD
+    })
+
+
+@scenario('auth.login')
+def login(ctx):
+    return Request('POST', '/api/auth/login', json={'email': ctx.rng.choice(ctx.dataset.emails), 'password': PASSWORD})
+
+
+@scenario('auth.current_user')
+def current_user(ctx):
+    return Request('GET', '/api/auth/u', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+# expenses
+
+@scenario('expenses.create', writes=True)
+def create_expense(ctx):
+    return Request('POST', '/api/expenses/', ctx.rng.choice(ctx.dataset.user_ids), {
+        'title': 'bench', 'total_amount': ctx.rng.randint(100, 10000)
+    })
+
+
+@scenario('expenses.create_in_group', writes=True)
+def create_group_expense(ctx):
+    user_id, group_id = _member_group(ctx)
+    return Request('POST', '/api/expenses/', user_id, {
+        'title': 'bench', 'total_amount': ctx.rng.randint(100, 10000), 'group_id': str(group_id)
+    })
+
+
+@scenario('expenses.bulk_20', writes=True)
+def bulk_expenses(ctx):
+    payer = ctx.rng.choice(ctx.dataset.user_ids)
+    friends = [ctx.dataset.username(friend) for friend in ctx.dataset.circle(payer)[:3]]
+    return Request('POST', '/api/expenses/bulk', payer, {'expenses': [
+        {'title': f'bulk {i}', 'total_amount': 900, 'participants': friends} for i in range(20)
+    ]})
+
+
+@scenario('expenses.feed')
+def feed(ctx):
+    return Request('GET', '/api/expenses/', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('expenses.feed_heavy_user')
+def feed_heavy_user(ctx):
+    return Request('GET', '/api/expenses/', ctx.dataset.heavy_user())
+
+
+@scenario('expenses.page')
+def page(ctx):
+    return Request('GET', '/api/expenses/page?limit=50', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('expenses.page_columns')
+def page_columns(ctx):
+    return Request('GET', '/api/expenses/page?limit=50&format=columns&fields=id,title,total_amount,date',
+                   ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('expenses.changes')
+def changes(ctx):
+    return Request('GET', '/api/expenses/changes?since=0', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('expenses.export')
+def export(ctx):
+    return Request('GET', '/api/expenses/export', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('expenses.details')
+def details(ctx):
+    payer, expense_id = _own_expense(ctx)
+    return Request('GET', f'/api/expenses/{expense_id}', payer)
+
+
+@scenario('expenses.batch_20')
+def batch(ctx):
+    payer = _payer_with_expenses(ctx)
+    expense_ids = ctx.dataset.expense_ids[payer]
+    chosen = ctx.rng.sample(expense_ids, min(20, len(expense_ids)))
+    return Request('GET', f'/api/expenses/batch?ids={",".join(str(expense_id) for expense_id in chosen)}', payer)
+
+
+@scenario('expenses.update', writes=True)
+def update_expense(ctx):
+    payer, expense_id = _own_expense(ctx)
+    return Request('PUT', f'/api/expenses/{expense_id}', payer, {'title': f'renamed {ctx.rng.random():.6f}'})
+
+
+@scenario('expenses.delete', writes=True)
+def delete_expense(ctx):
+    payer, expense_id, _ = _fresh_expense(ctx)
+    return Request('DELETE', f'/api/expenses/{expense_id}', payer)
+
+
+# participants
+
+@scenario('participants.list')
+def participants(ctx):
+    payer, expense_id = _own_expense(ctx)
+    return Request('GET', f'/api/participants/{expense_id}/participants', payer)
+
+
+@scenario('participants.add', writes=True)
+def add_participant(ctx):
+    payer, expense_id, _ = _fresh_expense(ctx, participants=0)
+    return Request('POST', f'/api/participants/{expense_id}/add', payer,
+                   {'username': ctx.dataset.username(ctx.rng.choice(ctx.dataset.circle(payer)))})
+
+
+@scenario('participants.update', writes=True)
+def update_participant(ctx):
+    payer, expense_id, friends = _fresh_expense(ctx)
+    return Request('PUT', f'/api/participants/{expense_id}/update/{friends[0]}', payer, {'item': 'snacks'})
+
+
+@scenario('participants.split_weighted', writes=True)
+def split(ctx):
+    payer, expense_id, friends = _fresh_expense(ctx, participants=3)
+    weights = {username: ctx.rng.randint(1, 5) for username in [ctx.dataset.username(payer)] + friends}
+    return Request('POST', f'/api/participants/{expense_id}/split', payer, {'method': 'weighted', 'weights': weights})
+
+
+@scenario('participants.remove', writes=True)
+def remove_participant(ctx):
+    payer, expense_id, friends = _fresh_expense(ctx)
+    return Request('DELETE', f'/api/participants/{expense_id}/remove/{friends[0]}', payer)
+
+
+@scenario('participants.search')
+def search(ctx):
+    user_id = ctx.rng.choice(ctx.dataset.user_ids)
+    prefix = ctx.dataset.username(ctx.rng.choice(ctx.dataset.user_ids))[:ctx.rng.randint(1, 4)]
+    return Request('GET', f'/api/participants/search?q={prefix}', user_id)
+
+
+# balances
+
+@scenario('balances.all')
+def balances(ctx):
+    return Request('GET', '/api/balances/', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('balances.settle')
+def settle(ctx):
+    return Request('GET', '/api/balances/settle', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('balances.with_user')
+def balance_with(ctx):
+    user_id = ctx.rng.choice(ctx.dataset.user_ids)
+    return Request('GET', f'/api/balances/{ctx.dataset.username(ctx.dataset.circle(user_id)[0])}', user_id)
+
+
+# groups
+
+@scenario('groups.create', writes=True)
+def create_group(ctx):
+    owner = ctx.rng.choice(ctx.dataset.user_ids)
+    return Request('POST', '/api/groups/', owner, {
+        'name': 'bench', 'members': [ctx.dataset.username(friend) for friend in ctx.dataset.circle(owner)[:4]]
+    })
+
+
+@scenario('groups.list')
+def groups(ctx):
+    return Request('GET', '/api/groups/', _member_group(ctx)[0])
+
+
+@scenario('groups.details')
+def group(ctx):
+    user_id, group_id = _member_group(ctx)
+    return Request('GET', f'/api/groups/{group_id}', user_id)
+
+
+@scenario('groups.add_member', writes=True)
+def add_member(ctx):
+    owner = ctx.rng.choice(ctx.dataset.user_ids)
+    group_id = ctx.setup('POST', '/api/groups/', owner, {'name': 'bench'})['group_id']
+    return Request('POST', f'/api/groups/{group_id}/members', owner,
+                   {'username': ctx.dataset.username(ctx.dataset.circle(owner)[0])})
+
+
+@scenario('groups.remove_member', writes=True)
+def remove_member(ctx):
+    owner = ctx.rng.choice(ctx.dataset.user_ids)
+    friend = ctx.dataset.username(ctx.dataset.circle(owner)[0])
+    group_id = ctx.setup('POST', '/api/groups/', owner, {'name': 'bench', 'members': [friend]})['group_id']
+    return Request('DELETE', f'/api/groups/{group_id}/members/{friend}', owner)
+
+
+@scenario('groups.expenses')
+def group_expenses(ctx):
+    user_id, group_id = _member_group(ctx)
+    return Request('GET', f'/api/groups/{group_id}/expenses?limit=50', user_id)
+
+
+@scenario('groups.summary')
+def group_summary(ctx):
+    user_id, group_id = _member_group(ctx)
+    return Request('GET', f'/api/groups/{group_id}/summary', user_id)
+
+
+@scenario('groups.balances')
+def group_balances(ctx):
+    user_id, group_id = _member_group(ctx)
+    return Request('GET', f'/api/groups/{group_id}/balances', user_id)
+
+
+# reports
+
+@scenario('reports.by_month')
+def report_by_month(ctx):
+    return Request('GET', '/api/reports/?by=month', ctx.rng.choice(ctx.dataset.user_ids))
+
+
+@scenario('reports.by_payer')
+def report_by_payer(ctx):
+    return Request('GET', '/api/reports/?by=payer', ctx.rng.choice(ctx.dataset.user_ids))
@@ -0,0 +1,134 @@
+"""synthetic dataset for the benchmarks, written with bulk inserts.
+
+Users belong to friend circles (neighbours in user order) and expenses are
+shared within the payer's circle, with a skewed fan-out: mostly 2-4 people,
+sometimes a dozen. Payers are zipf-ish distributed, so a few users have far
+more expenses than the rest, like real heavy users. A share of the expenses
+belongs to groups and involves every member of the group.
+"""
+
+import random
+import uuid
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+from flask_jwt_extended import create_access_token
+from sqlalchemy import insert
+
+from splitEx.ledger import rebuild_balances
+from splitEx.models import db
+from splitEx.models.expense import Expense, ExpenseParticipant, SplitMethod
+from splitEx.models.group import Group, GroupMember
+from splitEx.models.user import User
+from splitEx.passwords import hash_password
+from splitEx.splits import equal_split
+
+PASSWORD = 'Bench1234'
+
+# participants per expense (payer included) -> relative frequency
+FANOUT_WEIGHTS = {1: 5, 2: 30, 3: 25, 4: 20, 5: 10, 6: 5, 8: 3, 12: 2}
+
+CIRCLE_SIZE = 15
+GROUP_SIZES = (3, 10)
+HISTORY_DAYS = 730
+INSERT_CHUNK = 5000
+
+
+@dataclass
+class Dataset:
+    user_ids: list
+    usernames: list
+    emails: list
+    tokens: dict = field(default_factory=dict)          # user id -> access token
+    expense_ids: dict = field(default_factory=dict)     # payer id -> ids of the expenses they paid
+    group_members: dict = field(default_factory=dict)   # group id -> member ids
+    expense_count: int = 0
+    participant_count: int = 0
+
+    def headers(self, user_id):
+        return {'Authorization': f'Bearer {self.tokens[user_id]}'}
+
+    def username(self, user_id):
+        return self.usernames[self.user_ids.index(user_id)]
+
+    def circle(self, user_id):
+        """the user's friends, the people expenses are shared with"""
+        i = self.user_ids.index(user_id)
+        return [self.user_ids[(i + k) % len(self.user_ids)] for k in range(1, CIRCLE_SIZE + 1)]
+
+    def heavy_user(self):
+        """the user paying for the most expenses"""
+        return max(self.expense_ids, key=lambda user_id: len(self.expense_ids[user_id]))
+
+
+def _insert(model, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(insert(model), rows[start:start + INSERT_CHUNK])
+
+
+def seed(users=200, expenses=5000, groups=20, group_share=0.3, seed=0) -> Dataset:
+    """insert the dataset into the current app's (empty) database"""
+    rng = random.Random(seed)
+    password_hash = hash_password(PASSWORD)   # one scrypt run shared by everyone
+
+    user_ids = [uuid.uuid4() for _ in range(users)]
+    usernames = [f'bench{i}' for i in range(users)]
+    emails = [f'bench{i}@bench.example' for i in range(users)]
+    _insert(User, [{
+        'id': user_id, 'username': username, 'name': username, 'email': email,
+        'password_hash': password_hash, 'created_at': datetime.utcnow(),
+    } for user_id, username, email in zip(user_ids, usernames, emails)])
+
+    dataset = Dataset(user_ids, usernames, emails)
+
+    group_rows, member_rows = [], []
+    for i in range(groups):
+        owner = rng.choice(user_ids)
+        members = [owner] + rng.sample(dataset.circle(owner), rng.randint(*GROUP_SIZES) - 1)
+        group_id = uuid.uuid4()
+        group_rows.append({'id': group_id, 'name': f'group {i}', 'created_by': owner, 'created_at': datetime.utcnow()})
+        member_rows += [{'group_id': group_id, 'user_id': member, 'joined_at': datetime.utcnow()} for member in members]
+        dataset.group_members[group_id] = members
+    _insert(Group, group_rows)
+    _insert(GroupMember, member_rows)
+
+    payer_weights = [1 / (rank + 1) ** 0.8 for rank in range(users)]
+    fanouts, fanout_weights = zip(*FANOUT_WEIGHTS.items())
+    group_ids = list(dataset.group_members)
+    today = date.today()
+
+    expense_rows, participant_rows = [], []
+    for i in range(expenses):
+        expense_id = uuid.uuid4()
+        group_id = rng.choice(group_ids) if group_ids and rng.random() < group_share else None
+        if group_id:
+            members = dataset.group_members[group_id]
+            payer = rng.choice(members)
+            others = [member for member in members if member != payer]
+        else:
+            payer = rng.choices(user_ids, payer_weights)[0]
+            others = rng.sample(dataset.circle(payer), min(rng.choices(fanouts, fanout_weights)[0], CIRCLE_SIZE + 1) - 1)
+
+        total = rng.randint(100, 50000)
+        expense_rows.append({
+            'id': expense_id, 'title': f'expense {i}', 'total_amount': total,
+            'split_method': SplitMethod.EQUAL, 'payer_id': payer, 'group_id': group_id,
+            'date': today - timedelta(days=rng.randrange(HISTORY_DAYS)),
+            'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow(),
+        })
+        # payer first, like create_expense does
+        participant_rows += [{
+            'id': uuid.uuid4(), 'expense_id': expense_id, 'user_id': user_id,
+            'amount': amount, 'created_at': datetime.utcnow(),
+        } for user_id, amount in zip([payer] + others, equal_split(total, len(others) + 1))]
+        dataset.expense_ids.setdefault(payer, []).append(expense_id)
+
+    _insert(Expense, expense_rows)
+    _insert(ExpenseParticipant, participant_rows)
+    db.session.commit()
+    rebuild_balances()
+
+    dataset.expense_count = len(expense_rows)
+    dataset.participant_count = len(participant_rows)
+    dataset.tokens = {user_id: create_access_token(identity=str(user_id)) for user_id in user_ids}
+    return dataset
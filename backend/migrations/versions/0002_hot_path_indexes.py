@@ -0,0 +1,101 @@
+"""hot path indexes
+
+Also the feed index and the balances table, if the database predates them.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 03:44:11.450036
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _delete_duplicate_participants():
+    """keep the oldest row per (expense_id, user_id), so the unique constraint can be added"""
+    conn = op.get_bind()
+    participants = sa.table(
+        'expense_participants',
+        sa.column('id'), sa.column('expense_id'), sa.column('user_id'), sa.column('created_at'),
+    )
+
+    duplicated = conn.execute(
+        sa.select(participants.c.expense_id, participants.c.user_id)
+        .group_by(participants.c.expense_id, participants.c.user_id)
+        .having(sa.func.count() > 1)
+    ).all()
+
+    for expense_id, user_id in duplicated:
+        ids = conn.execute(
+            sa.select(participants.c.id)
+            .where(participants.c.expense_id == expense_id, participants.c.user_id == user_id)
+            .order_by(participants.c.created_at, participants.c.id)
+        ).scalars().all()
+        conn.execute(participants.delete().where(participants.c.id.in_(ids[1:])))
+
+
+def _create_pre_migration_objects():
+    """the feed index and the balances table, unless db.create_all() already made them
+
+    Both were added to the models before the schema moved to migrations, so a
+    database stamped at 0001 may or may not have them.
+    """
+    inspector = sa.inspect(op.get_bind())
+
+    if 'ix_expenses_date_id' not in {index['name'] for index in inspector.get_indexes('expenses')}:
+        with op.batch_alter_table('expenses', schema=None) as batch_op:
+            batch_op.create_index('ix_expenses_date_id', ['date', 'id'], unique=False)
+
+    if not inspector.has_table('balances'):
+        op.create_table('balances',
+        sa.Column('creditor_id', sa.UUID(), nullable=False),
+        sa.Column('debtor_id', sa.UUID(), nullable=False),
+        sa.Column('amount', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['creditor_id'], ['users.id'], ),
+        sa.ForeignKeyConstraint(['debtor_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('creditor_id', 'debtor_id')
+        )
+        with op.batch_alter_table('balances', schema=None) as batch_op:
+            batch_op.create_index('ix_balances_debtor_id', ['debtor_id'], unique=False)
+
+
+def upgrade():
+    _create_pre_migration_objects()
+    _delete_duplicate_participants()
+
+    with op.batch_alter_table('expense_participants', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_participants_user_id', ['user_id'], unique=False)
+        batch_op.create_unique_constraint('uq_expense_participants_expense_id_user_id', ['expense_id', 'user_id'])
+
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.create_index('ix_expenses_payer_id', ['payer_id'], unique=False)
+
+    with op.batch_alter_table('user_expenses', schema=None) as batch_op:
+        batch_op.create_index('ix_user_expenses_expense_id_user_id', ['expense_id', 'user_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_expenses', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_expenses_expense_id_user_id')
+
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.drop_index('ix_expenses_payer_id')
+
+    with op.batch_alter_table('expense_participants', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_expense_participants_expense_id_user_id', type_='unique')
+        batch_op.drop_index('ix_expense_participants_user_id')
+
+    with op.batch_alter_table('balances', schema=None) as batch_op:
+        batch_op.drop_index('ix_balances_debtor_id')
+
+    op.drop_table('balances')
+
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.drop_index('ix_expenses_date_id')
@@ -0,0 +1,80 @@
+"""participation lives on expense_participants only
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:12:37.518204
+
+"""
+from datetime import datetime
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+user_expenses = sa.table(
+    'user_expenses',
+    sa.column('user_id', sa.UUID()), sa.column('expense_id', sa.UUID()),
+)
+participants = sa.table(
+    'expense_participants',
+    sa.column('id', sa.UUID()), sa.column('expense_id', sa.UUID()), sa.column('user_id', sa.UUID()),
+    sa.column('amount', sa.Integer()), sa.column('created_at', sa.DateTime()),
+)
+
+
+def _backfill_participants():
+    """members without a participant row get one owing nothing, so nobody loses access"""
+    conn = op.get_bind()
+    missing = conn.execute(
+        sa.select(user_expenses.c.expense_id, user_expenses.c.user_id).where(~sa.exists().where(
+            participants.c.expense_id == user_expenses.c.expense_id,
+            participants.c.user_id == user_expenses.c.user_id,
+        ))
+    ).all()
+
+    now = datetime.utcnow()
+    rows = [{
+        'id': uuid.uuid4(),
+        'expense_id': expense_id,
+        'user_id': user_id,
+        'amount': 0,
+        'created_at': now,
+    } for expense_id, user_id in missing]
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.execute(participants.insert(), rows[start:start + BATCH_SIZE])
+
+
+def upgrade():
+    _backfill_participants()
+
+    with op.batch_alter_table('user_expenses', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_expenses_expense_id_user_id')
+
+    op.drop_table('user_expenses')
+
+
+def downgrade():
+    op.create_table('user_expenses',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('expense_id', sa.UUID(), nullable=False),
+    sa.ForeignKeyConstraint(['expense_id'], ['expenses.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'expense_id')
+    )
+    with op.batch_alter_table('user_expenses', schema=None) as batch_op:
+        batch_op.create_index('ix_user_expenses_expense_id_user_id', ['expense_id', 'user_id'], unique=False)
+
+    # participants are unique per (expense_id, user_id), a plain copy is enough
+    op.execute(user_expenses.insert().from_select(
+        ['user_id', 'expense_id'],
+        sa.select(participants.c.user_id, participants.c.expense_id),
+    ))
@@ -0,0 +1,70 @@
+"""groups
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 10:05:52.861340
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('groups',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('created_by', sa.UUID(), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('group_members',
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('joined_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('group_id', 'user_id')
+    )
+    with op.batch_alter_table('group_members', schema=None) as batch_op:
+        batch_op.create_index('ix_group_members_user_id', ['user_id'], unique=False)
+
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('group_id', sa.UUID(), nullable=True))
+        batch_op.create_foreign_key('fk_expenses_group_id_groups', 'groups', ['group_id'], ['id'])
+        batch_op.create_index('ix_expenses_group_id_date_id', ['group_id', 'date', 'id'], unique=False)
+        batch_op.create_index(
+            'ix_expenses_group_id_payer_id', ['group_id', 'payer_id', 'total_amount', 'date'], unique=False
+        )
+
+    op.create_table('group_balances',
+    sa.Column('group_id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('group_id', 'user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('group_balances')
+
+    with op.batch_alter_table('expenses', schema=None) as batch_op:
+        batch_op.drop_index('ix_expenses_group_id_payer_id')
+        batch_op.drop_index('ix_expenses_group_id_date_id')
+        batch_op.drop_constraint('fk_expenses_group_id_groups', type_='foreignkey')
+        batch_op.drop_column('group_id')
+
+    with op.batch_alter_table('group_members', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_members_user_id')
+
+    op.drop_table('group_members')
+    op.drop_table('groups')
@@ -0,0 +1,49 @@
+"""expense change feed
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 12:31:06.274418
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('expense_changes',
+    sa.Column('seq', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('expense_id', sa.UUID(), nullable=False),
+    sa.Column('deleted', sa.Boolean(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('seq')
+    )
+    with op.batch_alter_table('expense_changes', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_changes_user_id_seq', ['user_id', 'seq'], unique=False)
+        batch_op.create_index('ix_expense_changes_changed_at', ['changed_at'], unique=False)
+
+    change_counter = op.create_table('change_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('purged_through', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(change_counter, [{'id': 1, 'value': 0, 'purged_through': 0}])
+
+
+def downgrade():
+    op.drop_table('change_counter')
+
+    with op.batch_alter_table('expense_changes', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_changes_changed_at')
+        batch_op.drop_index('ix_expense_changes_user_id_seq')
+
+    op.drop_table('expense_changes')
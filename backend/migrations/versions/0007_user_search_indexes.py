@@ -0,0 +1,38 @@
+"""user search indexes
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 13:02:47.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # byte ordered, so prefix ranges work under any database collation
+        op.create_index('ix_users_username_search', 'users', [sa.text('lower(username) COLLATE "C"')])
+        op.create_index('ix_users_email_search', 'users', [sa.text('lower(email) COLLATE "C"')])
+
+        # infix matches (LIKE '%x%')
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.create_index('ix_users_username_trgm', 'users', [sa.text('lower(username) gin_trgm_ops')],
+                        postgresql_using='gin')
+    else:
+        op.create_index('ix_users_username_search', 'users', [sa.text('lower(username)')])
+        op.create_index('ix_users_email_search', 'users', [sa.text('lower(email)')])
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_users_username_trgm', table_name='users')
+    op.drop_index('ix_users_email_search', table_name='users')
+    op.drop_index('ix_users_username_search', table_name='users')
@@ -0,0 +1,97 @@
+"""binary uuids outside postgres
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 13:40:19.602214
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+# every uuid column, referenced tables first
+UUID_COLUMNS = {
+    'users': ['id'],
+    'groups': ['id', 'created_by'],
+    'expenses': ['id', 'payer_id', 'group_id'],
+    'expense_participants': ['id', 'expense_id', 'user_id'],
+    'balances': ['creditor_id', 'debtor_id'],
+    'group_balances': ['group_id', 'user_id'],
+    'group_members': ['group_id', 'user_id'],
+    'idempotency_keys': ['user_id'],
+    'expense_changes': ['user_id', 'expense_id'],
+}
+
+# expression indexes aren't reflected, so batch mode would drop them with the table copy
+USER_SEARCH_INDEXES = {
+    'ix_users_username_search': 'lower(username)',
+    'ix_users_email_search': 'lower(email)',
+}
+
+
+# sqlite gave the old "UUID" columns numeric affinity, so a hex id made of
+# digits only was stored as a number: an integer keeps every digit, a real
+# (over 2^63) doesn't, those get a new id derived from the stored value, the
+# same in every table referencing it
+LOST_UUID_NAMESPACE = uuid.UUID('5b0c5e2e-7f3a-4d1e-9c62-0a8f1d6e4b17')
+
+
+def _to_blob(value):
+    if value is None or isinstance(value, bytes):
+        return value
+    if isinstance(value, int):
+        return uuid.UUID(f'{value:032d}').bytes
+    if isinstance(value, float):
+        return uuid.uuid5(LOST_UUID_NAMESPACE, repr(value)).bytes
+    return uuid.UUID(value).bytes
+
+
+def _to_hex(value):
+    if value is None or isinstance(value, str):
+        return value
+    return uuid.UUID(bytes=bytes(value)).hex
+
+
+def _convert(function, convert, type_, existing_type):
+    conn = op.get_bind()
+    conn.connection.driver_connection.create_function(function, 1, convert, deterministic=True)
+
+    for index in USER_SEARCH_INDEXES:
+        op.drop_index(index, table_name='users')
+
+    for table, columns in UUID_COLUMNS.items():
+        # values first, in place (sqlite keeps whatever it's given), then the declared types
+        conn.exec_driver_sql(
+            f'UPDATE {table} SET ' + ', '.join(f'{column} = {function}({column})' for column in columns)
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.alter_column(column, type_=type_, existing_type=existing_type)
+
+    for index, expression in USER_SEARCH_INDEXES.items():
+        op.create_index(index, 'users', [sa.text(expression)])
+
+
+def upgrade():
+    # postgres keeps its native uuid columns
+    if op.get_bind().dialect.name == 'postgresql':
+        return
+    _convert('uuid_to_blob', _to_blob, sa.LargeBinary(16), sa.UUID())
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        return
+    # not sa.UUID(): batch mode CASTs the copied values to the new type,
+    # and sqlite gives a "UUID" column numeric affinity, which would turn
+    # hex strings starting with digits into numbers
+    _convert('uuid_to_hex', _to_hex, sa.CHAR(32), sa.LargeBinary(16))
@@ -0,0 +1,57 @@
+"""background jobs
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 14:52:37.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def _guid():
+    # GUID: native uuid on postgres, 16 byte blob elsewhere (0008)
+    if op.get_bind().dialect.name == 'postgresql':
+        return sa.UUID()
+    return sa.LargeBinary(16)
+
+
+def upgrade():
+    op.create_table('jobs',
+    sa.Column('id', _guid(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('user_id', _guid(), nullable=True),
+    sa.Column('payload', sa.Text(), nullable=True),
+    sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'SUCCEEDED', 'FAILED', name='jobstatus'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.create_index('ix_jobs_status_run_at', ['status', 'run_at'], unique=False)
+        batch_op.create_index('ix_jobs_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('jobs', schema=None) as batch_op:
+        batch_op.drop_index('ix_jobs_user_id_created_at')
+        batch_op.drop_index('ix_jobs_status_run_at')
+
+    op.drop_table('jobs')
+    if op.get_bind().dialect.name == 'postgresql':
+        sa.Enum(name='jobstatus').drop(op.get_bind(), checkfirst=True)
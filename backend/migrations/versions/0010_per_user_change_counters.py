@@ -0,0 +1,73 @@
+"""per user change counters
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 16:08:42.530917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def _guid():
+    # GUID: native uuid on postgres, 16 byte blob elsewhere (0008)
+    if op.get_bind().dialect.name == 'postgresql':
+        return sa.UUID()
+    return sa.LargeBinary(16)
+
+
+def upgrade():
+    value, purged_through = op.get_bind().execute(
+        sa.text('SELECT value, purged_through FROM change_counter WHERE id = 1')
+    ).first() or (0, 0)
+
+    op.create_table('change_counters',
+    sa.Column('user_id', _guid(), nullable=False),
+    sa.Column('value', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('purged_through', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # every user continues from the shared counter, so the `since` clients
+    # already hold stays valid (existing seqs grow per user too)
+    op.execute(sa.text(
+        'INSERT INTO change_counters (user_id, value, purged_through) SELECT id, :value, :purged_through FROM users'
+    ).bindparams(value=value, purged_through=purged_through))
+    op.drop_table('change_counter')
+
+    # seqs are unique per user only, the feed index becomes the pk
+    with op.batch_alter_table('expense_changes', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_changes_user_id_seq')
+        if op.get_bind().dialect.name == 'postgresql':
+            batch_op.drop_constraint('expense_changes_pkey', type_='primary')
+        batch_op.create_primary_key('expense_changes_pkey', ['user_id', 'seq'])
+
+
+def downgrade():
+    value, purged_through = op.get_bind().execute(
+        sa.text('SELECT max(value), max(purged_through) FROM change_counters')
+    ).first()
+
+    # per user seqs repeat across users, the feeds start over
+    op.execute(sa.text('DELETE FROM expense_changes'))
+    with op.batch_alter_table('expense_changes', schema=None) as batch_op:
+        if op.get_bind().dialect.name == 'postgresql':
+            batch_op.drop_constraint('expense_changes_pkey', type_='primary')
+        batch_op.create_primary_key('expense_changes_pkey', ['seq'])
+        batch_op.create_index('ix_expense_changes_user_id_seq', ['user_id', 'seq'], unique=False)
+
+    change_counter = op.create_table('change_counter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('purged_through', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(change_counter, [{'id': 1, 'value': value or 0, 'purged_through': value or 0}])
+    op.drop_table('change_counters')
@@ -5,11 +5,24 @@ from .configs import configs_dictionary
 
 from .models import init_app as init_db
 from .routes import init_app as init_routes
+from .ledger import init_app as init_ledger
+from .json_provider import init_app as init_json_provider
+from .instrumentation import init_app as init_instrumentation
+from .identity import init_app as init_identity
+from .response_cache import init_app as init_response_cache
+from .reports import init_app as init_reports
+from .passwords import init_app as init_passwords
+from .idempotency import init_app as init_idempotency
+from .changes import init_app as init_changes
+from .jobs import init_app as init_jobs
+from .async_db import init_app as init_async_db
+from .query_plans import init_app as init_query_plans
 
 
-def create_app(configs_dictionary_key="prod"):
+def create_app(configs_dictionary_key="prod", config_overrides=None):
     app = Flask(__name__)
     app.config.from_object(configs_dictionary[configs_dictionary_key])
+    app.config.update(config_overrides or {})
 
     # cors
     cors = CORS()
@@ -18,10 +31,34 @@ def create_app(configs_dictionary_key="prod"):
     # jwt
     JWTManager(app)
 
+    # fast json encoding, timed by the instrumentation below
+    init_json_provider(app)
+
+    # query count / latency metrics
+    init_instrumentation(app)
+
     # models
     init_db(app)
+    init_async_db(app)
+
+    # cached jwt identity -> user lookup
+    init_identity(app)
+
+    # cached expense payloads / etags, cached reports, change feed
+    init_response_cache(app)
+    init_reports(app)
+    init_changes(app)
+
+    # password hashing pool
+    init_passwords(app)
 
     # routes
     init_routes(app)
 
+    # balances / schema / idempotency key / background job cli
+    init_ledger(app)
+    init_query_plans(app)
+    init_idempotency(app)
+    init_jobs(app)
+
     return app
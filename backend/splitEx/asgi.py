@@ -0,0 +1,147 @@
+"""ASGI entry point: `uvicorn asgi:app` (see backend/asgi.py).
+
+Same app as create_app, with the async database mode switched on. Requests
+for the hot read routes (routes/async_routes.py) are dispatched natively on
+the server's event loop: their queries go through a pooled AsyncSession and
+an in flight request holds no thread while it waits on the database, so
+concurrency grows with I/O wait instead of with threads. Every other route is
+its sync Flask view, run on a pool of ASGI_SYNC_THREADS threads (asgiref's
+WsgiToAsgi alone would run them all on one shared thread). The WSGI entry
+point (run.py) keeps the fully synchronous setup.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+from flask import Flask, request, request_started
+from flask_jwt_extended import verify_jwt_in_request
+from werkzeug.exceptions import HTTPException
+
+from . import create_app
+from .async_db import dispose_async_db
+from .models import db
+from .routes.async_routes import ASYNC_VIEWS
+
+
+class _ThreadedWsgiInstance(WsgiToAsgiInstance):
+    """WsgiToAsgiInstance running the wsgi app on `executor` instead of asgiref's single sync thread"""
+
+    def __init__(self, wsgi_application, executor):
+        super().__init__(wsgi_application)
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].func
+        self.run_wsgi_app = sync_to_async(lambda body: run(self, body), thread_sensitive=False, executor=executor)
+
+
+def _environ(scope, body):
+    instance = WsgiToAsgiInstance(None)
+    instance.scope = scope
+    return instance.build_environ(scope, body)
+
+
+class AsgiApp:
+    def __init__(self, app: Flask, async_views=None):
+        self.app = app
+        self.async_views = ASYNC_VIEWS if async_views is None else async_views
+        self.executor = ThreadPoolExecutor(
+            max_workers=app.config.get('ASGI_SYNC_THREADS', 32), thread_name_prefix='splitex-wsgi'
+        )
+
+    def _async_view(self, scope):
+        """the async view for this request, None if it's a sync route (or no route at all)"""
+        adapter = self.app.url_map.bind_to_environ(
+            _environ(scope, BytesIO()), server_name=self.app.config.get('SERVER_NAME')
+        )
+        try:
+            endpoint, _ = adapter.match()
+        except HTTPException:
+            return None
+        return self.async_views.get(endpoint)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f'Unsupported ASGI scope {scope["type"]}')
+
+        view = self._async_view(scope)
+        if view is None:
+            return await _ThreadedWsgiInstance(self.app, self.executor)(scope, receive, send)
+
+        body = BytesIO()
+        while True:
+            message = await receive()
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        environ = _environ(scope, body)
+
+        ctx = self.app.request_context(environ)
+        error = None
+        try:
+            ctx.push()
+            try:
+                response = await self._full_dispatch(view)
+            except Exception as e:
+                error = e
+                response = self.app.handle_exception(e)
+
+            body = response.get_data()
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [
+                    (name.lower().encode('latin1'), value.encode('latin1'))
+                    for name, value in response.get_wsgi_headers(environ).to_wsgi_list()
+                ],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+        finally:
+            ctx.pop(error)
+
+    async def _full_dispatch(self, view):
+        # Flask.full_dispatch_request, awaiting the view. the jwt (and the
+        # cached user lookup behind it, identity.py) is checked here since
+        # jwt_required can't wrap a view running on the server's loop
+        app = self.app
+        request_started.send(app, _async_wrapper=app.ensure_sync)
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                if request.routing_exception is not None:
+                    app.raise_routing_exception(request)
+                await self._verify_jwt()
+                rv = await view(**request.view_args)
+        except Exception as e:
+            rv = app.handle_user_exception(e)
+        return app.finalize_request(rv)
+
+    async def _verify_jwt(self):
+        # a user cache miss queries through the sync session: do it off the
+        # loop, and hand the connection back before the view starts awaiting,
+        # or concurrent requests would drain the sync pool and block the loop
+        def verify():
+            try:
+                verify_jwt_in_request()
+            finally:
+                db.session.close()
+
+        await sync_to_async(verify, thread_sensitive=False, executor=self.executor)()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await dispose_async_db(self.app)
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(configs_dictionary_key="prod", config_overrides=None):
+    app = create_app(configs_dictionary_key, {"ASYNC_DB_ENABLED": True, **(config_overrides or {})})
+    return AsgiApp(app)
@@ -0,0 +1,68 @@
+"""AsyncSession support for the async serving mode (see splitEx/asgi.py).
+
+Enabled with ASYNC_DB_ENABLED; the async engine points at the same database
+as SQLALCHEMY_DATABASE_URI through its async driver (asyncpg / aiosqlite),
+unless ASYNC_DATABASE_URI says otherwise.
+
+Async driver connections belong to the event loop that opened them, so there
+is one pooled engine (ASYNC_ENGINE_OPTIONS) per running loop, in practice the
+ASGI server's one loop per process. It's disposed on lifespan shutdown.
+"""
+
+import asyncio
+import weakref
+
+from flask import Flask, current_app
+from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from .models import db
+
+ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url: URL) -> URL:
+    """the async driver equivalent of a sync database url"""
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+def _sessionmaker(app: Flask):
+    loop = asyncio.get_running_loop()
+    makers = app.extensions['async_db']
+    maker = makers.get(loop)
+    if maker is None:
+        engine = create_async_engine(app.extensions['async_db_url'], **app.config.get('ASYNC_ENGINE_OPTIONS', {}))
+        maker = makers[loop] = async_sessionmaker(engine, expire_on_commit=False)
+    return maker
+
+
+def async_session():
+    """new AsyncSession on the running loop's engine, use as `async with async_session() as session:`"""
+    return _sessionmaker(current_app)()
+
+
+async def dispose_async_db(app: Flask):
+    """close the running loop's pooled connections"""
+    maker = app.extensions.get('async_db', {}).pop(asyncio.get_running_loop(), None)
+    if maker is not None:
+        await maker.kw['bind'].dispose()
+
+
+def init_app(app: Flask):
+    if not app.config.get('ASYNC_DB_ENABLED'):
+        return
+
+    uri = app.config.get('ASYNC_DATABASE_URI')
+    if not uri:
+        # the url of the sync engine, flask-sqlalchemy has already resolved
+        # relative sqlite paths against the instance folder there
+        with app.app_context():
+            uri = async_database_url(db.engine.url)
+
+    app.extensions['async_db_url'] = uri
+    app.extensions['async_db'] = weakref.WeakKeyDictionary()
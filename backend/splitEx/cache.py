@@ -0,0 +1,110 @@
+"""small key/value caches.
+
+LocalCache is a per process LRU with a TTL, used on its own or in front of a
+shared backend (anything redis-like, see `make_shared_backend`) through
+TieredCache. Values put in a shared backend must be JSON serializable.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """thread safe in memory LRU cache with per entry expiry"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SharedCache:
+    """adapter for a redis-like client (get, set with ex=, delete)"""
+
+    def __init__(self, client, prefix='splitEx:', ttl=300):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, json.dumps(value), ex=int(ttl or self.ttl))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class TieredCache:
+    """local LRU in front of an optional shared backend"""
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+
+
+def make_shared_backend(url, prefix='splitEx:', ttl=300):
+    """SharedCache for a CACHE_URL, or None when no url is configured"""
+    if not url:
+        return None
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError('CACHE_URL is set but the redis package is not installed') from e
+    return SharedCache(redis.Redis.from_url(url), prefix=prefix, ttl=ttl)
@@ -0,0 +1,231 @@
+"""delta sync: a per user feed of changed and deleted expenses.
+
+Every expense / participant write goes through ledger.track_balances, which
+hands over who could see each touched expense (payer and participants)
+before and after the write. When the transaction commits, everyone who can
+see the expense gets an entry in expense_changes and everyone who lost it
+(expense deleted, participant removed) gets a tombstone. Each user's
+entries are numbered from that user's change counter row in the same
+transaction; the row stays locked until commit, so the user's seqs become
+visible in order and a client polling `changes?since=<last seq>` never skips
+one. Seqs are per user: only writes touching the same user wait for each
+other, not every write of the app on one counter row.
+
+The audience is the expense's payer and participants only, the same
+expenses GET /api/expenses/ lists. Group members who aren't on a group
+expense get no entries for it; they read it from the group's expense list.
+
+Commits in this process also wake up the change streams (SSE) of the
+affected users, streams poll every CHANGE_STREAM_POLL_SECONDS as well for
+commits made by other processes.
+"""
+
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from flask import Flask, current_app, has_app_context
+from flask.cli import AppGroup
+from sqlalchemy import delete, event, func, insert, select, union, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import db
+from .models.change import ChangeCounter, ExpenseChange
+from .models.expense import Expense, ExpenseParticipant
+
+
+class ChangesGone(Exception):
+    """the requested seq is older than the retained changes"""
+
+
+def expense_audience(expense_ids) -> dict[uuid.UUID, set]:
+    """expense id -> ids of its payer and participants"""
+    expense_ids = list(expense_ids)
+    audience = {expense_id: set() for expense_id in expense_ids}
+    if not expense_ids:
+        return audience
+    rows = db.session.execute(union(
+        select(ExpenseParticipant.expense_id, ExpenseParticipant.user_id)
+        .where(ExpenseParticipant.expense_id.in_(expense_ids)),
+        select(Expense.id, Expense.payer_id)
+        .where(Expense.id.in_(expense_ids), Expense.payer_id.is_not(None)),
+    ))
+    for expense_id, user_id in rows:
+        audience[expense_id].add(user_id)
+    return audience
+
+
+def record_changes(before, after, session=None):
+    """queue feed entries for the difference of two expense_audience snapshots, written on commit"""
+    session = session or db.session()
+    pending = session.info.setdefault('expense_changes', {})
+    for expense_id in before.keys() | after.keys():
+        visible = after.get(expense_id, set())
+        for user_id in visible:
+            pending[(user_id, expense_id)] = False
+        for user_id in before.get(expense_id, set()) - visible:
+            pending[(user_id, expense_id)] = True
+
+
+def current_seq_query(user_id: uuid.UUID):
+    return select(ChangeCounter.value).where(ChangeCounter.user_id == user_id)
+
+
+def current_seq(user_id: uuid.UUID) -> int:
+    """last seq of the user's feed, 0 before their first entry"""
+    return db.session.scalar(current_seq_query(user_id)) or 0
+
+
+def changes_query(user_id: uuid.UUID, since: int, limit: int):
+    """the user's feed entries after `since`, a range of the expense_changes pk"""
+    return (
+        select(ExpenseChange.seq, ExpenseChange.expense_id, ExpenseChange.deleted)
+        .where(ExpenseChange.user_id == user_id, ExpenseChange.seq > since)
+        .order_by(ExpenseChange.seq)
+        .limit(limit)
+    )
+
+
+def changes_since(user_id: uuid.UUID, since: int, limit: int):
+    """(changed expense ids, deleted expense ids, next since, has more) of the user's feed after `since`.
+
+    an expense changed several times in the page is reported once, raises
+    ChangesGone when `since` was purged already
+    """
+    purged_through = db.session.scalar(
+        select(ChangeCounter.purged_through).where(ChangeCounter.user_id == user_id)
+    ) or 0
+    if since < purged_through:
+        raise ChangesGone()
+
+    rows = db.session.execute(changes_query(user_id, since, limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # last state of every expense in the page, in the order of that last change
+    latest = {}
+    for _, expense_id, deleted in rows:
+        latest.pop(expense_id, None)
+        latest[expense_id] = deleted
+
+    changed = [expense_id for expense_id, deleted in latest.items() if not deleted]
+    deleted = [expense_id for expense_id, deleted in latest.items() if deleted]
+    return changed, deleted, rows[-1].seq if rows else since, has_more
+
+
+def _write_changes(session):
+    pending = session.info.pop('expense_changes', None)
+    if not pending:
+        return
+
+    by_user = {}
+    for (user_id, expense_id), deleted in pending.items():
+        by_user.setdefault(user_id, []).append((expense_id, deleted))
+
+    # one upsert bumping every touched user's counter, creating missing rows;
+    # rows go in user order so concurrent writers lock them in the same order
+    dialect_insert = postgresql.insert if session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+    statement = dialect_insert(ChangeCounter).values([
+        {'user_id': user_id, 'value': len(entries), 'purged_through': 0}
+        for user_id, entries in sorted(by_user.items())
+    ])
+    last = dict(session.execute(statement.on_conflict_do_update(
+        index_elements=['user_id'], set_={'value': ChangeCounter.value + statement.excluded.value}
+    ).returning(ChangeCounter.user_id, ChangeCounter.value)).all())
+
+    now = datetime.utcnow()
+    session.execute(insert(ExpenseChange), [
+        {'seq': seq, 'user_id': user_id, 'expense_id': expense_id, 'deleted': deleted, 'changed_at': now}
+        for user_id, entries in by_user.items()
+        for seq, (expense_id, deleted) in enumerate(entries, last[user_id] - len(entries) + 1)
+    ])
+    session.info.setdefault('change_feed_user_ids', set()).update(by_user)
+
+
+def _notify_after_commit(session):
+    user_ids = session.info.pop('change_feed_user_ids', ())
+    if user_ids and has_app_context() and 'change_notifier' in current_app.extensions:
+        current_app.extensions['change_notifier'].notify(user_ids)
+
+
+def _forget_after_rollback(session, previous_transaction):
+    session.info.pop('expense_changes', None)
+    session.info.pop('change_feed_user_ids', None)
+
+
+class ChangeNotifier:
+    """wakes up the change streams of this process whose user got new entries,
+    and counts them against CHANGE_STREAM_MAX_STREAMS"""
+
+    def __init__(self, max_streams=16):
+        self.condition = threading.Condition()
+        self.versions = {}
+        self.streams = threading.BoundedSemaphore(max_streams)
+
+    def open_stream(self) -> bool:
+        """take a stream slot, False if they are all in use"""
+        return self.streams.acquire(blocking=False)
+
+    def close_stream(self):
+        self.streams.release()
+
+    def version(self, user_id):
+        with self.condition:
+            return self.versions.get(user_id, 0)
+
+    def notify(self, user_ids):
+        with self.condition:
+            for user_id in user_ids:
+                self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            self.condition.notify_all()
+
+    def wait(self, user_id, version, timeout) -> int:
+        """block until the user is notified past `version` or `timeout` passes, returns the current version"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.versions.get(user_id, 0) != version, timeout)
+            return self.versions.get(user_id, 0)
+
+
+def purge_changes(days: int) -> int:
+    """delete feed entries older than `days` days, clients behind them must refetch everything"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    last_purged = db.session.execute(
+        select(ExpenseChange.user_id, func.max(ExpenseChange.seq))
+        .where(ExpenseChange.changed_at < cutoff)
+        .group_by(ExpenseChange.user_id)
+    ).all()
+    if not last_purged:
+        return 0
+    db.session.execute(update(ChangeCounter), [
+        {'user_id': user_id, 'purged_through': seq} for user_id, seq in last_purged
+    ])
+    result = db.session.execute(delete(ExpenseChange).where(ExpenseChange.seq <= (
+        select(ChangeCounter.purged_through)
+        .where(ChangeCounter.user_id == ExpenseChange.user_id)
+        .scalar_subquery()
+    )))
+    db.session.commit()
+    return result.rowcount
+
+
+changes_cli = AppGroup('changes', help='Maintain the expense change feed.')
+
+
+@changes_cli.command('purge')
+@click.option('--days', type=int, default=None, help='keep this many days (default CHANGE_RETENTION_DAYS)')
+def purge_command(days):
+    """Delete change feed entries past their retention (run it from cron)."""
+    days = days if days is not None else current_app.config.get('CHANGE_RETENTION_DAYS', 30)
+    click.echo(f'purged {purge_changes(days)} change(s) older than {days} day(s)')
+
+
+def init_app(app: Flask):
+    app.extensions['change_notifier'] = ChangeNotifier(app.config.get('CHANGE_STREAM_MAX_STREAMS', 16))
+    app.cli.add_command(changes_cli)
+
+    if not event.contains(Session, 'before_commit', _write_changes):
+        event.listen(Session, 'before_commit', _write_changes)
+        event.listen(Session, 'after_commit', _notify_after_commit)
+        event.listen(Session, 'after_soft_rollback', _forget_after_rollback)
@@ -5,6 +5,23 @@ from datetime import timedelta
 
 load_dotenv()
 
+# connection pool settings for servers with a real pool (not in-memory sqlite)
+POOL_OPTIONS = {
+    "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+    "pool_timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    "pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true",
+}
+
+
+def replica_binds(url, engine_options=None):
+    """SQLALCHEMY_BINDS for an optional read replica, see models/routing.py"""
+    if not url:
+        return {}
+    return {"replica": {"url": url, **(engine_options or {})}}
+
+
 class Config:
     FLASK_APP = os.environ.get("FLASK_APP", "run")
     PORT = os.environ.get("PORT", 3000)
@@ -14,6 +31,78 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=14)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=17)
 
+    # instrumentation
+    # /metrics is off unless enabled, and then only answers scrapes sending
+    # `Authorization: Bearer <METRICS_TOKEN>` when a token is set
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+    SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "true").lower() == "true"
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_THRESHOLD_MS", 200))
+
+    # json encoding: auto (orjson when installed), orjson or default
+    JSON_PROVIDER = os.environ.get("JSON_PROVIDER", "auto")
+
+    # caching, CACHE_URL (redis://...) adds a shared tier behind the per process caches
+    CACHE_URL = os.environ.get("CACHE_URL")
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 4096))
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+    RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", 2048))
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+    REPORT_CACHE_SIZE = int(os.environ.get("REPORT_CACHE_SIZE", 2048))
+    REPORT_CACHE_TTL = int(os.environ.get("REPORT_CACHE_TTL", 600))
+
+    # replayed responses of writes sent with an Idempotency-Key header
+    IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 86400))
+    # a claimed key whose request hasn't finished after this long can be retried
+    IDEMPOTENCY_LOCK_TIMEOUT = int(os.environ.get("IDEMPOTENCY_LOCK_TIMEOUT", 60))
+
+    # expense change feed (/api/expenses/changes), clients further behind
+    # than the retention refetch the full list
+    CHANGE_RETENTION_DAYS = int(os.environ.get("CHANGE_RETENTION_DAYS", 30))
+    # server sent events stream of the feed (/api/expenses/changes/stream).
+    # an open stream holds its worker for up to CHANGE_STREAM_MAX_SECONDS, so
+    # only turn it on behind a server that doesn't spend a thread per
+    # connection (gunicorn -k gevent); CHANGE_STREAM_MAX_STREAMS caps the open
+    # streams per process, further ones get a 503
+    CHANGE_STREAM_ENABLED = os.environ.get("CHANGE_STREAM_ENABLED", "false").lower() == "true"
+    CHANGE_STREAM_MAX_STREAMS = int(os.environ.get("CHANGE_STREAM_MAX_STREAMS", 16))
+    CHANGE_STREAM_POLL_SECONDS = float(os.environ.get("CHANGE_STREAM_POLL_SECONDS", 5))
+    CHANGE_STREAM_HEARTBEAT_SECONDS = float(os.environ.get("CHANGE_STREAM_HEARTBEAT_SECONDS", 15))
+    CHANGE_STREAM_MAX_SECONDS = float(os.environ.get("CHANGE_STREAM_MAX_SECONDS", 300))
+
+    # background jobs, run by `python worker.py`. bulk creates of more than
+    # JOBS_BULK_INLINE_MAX expenses (or sent with `Prefer: respond-async`)
+    # are queued and answered with 202 while JOBS_ENABLED. only turn it on
+    # where a worker runs next to the web processes (a `worker: python
+    # worker.py` process type), or queued jobs just sit there
+    JOBS_ENABLED = os.environ.get("JOBS_ENABLED", "false").lower() == "true"
+    JOBS_BULK_INLINE_MAX = int(os.environ.get("JOBS_BULK_INLINE_MAX", 500))
+    JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+    JOB_RETRY_BACKOFF_SECONDS = float(os.environ.get("JOB_RETRY_BACKOFF_SECONDS", 10))
+    # a running job whose worker stopped renewing it is picked up again after this
+    JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", 300))
+    JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 1))
+    JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", 7))
+
+    # password hashing, existing hashes are upgraded on login when these change
+    PASSWORD_HASH_METHOD = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    PASSWORD_SALT_LENGTH = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_QUEUE_DEPTH = int(os.environ.get("PASSWORD_HASH_QUEUE_DEPTH", 8))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+
+    # async serving mode (asgi.py), ASYNC_DATABASE_URI defaults to the async
+    # driver version of SQLALCHEMY_DATABASE_URI. sync routes run on
+    # ASGI_SYNC_THREADS threads per process, async ones on the event loop
+    ASYNC_DB_ENABLED = os.environ.get("ASYNC_DB_ENABLED", "false").lower() == "true"
+    ASYNC_DATABASE_URI = os.environ.get("ASYNC_DATABASE_URI")
+    ASYNC_ENGINE_OPTIONS = {}
+    ASGI_SYNC_THREADS = int(os.environ.get("ASGI_SYNC_THREADS", 32))
+
+    # reads of routes marked @replica_read stay on the primary this long after
+    # the same user wrote something
+    REPLICA_STICKY_SECONDS = int(os.environ.get("REPLICA_STICKY_SECONDS", 10))
+
     @staticmethod
     def init_app(app):
         pass
@@ -24,17 +113,25 @@ class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         'DEV_DATABASE_URL', "sqlite:///database.sqlite"
     )
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get('DEV_REPLICA_DATABASE_URL'))
+    AUTO_MIGRATE = True
 
 
 class TestingConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get("TEST_DATABASE_URL")
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get("TEST_REPLICA_DATABASE_URL"))
+    AUTO_MIGRATE = True
+    PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 0))
 
 
 
 class ProductionConfig(Config):
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.environ.get('PROD_DATABASE_URL')
+    SQLALCHEMY_ENGINE_OPTIONS = POOL_OPTIONS
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get('PROD_REPLICA_DATABASE_URL'), POOL_OPTIONS)
+    ASYNC_ENGINE_OPTIONS = POOL_OPTIONS
 
 
 configs_dictionary = {
@@ -0,0 +1,142 @@
+"""idempotency keys for write routes.
+
+A client retrying a write (timeout, dropped connection) sends the same
+`Idempotency-Key` header; the first response is stored in idempotency_keys
+and replayed for every retry, so the write happens once. Keys are per user,
+reusing one for a different request is a 422, and a retry while the first
+request is still running gets a 409. Responses asking for a retry (409,
+5xx) aren't stored, the key is released for the retry to use.
+"""
+
+import hashlib
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+
+import click
+from flask import Flask, current_app, jsonify, request
+from flask.cli import AppGroup
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from .models import db
+from .models.idempotency import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+RETRYABLE_STATUS_CODES = {409}
+
+
+def _fingerprint():
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.full_path.encode())
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+
+def _claim(user_id, key, fingerprint):
+    """(stored row or None, error response or None); None, None means this request owns the key"""
+    now = datetime.utcnow()
+    ttl = timedelta(seconds=current_app.config.get('IDEMPOTENCY_KEY_TTL', 86400))
+    lock_timeout = timedelta(seconds=current_app.config.get('IDEMPOTENCY_LOCK_TIMEOUT', 60))
+
+    stored = db.session.get(IdempotencyKey, (user_id, key))
+    if stored is not None:
+        expired = stored.created_at < now - ttl
+        # a claim whose request never finished (crashed worker) can be taken over
+        abandoned = stored.status_code is None and stored.created_at < now - lock_timeout
+        if not expired and not abandoned:
+            if stored.fingerprint != fingerprint:
+                return None, (jsonify({'error': f'{IDEMPOTENCY_HEADER} was already used for a different request'}), 422)
+            if stored.status_code is None:
+                return None, (jsonify({'error': 'A request with this idempotency key is still in progress'}), 409)
+            return stored, None
+        db.session.delete(stored)
+        db.session.flush()
+
+    try:
+        db.session.add(IdempotencyKey(user_id=user_id, key=key, fingerprint=fingerprint))
+        db.session.commit()
+    except IntegrityError:
+        # a concurrent request with the same key claimed it first
+        db.session.rollback()
+        return None, (jsonify({'error': 'A request with this idempotency key is still in progress'}), 409)
+    return None, None
+
+
+def _replay(stored):
+    response = current_app.response_class(stored.body, status=stored.status_code, content_type=stored.content_type)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    """store and replay the response of `view` per Idempotency-Key header, goes below @jwt_required()"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'}), 400
+
+        user_id = uuid.UUID(get_jwt_identity())
+        stored, error = _claim(user_id, key, _fingerprint())
+        if error:
+            return error
+        if stored is not None:
+            return _replay(stored)
+
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except Exception:
+            _release(user_id, key)
+            raise
+
+        # only final outcomes are stored: server errors and conflicts (409, a
+        # concurrent write got there first) tell the client to retry, which
+        # must run the write again instead of replaying the refusal
+        if response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500:
+            _release(user_id, key)
+            return response
+
+        db.session.rollback()
+        db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            .values(status_code=response.status_code, body=response.get_data(as_text=True),
+                    content_type=response.content_type)
+        )
+        db.session.commit()
+        return response
+
+    return wrapper
+
+
+def _release(user_id, key):
+    db.session.rollback()
+    db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+    db.session.commit()
+
+
+def purge_expired_keys() -> int:
+    """delete keys older than IDEMPOTENCY_KEY_TTL"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get('IDEMPOTENCY_KEY_TTL', 86400))
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+
+idempotency_cli = AppGroup('idempotency', help='Maintain stored idempotency keys.')
+
+
+@idempotency_cli.command('purge')
+def purge_command():
+    """Delete idempotency keys past their TTL (run it from cron)."""
+    click.echo(f'purged {purge_expired_keys()} expired key(s)')
+
+
+def init_app(app: Flask):
+    app.cli.add_command(idempotency_cli)
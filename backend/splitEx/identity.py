@@ -0,0 +1,113 @@
+"""JWT identity -> user resolution, cached.
+
+Protected routes get the current user from flask_jwt_extended's
+`current_user`, which is resolved here through a per process LRU/TTL cache
+(optionally backed by a shared cache, see CACHE_URL) so hot reads like
+/api/auth/u skip the database. Entries are evicted whenever a User row is
+updated or deleted. A token whose user no longer exists gets a 404 on every
+protected route, before the view runs.
+"""
+
+import uuid
+
+from flask import Flask, current_app, has_app_context, jsonify
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from .cache import LocalCache, TieredCache, make_shared_backend
+from .models import db
+from .models.user import User
+
+CACHED_FIELDS = ('email', 'username', 'name', 'email_verified')
+
+
+class CachedUser:
+    """read only snapshot of a User row, what protected routes get as current_user"""
+
+    def __init__(self, id, email, username, name, email_verified=False):
+        self.id = uuid.UUID(id) if isinstance(id, str) else id
+        self.email = email
+        self.username = username
+        self.name = name
+        self.email_verified = email_verified
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, **{field: getattr(user, field) for field in CACHED_FIELDS})
+
+    def to_dict(self):
+        return {'id': str(self.id), **{field: getattr(self, field) for field in CACHED_FIELDS}}
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+def _cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def get_cached_user(user_id: uuid.UUID):
+    """CachedUser for user_id, from the cache or (on a miss) the database"""
+    cache = current_app.extensions['user_cache']
+    key = _cache_key(user_id)
+
+    cached = cache.get(key)
+    if cached is not None:
+        return CachedUser(**cached)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    snapshot = CachedUser.from_user(user)
+    cache.set(key, snapshot.to_dict())
+    return snapshot
+
+
+def evict_user(user_id):
+    if has_app_context() and 'user_cache' in current_app.extensions:
+        current_app.extensions['user_cache'].delete(_cache_key(user_id))
+
+
+def _user_lookup(jwt_header, jwt_data):
+    try:
+        return get_cached_user(uuid.UUID(jwt_data['sub']))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _user_not_found(jwt_header, jwt_data):
+    # a valid token whose user was deleted, the routes' documented 404
+    return jsonify({'error': 'User not found'}), 404
+
+
+def _remember_changed_user(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault('changed_user_ids', set()).add(target.id)
+
+
+def _evict_after_commit(session):
+    for user_id in session.info.pop('changed_user_ids', ()):
+        evict_user(user_id)
+
+
+def _forget_after_rollback(session, previous_transaction):
+    session.info.pop('changed_user_ids', None)
+
+
+def init_app(app: Flask):
+    app.extensions['user_cache'] = TieredCache(
+        LocalCache(maxsize=app.config.get('USER_CACHE_SIZE', 4096), ttl=app.config.get('USER_CACHE_TTL', 60)),
+        make_shared_backend(app.config.get('CACHE_URL'), ttl=app.config.get('USER_CACHE_TTL', 60)),
+    )
+
+    jwt = app.extensions['flask-jwt-extended']
+    jwt.user_lookup_loader(_user_lookup)
+    jwt.user_lookup_error_loader(_user_not_found)
+
+    # evict on commit, so a rolled back change doesn't leave a stale entry behind
+    if not event.contains(User, 'after_update', _remember_changed_user):
+        event.listen(User, 'after_update', _remember_changed_user)
+        event.listen(User, 'after_delete', _remember_changed_user)
+        event.listen(Session, 'after_commit', _evict_after_commit)
+        event.listen(Session, 'after_soft_rollback', _forget_after_rollback)
@@ -0,0 +1,175 @@
+"""per request query count / latency instrumentation.
+
+SQL statements are timed with engine cursor events, JSON serialization with a
+timing json provider, and the totals for each request are added up per
+endpoint. They come out through a prometheus text `/metrics` endpoint (off
+unless METRICS_ENABLED, guarded by METRICS_TOKEN when set) and a
+`Server-Timing` header on every response.
+"""
+
+import hmac
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from flask import Flask, Response, current_app, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+slow_query_logger = logging.getLogger('splitEx.slow_queries')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Metrics:
+    """thread safe per endpoint totals"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.queries = defaultdict(int)
+        self.db_seconds = defaultdict(float)
+        self.serialization_seconds = defaultdict(float)
+        self.latency_sum = defaultdict(float)
+        self.latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+
+    def observe(self, endpoint, queries, db_seconds, serialization_seconds, latency):
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.queries[endpoint] += queries
+            self.db_seconds[endpoint] += db_seconds
+            self.serialization_seconds[endpoint] += serialization_seconds
+            self.latency_sum[endpoint] += latency
+            buckets = self.latency_buckets[endpoint]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    buckets[i] += 1
+
+    def render(self) -> str:
+        """prometheus text exposition format"""
+        lines = []
+
+        def metric(name, kind, help_text, values, fmt='{}'):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for endpoint, value in sorted(values.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {fmt.format(value)}')
+
+        with self.lock:
+            metric('splitex_requests_total', 'counter', 'Requests handled.', self.requests)
+            metric('splitex_db_queries_total', 'counter', 'SQL statements executed.', self.queries)
+            metric('splitex_db_seconds_total', 'counter', 'Time spent in SQL statements.', self.db_seconds, '{:.6f}')
+            metric('splitex_serialization_seconds_total', 'counter', 'Time spent encoding JSON.',
+                   self.serialization_seconds, '{:.6f}')
+
+            name = 'splitex_request_duration_seconds'
+            lines.append(f'# HELP {name} Request latency.')
+            lines.append(f'# TYPE {name} histogram')
+            for endpoint in sorted(self.requests):
+                for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets[endpoint]):
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {self.requests[endpoint]}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {self.latency_sum[endpoint]:.6f}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {self.requests[endpoint]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class TimedJSONMixin:
+    """json provider mixin adding the time spent in dumps to the current request"""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            if has_request_context() and 'request_start' in g:
+                g.serialization_seconds += time.perf_counter() - start
+
+
+class TimedJSONProvider(TimedJSONMixin, DefaultJSONProvider):
+    pass
+
+
+def timed_provider_class(provider_class):
+    """`provider_class` (app.json_provider_class, see json_provider.py) with dumps timed"""
+    if issubclass(provider_class, TimedJSONMixin):
+        return provider_class
+    return type(f'Timed{provider_class.__name__}', (TimedJSONMixin, provider_class), {})
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    if not has_request_context() or 'request_start' not in g:
+        return
+
+    g.query_count += 1
+    g.db_seconds += elapsed
+
+    threshold = current_app.config.get('SLOW_QUERY_THRESHOLD_MS')
+    if threshold is not None and elapsed * 1000 >= threshold:
+        slow_query_logger.warning(
+            'slow query (%.1fms) on %s %s [%s]: %s',
+            elapsed * 1000, request.method, request.path, _endpoint(), statement
+        )
+
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.query_count = 0
+    g.db_seconds = 0.0
+    g.serialization_seconds = 0.0
+
+
+def _finish_request(response):
+    if 'request_start' not in g:
+        return response
+
+    latency = time.perf_counter() - g.request_start
+    current_app.extensions['metrics'].observe(
+        _endpoint(), g.query_count, g.db_seconds, g.serialization_seconds, latency
+    )
+
+    if current_app.config.get('SERVER_TIMING_ENABLED', True):
+        response.headers['Server-Timing'] = ', '.join([
+            f'db;dur={g.db_seconds * 1000:.2f};desc="{g.query_count} queries"',
+            f'serialize;dur={g.serialization_seconds * 1000:.2f}',
+            f'total;dur={latency * 1000:.2f}',
+        ])
+    return response
+
+
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    given = request.headers.get('Authorization', '').encode()
+    if token and not hmac.compare_digest(given, f'Bearer {token}'.encode()):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain', headers={'WWW-Authenticate': 'Bearer'})
+    return Response(current_app.extensions['metrics'].render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app: Flask):
+    app.extensions['metrics'] = Metrics()
+    app.json_provider_class = timed_provider_class(app.json_provider_class)
+    app.json = app.json_provider_class(app)
+
+    # one listener pair for every engine (binds included), they only record
+    # while a request is being handled
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    if app.config.get('METRICS_ENABLED'):
+        app.add_url_rule('/metrics', 'metrics', metrics_view, methods=['GET'])
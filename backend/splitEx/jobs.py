@@ -0,0 +1,261 @@
+"""background jobs: a queue table and a worker.
+
+Routes hand expensive work off with `enqueue(kind, payload, user_id)`,
+commit and answer 202 with the job; its status is at /api/jobs/<id>.
+`python worker.py` (or `flask jobs work`) runs queued jobs through the
+handler registered for their kind with @job_handler.
+
+Claiming is a conditional UPDATE (after SELECT ... FOR UPDATE SKIP LOCKED on
+Postgres), so any number of workers can share the table. A claim leases the
+job for JOB_LEASE_SECONDS: if the worker dies the job is claimed again once
+the lease runs out. A handler raising is retried with exponential backoff
+up to max_attempts. Long handlers call `checkpoint(job, progress)` before
+committing each unit of work, which saves their progress in the same
+transaction and extends the lease, so a retry resumes instead of redoing
+committed work.
+
+Checkpoints and the final status are conditional on the row still being
+locked_by the worker that claimed it. A worker that was too slow to renew
+its lease (and whose job was claimed again) gets LeaseLost from its next
+checkpoint, inside the transaction of that unit of work, so the unit is
+rolled back instead of being done twice; it leaves the job to the new owner.
+"""
+
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+import click
+from flask import Flask, current_app
+from flask.cli import AppGroup
+from sqlalchemy import and_, delete, func, select, update
+
+from .models import db
+from .models.job import Job, JobStatus
+
+# candidates read per claim, the next ones are tried when another worker was faster
+CLAIM_BATCH = 5
+
+logger = logging.getLogger('splitEx.jobs')
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """register fn(job) -> result (json serializable) as the handler of `kind` jobs"""
+    def register(fn):
+        JOB_HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, user_id=None, max_attempts=None) -> Job:
+    """add a job to the current transaction, workers see it once that commits"""
+    job = Job(kind, payload, user_id, max_attempts or current_app.config.get('JOB_MAX_ATTEMPTS', 3))
+    db.session.add(job)
+    return job
+
+
+def job_to_dict(job) -> dict:
+    def timestamp(value):
+        return value.isoformat(' ', 'seconds') if value else None
+
+    finished = job.status == JobStatus.SUCCEEDED
+    return {
+        'id': str(job.id),
+        'kind': job.kind,
+        'status': job.status.value,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'created_at': timestamp(job.created_at),
+        'started_at': timestamp(job.started_at),
+        'finished_at': timestamp(job.finished_at),
+        'result': job.progress if finished else None,
+        'error': job.error,
+    }
+
+
+class LeaseLost(Exception):
+    """the job's lease ran out and another worker claimed it"""
+
+
+def _lease():
+    return timedelta(seconds=current_app.config.get('JOB_LEASE_SECONDS', 300))
+
+
+def _owned(job_id, worker_id):
+    return and_(Job.id == job_id, Job.status == JobStatus.RUNNING, Job.locked_by == worker_id)
+
+
+def checkpoint(job, progress):
+    """save a running job's progress (read back as job.progress) and extend its lease.
+
+    call it before committing a unit of work, so both commit together. raises
+    LeaseLost if another worker holds the job now, roll the unit back then
+    """
+    updated = db.session.execute(
+        update(Job).where(_owned(job.id, job.lease_owner))
+        .values(result=json.dumps(progress), run_at=datetime.utcnow() + _lease())
+    )
+    if not updated.rowcount:
+        raise LeaseLost(f'Job {job.id} is no longer held by {job.lease_owner}')
+
+
+def _claimable(now):
+    # queued and due, or running with an expired lease
+    return and_(Job.status.in_([JobStatus.QUEUED, JobStatus.RUNNING]), Job.run_at <= now)
+
+
+def due_jobs_query(now):
+    """the ids of the next claimable jobs, rows locked by other workers skipped"""
+    return select(Job.id).where(_claimable(now)).order_by(Job.run_at).limit(CLAIM_BATCH) \
+        .with_for_update(skip_locked=True)
+
+
+def claim_job(worker_id: str) -> Optional[Job]:
+    """the next due job, now running under this worker's lease, or None"""
+    now = datetime.utcnow()
+    claimable = _claimable(now)
+
+    candidates = db.session.scalars(due_jobs_query(now)).all()
+    for job_id in candidates:
+        claimed = db.session.execute(
+            update(Job).where(Job.id == job_id, claimable).values(
+                status=JobStatus.RUNNING,
+                locked_by=worker_id,
+                run_at=now + _lease(),
+                attempts=Job.attempts + 1,
+                started_at=func.coalesce(Job.started_at, now),
+            )
+        )
+        if claimed.rowcount:
+            db.session.commit()
+            job = db.session.get(Job, job_id)
+            job.lease_owner = worker_id
+            return job
+    db.session.commit()
+    return None
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=current_app.config.get('JOB_RETRY_BACKOFF_SECONDS', 10) * 2 ** (attempts - 1))
+
+
+def _finish(job_id, worker_id, **values) -> Job:
+    """record the outcome of a run unless another worker holds the job now, the job as stored"""
+    updated = db.session.execute(update(Job).where(_owned(job_id, worker_id)).values(**values))
+    db.session.commit()
+    if not updated.rowcount:
+        logger.warning('job %s was claimed by another worker, outcome of %s dropped', job_id, worker_id)
+    return db.session.get(Job, job_id)
+
+
+def run_job(job) -> Job:
+    """run a claimed job and record how it went"""
+    # as claimed: the row may be reloaded with another worker's values below
+    job_id, kind, worker_id = job.id, job.kind, job.lease_owner
+    attempts, max_attempts = job.attempts, job.max_attempts
+    handler = JOB_HANDLERS.get(kind)
+
+    try:
+        if handler is None:
+            raise LookupError(f'No handler for job kind {kind}')
+        if attempts > max_attempts:
+            # claimed again after the lease of its last attempt ran out
+            raise RuntimeError(f'Gave up after {max_attempts} attempt(s), the worker running it was lost')
+        result = handler(job)
+
+    except LeaseLost:
+        db.session.rollback()
+        logger.warning('job %s (%s) lost its lease, left to the worker holding it', job_id, kind)
+        return db.session.get(Job, job_id)
+
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('job %s (%s) failed', job_id, kind)
+        error = f'{type(e).__name__}: {e}'
+        if handler is not None and attempts < max_attempts:
+            return _finish(job_id, worker_id, status=JobStatus.QUEUED, error=error,
+                           run_at=datetime.utcnow() + _retry_delay(attempts))
+        return _finish(job_id, worker_id, status=JobStatus.FAILED, error=error, finished_at=datetime.utcnow())
+
+    return _finish(job_id, worker_id, status=JobStatus.SUCCEEDED, result=json.dumps(result), error=None,
+                   finished_at=datetime.utcnow())
+
+
+def work(worker_id=None, poll_seconds=None, once=False) -> int:
+    """run jobs until SIGTERM / SIGINT (the current job is finished first), or
+    with `once` until none is due. returns the number of jobs run
+    """
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    poll_seconds = poll_seconds if poll_seconds is not None else current_app.config.get('JOB_POLL_SECONDS', 1)
+    stopping = threading.Event()
+
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stopping.set())
+
+    ran = 0
+    while not stopping.is_set():
+        job = claim_job(worker_id)
+        if job is None:
+            db.session.remove()
+            if once:
+                break
+            stopping.wait(poll_seconds)
+            continue
+
+        job = run_job(job)
+        logger.info('job %s (%s) %s after %d attempt(s)', job.id, job.kind, job.status.value, job.attempts)
+        ran += 1
+        db.session.remove()
+    return ran
+
+
+def purge_jobs(days: int) -> int:
+    """delete finished jobs older than `days` days"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    result = db.session.execute(delete(Job).where(
+        Job.status.in_([JobStatus.SUCCEEDED, JobStatus.FAILED]), Job.finished_at < cutoff
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+jobs_cli = AppGroup('jobs', help='Run and maintain background jobs.')
+
+
+@jobs_cli.command('work')
+@click.option('--once', is_flag=True, help='exit once no job is due')
+@click.option('--poll', type=float, default=None, help='seconds between polls of an empty queue (default JOB_POLL_SECONDS)')
+def work_command(once, poll):
+    """Run queued jobs (same as python worker.py)."""
+    click.echo(f'ran {work(poll_seconds=poll, once=once)} job(s)')
+
+
+@jobs_cli.command('enqueue')
+@click.argument('kind')
+def enqueue_command(kind):
+    """Queue a maintenance job that takes no payload (e.g. rebuild_balances)."""
+    if kind not in JOB_HANDLERS:
+        raise click.BadParameter(f'one of {", ".join(sorted(JOB_HANDLERS))}', param_hint='KIND')
+    job = enqueue(kind)
+    db.session.commit()
+    click.echo(f'queued {kind} job {job.id}')
+
+
+@jobs_cli.command('purge')
+@click.option('--days', type=int, default=None, help='keep this many days (default JOB_RETENTION_DAYS)')
+def purge_command(days):
+    """Delete finished jobs past their retention (run it from cron)."""
+    days = days if days is not None else current_app.config.get('JOB_RETENTION_DAYS', 7)
+    click.echo(f'purged {purge_jobs(days)} job(s) older than {days} day(s)')
+
+
+def init_app(app: Flask):
+    app.cli.add_command(jobs_cli)
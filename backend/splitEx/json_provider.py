@@ -0,0 +1,55 @@
+"""pluggable JSON provider.
+
+JSON_PROVIDER picks the encoder used by jsonify / app.json: "default" is
+flask's stdlib json provider, "orjson" the (much faster) orjson one and
+"auto" (the default) orjson when it is installed. Output stays the same,
+dates are still rendered by flask and keys still sorted.
+"""
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib provider
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding / decoding"""
+
+    def dumps(self, obj, **kwargs):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode()
+        except TypeError:
+            # things orjson refuses (ints over 64 bits, ...) go through the stdlib
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+JSON_PROVIDERS = {
+    'default': DefaultJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+
+def provider_class(name):
+    if name in (None, 'auto'):
+        return OrjsonProvider if orjson is not None else DefaultJSONProvider
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f'Unknown JSON_PROVIDER {name!r}, expected auto, {", ".join(JSON_PROVIDERS)}')
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_PROVIDER is orjson but the orjson package is not installed')
+    return JSON_PROVIDERS[name]
+
+
+def init_app(app: Flask):
+    app.json_provider_class = provider_class(app.config.get('JSON_PROVIDER', 'auto'))
+    app.json = app.json_provider_class(app)
@@ -0,0 +1,374 @@
+"""balance ("who owes whom") computations.
+
+Every ExpenseParticipant row means its user owes the expense's payer `amount`,
+except the payer's own row. All sums are done in SQL, python only nets the
+(much smaller) aggregated rows.
+
+Running per pair totals live in the `balances` table and per group net
+positions in `group_balances`; every write route wraps its changes in
+`track_balances` so both tables move by the same deltas, in the same
+transaction.
+"""
+
+import heapq
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+import click
+from flask import Flask
+from flask.cli import AppGroup
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .models import db
+from .models.balance import Balance, GroupBalance
+from .models.expense import Expense, ExpenseParticipant
+from .models.user import User
+from .changes import expense_audience, record_changes
+from .reports import invalidate_reports
+from .jobs import job_handler
+
+
+def _debts():
+    """(debtor, creditor, amount) rows, one per non-payer participant"""
+    return select(
+        ExpenseParticipant.user_id.label('debtor'),
+        Expense.payer_id.label('creditor'),
+        ExpenseParticipant.amount.label('amount'),
+        Expense.group_id.label('group_id'),
+    ).join(
+        Expense, Expense.id == ExpenseParticipant.expense_id
+    ).where(
+        Expense.payer_id.is_not(None),
+        ExpenseParticipant.user_id != Expense.payer_id,
+    )
+
+
+def user_balances_query(user_id: uuid.UUID):
+    """(creditor, debtor, amount) rows with user_id on either side, one index per side"""
+    return select(Balance.creditor_id, Balance.debtor_id, Balance.amount).where(
+        (Balance.creditor_id == user_id) | (Balance.debtor_id == user_id)
+    )
+
+
+def user_balances(user_id: uuid.UUID) -> dict[uuid.UUID, int]:
+    """net balance between user_id and every counterparty, from the balances table.
+
+    positive: the counterparty owes user_id, negative: user_id owes them.
+    """
+    rows = db.session.execute(user_balances_query(user_id)).all()
+
+    balances = defaultdict(int)
+    for creditor, debtor, amount in rows:
+        if creditor == user_id:
+            balances[debtor] += amount
+        else:
+            balances[creditor] -= amount
+    return {other: amount for other, amount in balances.items() if amount}
+
+
+def balance_between(user_id: uuid.UUID, other_id: uuid.UUID) -> int:
+    """what other_id owes user_id (negative if user_id owes), two pk lookups"""
+    owed_to_user = db.session.get(Balance, (user_id, other_id))
+    owed_to_other = db.session.get(Balance, (other_id, user_id))
+    return (owed_to_user.amount if owed_to_user else 0) - (owed_to_other.amount if owed_to_other else 0)
+
+
+def group_balances_query(group_id: uuid.UUID):
+    return select(GroupBalance.user_id, GroupBalance.amount).where(
+        GroupBalance.group_id == group_id, GroupBalance.amount != 0
+    )
+
+
+def group_balances(group_id: uuid.UUID) -> dict[uuid.UUID, int]:
+    """net position per member of a group, from the group_balances table (a pk range read)"""
+    rows = db.session.execute(group_balances_query(group_id)).all()
+    return {user_id: amount for user_id, amount in rows}
+
+
+def computed_user_balances(user_id: uuid.UUID) -> dict[uuid.UUID, int]:
+    """same as user_balances, aggregated straight from expense_participants"""
+    debts = _debts().where(
+        (Expense.payer_id == user_id) | (ExpenseParticipant.user_id == user_id)
+    ).subquery()
+
+    counterparty = case(
+        (debts.c.creditor == user_id, debts.c.debtor), else_=debts.c.creditor
+    ).label('counterparty')
+    signed = case(
+        (debts.c.creditor == user_id, debts.c.amount), else_=-debts.c.amount
+    )
+
+    rows = db.session.execute(
+        select(counterparty, func.sum(signed)).group_by(counterparty)
+    ).all()
+    return {other: amount for other, amount in rows if amount}
+
+
+def debt_totals(expense_ids=None) -> dict[tuple[uuid.UUID, uuid.UUID], int]:
+    """gross (creditor, debtor) -> amount, not netted between the two directions.
+
+    expense_ids optionally restricts the computation to a subset of expenses,
+    anything accepted by `Expense.id.in_()` (a list or a select).
+    """
+    debts = _debts()
+    if expense_ids is not None:
+        debts = debts.where(Expense.id.in_(expense_ids))
+    debts = debts.subquery()
+
+    rows = db.session.execute(
+        select(debts.c.creditor, debts.c.debtor, func.sum(debts.c.amount))
+        .group_by(debts.c.creditor, debts.c.debtor)
+    ).all()
+    return {(creditor, debtor): amount for creditor, debtor, amount in rows}
+
+
+def pair_balances(expense_ids=None) -> list[tuple[uuid.UUID, uuid.UUID, int]]:
+    """netted (debtor, creditor, amount) per user pair.
+
+    expense_ids optionally restricts the computation to a subset of expenses,
+    anything accepted by `Expense.id.in_()` (a list or a select).
+    """
+    # net a->b against b->a
+    owed = defaultdict(int)
+    for (creditor, debtor), amount in debt_totals(expense_ids).items():
+        owed[(debtor, creditor)] += amount
+        owed[(creditor, debtor)] -= amount
+
+    return [
+        (debtor, creditor, amount)
+        for (debtor, creditor), amount in owed.items()
+        if amount > 0
+    ]
+
+
+def net_balances(expense_ids=None) -> dict[uuid.UUID, int]:
+    """net position per user, positive means the user is owed money"""
+    debts = _debts()
+    if expense_ids is not None:
+        debts = debts.where(Expense.id.in_(expense_ids))
+    return {user_id: amount for user_id, amount in _net_positions(debts.subquery()) if amount}
+
+
+def group_positions(expense_ids=None) -> dict[tuple[uuid.UUID, uuid.UUID], int]:
+    """(group_id, user_id) -> net position within the group, for grouped expenses"""
+    debts = _debts().where(Expense.group_id.is_not(None))
+    if expense_ids is not None:
+        debts = debts.where(Expense.id.in_(expense_ids))
+    return {
+        (group_id, user_id): amount
+        for group_id, user_id, amount in _net_positions(debts.subquery(), 'group_id')
+    }
+
+
+def _net_positions(debts, *keys):
+    """(*keys, user_id, credits - debits) rows over a _debts() subquery"""
+    key_columns = [debts.c[key] for key in keys]
+    credits = select(*key_columns, debts.c.creditor.label('user_id'), debts.c.amount.label('amount'))
+    debits = select(*key_columns, debts.c.debtor.label('user_id'), (-debts.c.amount).label('amount'))
+    movements = credits.union_all(debits).subquery()
+
+    group_by = [movements.c[key] for key in keys] + [movements.c.user_id]
+    return db.session.execute(
+        select(*group_by, func.sum(movements.c.amount)).group_by(*group_by)
+    ).all()
+
+
+def settle(balances: dict[uuid.UUID, int]) -> list[tuple[uuid.UUID, uuid.UUID, int]]:
+    """suggest (payer, payee, amount) transfers that clear `balances`.
+
+    greedy: always match the largest debtor with the largest creditor, which
+    needs at most n - 1 transfers for n users with a non zero balance.
+    """
+    # max heaps via negated amounts, the uuid.hex keeps ties deterministic
+    creditors = [(-amount, user_id.hex, user_id) for user_id, amount in balances.items() if amount > 0]
+    debtors = [(amount, user_id.hex, user_id) for user_id, amount in balances.items() if amount < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, credit_key, creditor = heapq.heappop(creditors)
+        debt, debt_key, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, credit_key, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debt_key, debtor))
+
+    return transfers
+
+
+def usernames(user_ids) -> dict[uuid.UUID, tuple[str, str]]:
+    """id -> (username, name) for the given users (balances, transfers), in one query"""
+    if not user_ids:
+        return {}
+    rows = db.session.execute(
+        select(User.id, User.username, User.name).where(User.id.in_(user_ids))
+    ).all()
+    return {row.id: (row.username, row.name) for row in rows}
+
+
+def _add_amounts(model, keys, deltas):
+    """add key -> delta to model.amount, creating missing rows, in the current transaction.
+
+    a single INSERT ... ON CONFLICT DO UPDATE, so two transactions that both
+    create the same row add up instead of one failing on the primary key;
+    rows go in key order so concurrent upserts lock them in the same order
+    """
+    rows = [dict(zip(keys, key), amount=delta) for key, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    dialect_insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+    statement = dialect_insert(model)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=keys, set_={'amount': model.amount + statement.excluded.amount}
+    ), rows)
+
+
+def apply_deltas(deltas: dict[tuple[uuid.UUID, uuid.UUID], int]):
+    """add (creditor, debtor) -> delta to the balances table, in the current transaction"""
+    _add_amounts(Balance, ['creditor_id', 'debtor_id'], deltas)
+
+
+def apply_group_deltas(deltas: dict[tuple[uuid.UUID, uuid.UUID], int]):
+    """add (group_id, user_id) -> delta to the group_balances table, in the current transaction"""
+    _add_amounts(GroupBalance, ['group_id', 'user_id'], deltas)
+
+
+def _diff(before, after):
+    deltas = defaultdict(int)
+    for key, amount in after.items():
+        deltas[key] += amount
+    for key, amount in before.items():
+        deltas[key] -= amount
+    return deltas
+
+
+@contextmanager
+def track_balances(expense_ids):
+    """move the balances tables by whatever the wrapped block changes in these expenses.
+
+    the affected expenses are aggregated before and after the block (both
+    flushed), and the difference is applied as deltas; the caller commits.
+    The change feed (changes.py) and report caches are updated from the same
+    before / after snapshots.
+    """
+    expense_ids = list(expense_ids)
+    db.session.flush()
+    before = debt_totals(expense_ids)
+    groups_before = group_positions(expense_ids)
+    audience_before = expense_audience(expense_ids)
+
+    yield
+
+    db.session.flush()
+    apply_deltas(_diff(before, debt_totals(expense_ids)))
+    apply_group_deltas(_diff(groups_before, group_positions(expense_ids)))
+
+    audience_after = expense_audience(expense_ids)
+    record_changes(audience_before, audience_after)
+
+    # reports of everyone involved, before or after, are stale once this commits
+    invalidate_reports(set().union(*audience_before.values(), *audience_after.values()))
+
+
+def balance_drift() -> list[tuple[uuid.UUID, uuid.UUID, int, int]]:
+    """(creditor, debtor, stored, expected) for every pair where the table is off"""
+    expected = debt_totals()
+    stored = {
+        (creditor, debtor): amount
+        for creditor, debtor, amount in db.session.execute(
+            select(Balance.creditor_id, Balance.debtor_id, Balance.amount)
+        ).all()
+    }
+
+    drift = []
+    for pair in expected.keys() | stored.keys():
+        if stored.get(pair, 0) != expected.get(pair, 0):
+            drift.append((*pair, stored.get(pair, 0), expected.get(pair, 0)))
+    return drift
+
+
+def group_balance_drift() -> list[tuple[uuid.UUID, uuid.UUID, int, int]]:
+    """(group_id, user_id, stored, expected) for every group position that is off"""
+    expected = group_positions()
+    stored = {
+        (group_id, user_id): amount
+        for group_id, user_id, amount in db.session.execute(
+            select(GroupBalance.group_id, GroupBalance.user_id, GroupBalance.amount)
+        ).all()
+    }
+
+    drift = []
+    for key in expected.keys() | stored.keys():
+        if stored.get(key, 0) != expected.get(key, 0):
+            drift.append((*key, stored.get(key, 0), expected.get(key, 0)))
+    return drift
+
+
+def rebuild_balances():
+    """recompute the balances and group_balances tables from expense_participants"""
+    db.session.execute(delete(Balance))
+    rows = [
+        {'creditor_id': creditor, 'debtor_id': debtor, 'amount': amount}
+        for (creditor, debtor), amount in debt_totals().items()
+        if amount
+    ]
+    if rows:
+        db.session.execute(insert(Balance), rows)
+
+    db.session.execute(delete(GroupBalance))
+    group_rows = [
+        {'group_id': group_id, 'user_id': user_id, 'amount': amount}
+        for (group_id, user_id), amount in group_positions().items()
+        if amount
+    ]
+    if group_rows:
+        db.session.execute(insert(GroupBalance), group_rows)
+
+    db.session.commit()
+    return len(rows)
+
+
+@job_handler('rebuild_balances')
+def run_rebuild_job(job):
+    """`flask jobs enqueue rebuild_balances`: the rebuild off the request / cli path"""
+    return {'pairs': rebuild_balances()}
+
+
+balances_cli = AppGroup('balances', help='Maintain the materialized balances table.')
+
+
+@balances_cli.command('verify')
+def verify_command():
+    """Report pairs whose stored balance drifted from expense_participants."""
+    drift = balance_drift()
+    for creditor, debtor, stored, expected in drift:
+        click.echo(f'{debtor} -> {creditor}: stored {stored}, expected {expected}')
+    click.echo(f'{len(drift)} drifted pair(s)')
+
+    group_drift = group_balance_drift()
+    for group_id, user_id, stored, expected in group_drift:
+        click.echo(f'{user_id} in group {group_id}: stored {stored}, expected {expected}')
+    click.echo(f'{len(group_drift)} drifted group position(s)')
+
+    if drift or group_drift:
+        raise SystemExit(1)
+
+
+@balances_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the balances table from scratch."""
+    drift = balance_drift()
+    group_drift = group_balance_drift()
+    count = rebuild_balances()
+    click.echo(f'rebuilt {count} pair(s), fixed {len(drift)} drifted pair(s) '
+               f'and {len(group_drift)} group position(s)')
+
+
+def init_app(app: Flask):
+    app.cli.add_command(balances_cli)
@@ -1,11 +1,29 @@
+import os
 from flask import Flask
+from flask_migrate import Migrate, upgrade
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+from .routing import RoutingSession, init_app as init_routing
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+migrate = Migrate()
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'migrations')
 
 def init_app(app: Flask):
     db.init_app(app)
+    migrate.init_app(app, db, directory=MIGRATIONS_DIR)
+    init_routing(app)
     from .user import User
     from .expense import Expense, ExpenseParticipant, SplitMethod
-    with app.app_context():
-        db.create_all()
+    from .balance import Balance, GroupBalance
+    from .group import Group, GroupMember
+    from .idempotency import IdempotencyKey
+    from .change import ExpenseChange, ChangeCounter
+    from .job import Job, JobStatus
+
+    # the schema is managed by the migrations (flask db upgrade), dev and
+    # test databases are brought up to date on startup
+    if app.config.get('AUTO_MIGRATE'):
+        with app.app_context():
+            upgrade(directory=MIGRATIONS_DIR)
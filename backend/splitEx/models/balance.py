@@ -0,0 +1,46 @@
+from . import db
+from .types import GUID
+
+class Balance(db.Model):
+    """running total of what `debtor` owes `creditor` across all expenses.
+
+    maintained incrementally by splitEx.ledger.track_balances, rebuilt from
+    expense_participants with `flask balances rebuild`
+    """
+    __tablename__ = 'balances'
+    __table_args__ = (
+        # lookups from the debtor side, the pk already covers the creditor side
+        db.Index('ix_balances_debtor_id', 'debtor_id'),
+    )
+
+    creditor_id = db.Column(GUID(), db.ForeignKey('users.id'), primary_key=True)
+    debtor_id = db.Column(GUID(), db.ForeignKey('users.id'), primary_key=True)
+    amount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, creditor_id, debtor_id, amount=0):
+        self.creditor_id = creditor_id
+        self.debtor_id = debtor_id
+        self.amount = amount
+
+    def __repr__(self):
+        return f'<Balance {self.debtor_id} owes {self.creditor_id} {self.amount}>'
+
+class GroupBalance(db.Model):
+    """net position of `user_id` within a group, positive means the user is owed money.
+
+    maintained alongside Balance by splitEx.ledger.track_balances, so group
+    balances don't aggregate every expense of the group on read
+    """
+    __tablename__ = 'group_balances'
+
+    group_id = db.Column(GUID(), db.ForeignKey('groups.id'), primary_key=True)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), primary_key=True)
+    amount = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, group_id, user_id, amount=0):
+        self.group_id = group_id
+        self.user_id = user_id
+        self.amount = amount
+
+    def __repr__(self):
+        return f'<GroupBalance {self.user_id} in {self.group_id} {self.amount}>'
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from . import db
+from .types import GUID
+
+class ExpenseChange(db.Model):
+    """one entry of a user's change feed: `expense_id` changed (or, with
+    deleted set, is gone for this user: deleted, or the user was removed).
+
+    written by splitEx.changes when a transaction touching expenses commits,
+    no foreign key to expenses so tombstones outlive the expense
+    """
+    __tablename__ = 'expense_changes'
+    __table_args__ = (
+        # purge of old entries
+        db.Index('ix_expense_changes_changed_at', 'changed_at'),
+    )
+
+    # the feed, WHERE user_id = ? AND seq > ? ORDER BY seq, is a range of the pk
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), primary_key=True)
+    seq = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=False)
+    expense_id = db.Column(GUID(), nullable=False)
+    deleted = db.Column(db.Boolean, nullable=False, default=False)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ExpenseChange {self.seq} {self.expense_id} for {self.user_id}>'
+
+class ChangeCounter(db.Model):
+    """per user row handing out the seqs of that user's feed.
+
+    bumping it locks the row until commit, so the user's seqs become visible
+    in order and a reader's `since` never skips a change that commits late;
+    writes touching different users don't wait for each other.
+    purged_through is the user's last seq removed by `flask changes purge`
+    """
+    __tablename__ = 'change_counters'
+
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), primary_key=True)
+    value = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), nullable=False, default=0)
+    purged_through = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ChangeCounter {self.value} for {self.user_id}>'
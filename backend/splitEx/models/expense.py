@@ -1,10 +1,11 @@
-from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import uuid
 import enum
 
+from sqlalchemy import exists, select
+
 from . import db
-from .user_expenses import user_expenses
+from .types import GUID
 
 class SplitMethod(enum.Enum):
     EQUAL = "equal"
@@ -12,8 +13,18 @@ class SplitMethod(enum.Enum):
 
 class Expense(db.Model):
     __tablename__ = 'expenses'
+    __table_args__ = (
+        # keyset pagination of the expense listing, ordered on (date, id)
+        db.Index('ix_expenses_date_id', 'date', 'id'),
+        # expenses paid by a user (balances, update / delete checks)
+        db.Index('ix_expenses_payer_id', 'payer_id'),
+        # group listing (keyset on date, id) and group summaries
+        db.Index('ix_expenses_group_id_date_id', 'group_id', 'date', 'id'),
+        # covers the per payer group summary, no table reads
+        db.Index('ix_expenses_group_id_payer_id', 'group_id', 'payer_id', 'total_amount', 'date'),
+    )
 
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
     title = db.Column(db.String(100), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
     split_method = db.Column(db.Enum(SplitMethod), default=SplitMethod.EQUAL, nullable=False)
@@ -21,34 +32,51 @@ class Expense(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # optimistic concurrency: every ORM update / delete checks and bumps it, a
+    # concurrent writer that got there first makes it raise StaleDataError
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+
     # foreign Keys
-    payer_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=True)
+    payer_id = db.Column(GUID(), db.ForeignKey('users.id'), nullable=True)
+    group_id = db.Column(GUID(), db.ForeignKey('groups.id'), nullable=True)
 
     # relationships
-    users = db.relationship('User', secondary=user_expenses, back_populates='expenses')
+    # membership is read off expense_participants, write through participants
+    users = db.relationship('User', secondary='expense_participants', viewonly=True)
     participants = db.relationship('ExpenseParticipant', backref='expense', cascade="all, delete-orphan")
 
-    def __init__(self, title, total_amount, split_method=SplitMethod.EQUAL, date=None, payer_id=None):
+    __mapper_args__ = {'version_id_col': version}
+
+    def __init__(self, title, total_amount, split_method=SplitMethod.EQUAL, date=None, payer_id=None, group_id=None):
+        # assigned up front (not at flush) so the id can be used before the first flush
+        self.id = uuid.uuid4()
         self.title = title
         self.total_amount = total_amount
         self.split_method = split_method
         self.date = date or datetime.utcnow().date()
         self.payer_id = payer_id
+        self.group_id = group_id
 
     def __repr__(self):
         return f'<Expense {self.title}>'
 
 class ExpenseParticipant(db.Model):
     __tablename__ = 'expense_participants'
+    __table_args__ = (
+        # one row per user and expense, also serves lookups by expense_id alone
+        db.UniqueConstraint('expense_id', 'user_id', name='uq_expense_participants_expense_id_user_id'),
+        # participations of a user (balances, reports)
+        db.Index('ix_expense_participants_user_id', 'user_id'),
+    )
 
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
     amount = db.Column(db.Integer, nullable=False)
     item = db.Column(db.String(100), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # foreign Keys
-    expense_id = db.Column(UUID(as_uuid=True), db.ForeignKey('expenses.id'), nullable=False)
-    user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.id'), nullable=False)
+    expense_id = db.Column(GUID(), db.ForeignKey('expenses.id'), nullable=False)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), nullable=False)
 
     def __init__(self, expense_id, user_id, amount, item=None):
         self.expense_id = expense_id
@@ -58,3 +86,21 @@ class ExpenseParticipant(db.Model):
 
     def __repr__(self):
         return f'<ExpenseParticipant {self.user_id} in {self.expense_id}>'
+
+def lock_expense(expense_id):
+    """the expense with its row locked (SELECT ... FOR UPDATE) until the transaction ends.
+
+    concurrent writers of the same expense queue up instead of interleaving;
+    databases without row locks (sqlite) fall back on the version check
+    """
+    return db.session.get(Expense, expense_id, with_for_update=True)
+
+def participant_exists_query(expense_id, user_id):
+    return select(exists().where(
+        ExpenseParticipant.expense_id == expense_id,
+        ExpenseParticipant.user_id == user_id
+    ))
+
+def is_participant(expense_id, user_id) -> bool:
+    """single EXISTS lookup on (expense_id, user_id), no collection load"""
+    return db.session.scalar(participant_exists_query(expense_id, user_id))
@@ -0,0 +1,56 @@
+from sqlalchemy import exists, select
+from datetime import datetime
+import uuid
+
+from . import db
+from .types import GUID
+
+class Group(db.Model):
+    """a trip / household, its expenses are visible to every member"""
+    __tablename__ = 'groups'
+
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
+    name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    # foreign Keys
+    created_by = db.Column(GUID(), db.ForeignKey('users.id'), nullable=True)
+
+    # relationships
+    members = db.relationship('User', secondary='group_members', viewonly=True)
+
+    def __init__(self, name, created_by=None):
+        self.id = uuid.uuid4()
+        self.name = name
+        self.created_by = created_by
+
+    def __repr__(self):
+        return f'<Group {self.name}>'
+
+class GroupMember(db.Model):
+    __tablename__ = 'group_members'
+    __table_args__ = (
+        # groups of a user, the pk covers members of a group
+        db.Index('ix_group_members_user_id', 'user_id'),
+    )
+
+    group_id = db.Column(GUID(), db.ForeignKey('groups.id'), primary_key=True)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), primary_key=True)
+    joined_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, group_id, user_id):
+        self.group_id = group_id
+        self.user_id = user_id
+
+    def __repr__(self):
+        return f'<GroupMember {self.user_id} in {self.group_id}>'
+
+def group_member_exists_query(group_id, user_id):
+    return select(exists().where(
+        GroupMember.group_id == group_id,
+        GroupMember.user_id == user_id
+    ))
+
+def is_group_member(group_id, user_id) -> bool:
+    """single EXISTS lookup on the (group_id, user_id) pk"""
+    return db.session.scalar(group_member_exists_query(group_id, user_id))
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from . import db
+from .types import GUID
+
+class IdempotencyKey(db.Model):
+    """stored response of a write request sent with an `Idempotency-Key` header.
+
+    status_code is null while the first request is still running; rows older
+    than IDEMPOTENCY_KEY_TTL are ignored and purged with `flask idempotency purge`
+    """
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        # purge of expired keys
+        db.Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
+
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)
+    status_code = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    content_type = db.Column(db.String(100), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __init__(self, user_id, key, fingerprint):
+        self.user_id = user_id
+        self.key = key
+        self.fingerprint = fingerprint
+        self.created_at = datetime.utcnow()
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.key} of {self.user_id}>'
@@ -0,0 +1,73 @@
+from datetime import datetime
+import enum
+import json
+import uuid
+
+from . import db
+from .types import GUID
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+class Job(db.Model):
+    """a unit of background work, run by `python worker.py` / `flask jobs work`.
+
+    a worker claiming a job sets run_at to the end of its lease; a running
+    job whose lease ran out (worker died) is claimed again. `result` holds
+    the handler's result once succeeded, or its progress while running
+    """
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        # the worker's claim: status in (queued, running) AND run_at <= now ORDER BY run_at
+        db.Index('ix_jobs_status_run_at', 'status', 'run_at'),
+        # the user's jobs, newest first
+        db.Index('ix_jobs_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
+    kind = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(GUID(), db.ForeignKey('users.id'), nullable=True)
+    payload = db.Column(db.Text, nullable=True)
+    status = db.Column(db.Enum(JobStatus), nullable=False, default=JobStatus.QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100), nullable=True)
+    result = db.Column(db.Text, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    # the worker id this instance was claimed with (not a column, it doesn't
+    # change when the row is reloaded): checkpoints and the outcome are only
+    # written while the row is still locked_by it
+    lease_owner = None
+
+    def __init__(self, kind, payload=None, user_id=None, max_attempts=3):
+        now = datetime.utcnow()
+        self.id = uuid.uuid4()
+        self.kind = kind
+        self.payload = json.dumps(payload) if payload is not None else None
+        self.user_id = user_id
+        self.status = JobStatus.QUEUED
+        self.attempts = 0
+        self.max_attempts = max_attempts
+        self.run_at = now
+        self.created_at = now
+
+    @property
+    def data(self):
+        """the payload, decoded"""
+        return json.loads(self.payload) if self.payload is not None else None
+
+    @property
+    def progress(self):
+        """what the handler saved so far (or its result once succeeded)"""
+        return json.loads(self.result) if self.result is not None else None
+
+    def __repr__(self):
+        return f'<Job {self.kind} {self.id} {self.status.value}>'
@@ -0,0 +1,97 @@
+"""primary / read replica routing for db.session.
+
+Views decorated with @replica_read send their SELECTs to the "replica" bind
+(SQLALCHEMY_BINDS, see configs.replica_binds) when one is configured.
+Everything else goes to the primary, and so do reads:
+
+- outside a @replica_read view, or before the JWT identity is known
+- of a request that already wrote something (flush)
+- of a user who committed a write less than REPLICA_STICKY_SECONDS ago, so
+  users always read their own writes despite replication lag
+
+Other users may read a lagging replica, so a request that did
+(read_replica_used) doesn't store what it read in caches that are keyed on
+the primary's state.
+"""
+
+from functools import wraps
+
+from flask import Flask, current_app, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from ..cache import LocalCache, TieredCache, make_shared_backend
+
+REPLICA_BIND_KEY = 'replica'
+
+
+def replica_read(fn):
+    """mark a view as read only, its queries may go to the read replica"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        g.replica_read = True
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def read_replica_used() -> bool:
+    """did this request read anything from the replica? its results may be
+    behind the primary, so they shouldn't fill caches keyed on primary state"""
+    return has_request_context() and g.get('read_replica', False)
+
+
+def _identity():
+    jwt_data = g.get('_jwt_extended_jwt') or {}
+    return jwt_data.get('sub')
+
+
+def _sticky_key(identity):
+    return f'primary:{identity}'
+
+
+class RoutingSession(Session):
+    def _reads_from_replica(self, clause):
+        if not has_request_context() or not g.get('replica_read'):
+            return False
+        if REPLICA_BIND_KEY not in self._db.engines:
+            return False
+        if self._flushing or g.get('db_wrote') or getattr(clause, 'is_dml', False):
+            return False
+
+        identity = _identity()
+        if identity is None:
+            return False
+        return current_app.extensions['replica_sticky'].get(_sticky_key(identity)) is None
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            g.read_replica = True
+            return self._db.engines[REPLICA_BIND_KEY]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _remember_write(session, flush_context):
+    if has_request_context():
+        g.db_wrote = True
+
+
+def _stick_to_primary(session):
+    if not has_request_context() or not g.get('db_wrote'):
+        return
+    identity = _identity()
+    if identity is not None:
+        current_app.extensions['replica_sticky'].set(
+            _sticky_key(identity), True, current_app.config.get('REPLICA_STICKY_SECONDS', 10)
+        )
+
+
+def init_app(app: Flask):
+    ttl = app.config.get('REPLICA_STICKY_SECONDS', 10)
+    app.extensions['replica_sticky'] = TieredCache(
+        LocalCache(maxsize=65536, ttl=ttl),
+        make_shared_backend(app.config.get('CACHE_URL'), ttl=ttl),
+    )
+
+    if not event.contains(RoutingSession, 'after_flush', _remember_write):
+        event.listen(RoutingSession, 'after_flush', _remember_write)
+        event.listen(RoutingSession, 'after_commit', _stick_to_primary)
@@ -1,18 +1,17 @@
 '''also add some helper functions, to quickly implement in routes, such as adding a participant, calculating total amount an user has to '''
 
-from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import uuid
 from typing import Optional
 from werkzeug.security import check_password_hash
 
 from . import db
-from .user_expenses import user_expenses
+from .types import GUID
 
 class User(db.Model):
     __tablename__ = 'users'
 
-    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = db.Column(GUID(), primary_key=True, default=uuid.uuid4)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
     username = db.Column(db.String(50), unique=True, nullable=False, index=True)
     name = db.Column(db.String(100), nullable=True)
@@ -23,7 +22,7 @@ class User(db.Model):
     ipAddress = db.Column(db.String(45), nullable=True, default='unknownIp')
 
     # relationships
-    expenses = db.relationship('Expense', secondary=user_expenses, back_populates='users')
+    expenses = db.relationship('Expense', secondary='expense_participants', viewonly=True)
     paid_expenses = db.relationship('Expense', backref='paid_by', foreign_keys='Expense.payer_id')
     participations = db.relationship('ExpenseParticipant', backref='user')
 
@@ -0,0 +1,116 @@
+"""password hashing off the request thread.
+
+The KDFs are deliberately slow, so hashing and verification run on a small
+process pool. The pool accepts at most PASSWORD_HASH_WORKERS +
+PASSWORD_HASH_QUEUE_DEPTH jobs at a time, counting from submission until the
+job finishes in the pool (not until the request stops waiting for it); past
+that `PasswordPoolSaturated` is raised and the auth routes answer 429 instead
+of piling up requests. A job taking longer than PASSWORD_HASH_TIMEOUT raises
+`PasswordPoolTimeout` (503). With PASSWORD_HASH_WORKERS = 0 everything runs
+inline (dev / tests).
+"""
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from flask import Flask, current_app
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class PasswordPoolSaturated(Exception):
+    """every worker is busy and the queue is full"""
+
+
+class PasswordPoolTimeout(Exception):
+    """a job didn't finish within PASSWORD_HASH_TIMEOUT"""
+
+
+def normalize_method(method: str) -> str:
+    """werkzeug method string with its defaults spelled out, as stored in hashes"""
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:32768:8:1'
+    if name == 'pbkdf2':
+        if not args:
+            return f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}'
+        if len(args) == 1:
+            return f'pbkdf2:{args[0]}:{DEFAULT_PBKDF2_ITERATIONS}'
+    return method
+
+
+class PasswordPool:
+    def __init__(self, workers, queue_depth, timeout):
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(workers + queue_depth) if workers else None
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+
+    def _executor(self):
+        # created lazily and per process, a pool inherited through fork is unusable
+        with self.lock:
+            if self.executor is None or self.pid != os.getpid():
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+                self.pid = os.getpid()
+            return self.executor
+
+    def run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+
+        if not self.slots.acquire(blocking=False):
+            raise PasswordPoolSaturated()
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # the slot is held until the job is done in the pool, a request that
+        # gave up waiting doesn't free it for the next one early
+        future.add_done_callback(lambda future: self.slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise PasswordPoolTimeout() from None
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor is not None and self.pid == os.getpid():
+                self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+def hash_password(password: str) -> str:
+    config = current_app.config
+    return current_app.extensions['password_pool'].run(
+        generate_password_hash, password,
+        config['PASSWORD_HASH_METHOD'], config['PASSWORD_SALT_LENGTH']
+    )
+
+
+def verify_password(password_hash: str, password: str) -> bool:
+    return current_app.extensions['password_pool'].run(check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """True if the hash was made with other parameters than the configured ones"""
+    try:
+        method, salt, _ = password_hash.split('$', 2)
+    except ValueError:
+        return True
+    config = current_app.config
+    return (
+        method != normalize_method(config['PASSWORD_HASH_METHOD'])
+        or len(salt) != config['PASSWORD_SALT_LENGTH']
+    )
+
+
+def init_app(app: Flask):
+    app.extensions['password_pool'] = PasswordPool(
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 0),
+        queue_depth=app.config.get('PASSWORD_HASH_QUEUE_DEPTH', 0),
+        timeout=app.config.get('PASSWORD_HASH_TIMEOUT', 10),
+    )
@@ -0,0 +1,155 @@
+"""EXPLAIN checks for the hot lookup paths.
+
+`flask schema check-plans` runs EXPLAIN on the queries behind the hot routes
+against the configured database and exits non zero if any of them reads a
+table with a sequential scan instead of an index. On Postgres seq scans are
+disabled for the check, so a "Seq Scan" in the plan means no usable index
+exists at all rather than that the planner preferred one on a small table.
+
+`flask schema sizes` prints the on disk size of every table and index, to
+compare storage changes (run it before and after a migration).
+"""
+
+import uuid
+from datetime import date, datetime
+
+import click
+from flask import Flask
+from flask.cli import AppGroup
+from sqlalchemy import text
+
+from .changes import changes_query
+from .jobs import due_jobs_query
+from .ledger import group_balances_query, user_balances_query
+from .models import db
+from .models.expense import participant_exists_query
+from .models.group import group_member_exists_query
+from .models.user import User
+from .reports import report_query
+from .response_cache import expense_version_query
+from .user_search import prefix_query
+
+
+def hot_queries():
+    """(name, statement) for every hot lookup, with placeholder ids.
+
+    the statements come from the builders the routes execute, so a route's
+    query and its check can't drift apart
+    """
+    # imported here, the routes import this package's modules at load time
+    from .routes.balance_routes import user_expense_ids_query
+    from .routes.expense_routes import export_query, page_query, user_expenses_query
+    from .routes.group_routes import (
+        group_expenses_query, group_members_balance_query, group_payer_totals_query, user_groups_query
+    )
+    from .routes.job_routes import user_jobs_query
+    from .routes.participant_routes import expense_participants_query, participant_query
+
+    user_id, expense_id, group_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    cursor = (date(2026, 1, 1), uuid.uuid4())
+    return [
+        ('expense feed by user', user_expenses_query(user_id)),
+        ('expense page by user', page_query(user_expenses_query(user_id), 51, cursor)),
+        ('expense export by user', export_query(user_id)),
+        ('participant by expense and user', participant_query(expense_id, user_id)),
+        ('participants of expense', expense_participants_query(expense_id)),
+        ('expenses of user', user_expense_ids_query(user_id)),
+        ('membership check', participant_exists_query(expense_id, user_id)),
+        ('group expense page', page_query(group_expenses_query(group_id), 51, cursor)),
+        ('group membership check', group_member_exists_query(group_id, user_id)),
+        ('groups of user', user_groups_query(user_id)),
+        ('group summary', group_payer_totals_query(group_id)),
+        ('group summary members', group_members_balance_query(group_id)),
+        ('group balances', group_balances_query(group_id)),
+        ('report by month', report_query(user_id, 'month')),
+        ('expense version', expense_version_query(expense_id, user_id)),
+        ('change feed of user', changes_query(user_id, 0, 501)),
+        ('balances of user', user_balances_query(user_id)),
+        ('user by username', User.query.filter_by(username='someone')),
+        ('user search by username', prefix_query(User.username, 'som', 10)),
+        ('user search by email', prefix_query(User.email, 'someone@ex', 10)),
+        ('due jobs', due_jobs_query(datetime(2026, 1, 1))),
+        ('jobs of user', user_jobs_query(user_id)),
+    ]
+
+
+def explain(connection, statement) -> list[str]:
+    """plan lines of a statement (or ORM query), in the dialect's own EXPLAIN format"""
+    statement = getattr(statement, 'statement', statement)
+    dialect = connection.dialect
+    sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+    if dialect.name == 'sqlite':
+        return [row[-1] for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
+    return [row[0] for row in connection.exec_driver_sql('EXPLAIN ' + sql)]
+
+
+def sequential_scans(dialect_name, plan) -> list[str]:
+    """the plan lines that read a whole table"""
+    if dialect_name == 'sqlite':
+        # "SCAN t" is a full table scan, "SCAN t USING [COVERING] INDEX i" walks an index
+        return [
+            line for line in plan
+            if line.startswith('SCAN ') and ' USING ' not in line and line != 'SCAN CONSTANT ROW'
+        ]
+    return [line.strip() for line in plan if 'Seq Scan' in line]
+
+
+def check_plans():
+    """{query name: sequential scan lines} for every hot query that has one"""
+    failures = {}
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(text('SET enable_seqscan = off'))
+        for name, statement in hot_queries():
+            scans = sequential_scans(connection.dialect.name, explain(connection, statement))
+            if scans:
+                failures[name] = scans
+        connection.rollback()
+    return failures
+
+
+def relation_sizes(connection) -> list[tuple[str, str, int]]:
+    """(table, relation, bytes) of every table and index, indexes under their table"""
+    if connection.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql(
+            "SELECT coalesce(t.relname, c.relname), c.relname, pg_relation_size(c.oid) FROM pg_class c "
+            "LEFT JOIN pg_index i ON i.indexrelid = c.oid LEFT JOIN pg_class t ON t.oid = i.indrelid "
+            "WHERE c.relkind IN ('r', 'i') AND c.relnamespace = 'public'::regnamespace"
+        )
+    else:
+        # needs sqlite built with the dbstat table (SQLITE_ENABLE_DBSTAT_VTAB)
+        rows = connection.exec_driver_sql(
+            "SELECT coalesce(m.tbl_name, s.name), s.name, sum(s.pgsize) FROM dbstat s "
+            "LEFT JOIN sqlite_master m ON m.name = s.name GROUP BY s.name"
+        )
+    return sorted((tuple(row) for row in rows), key=lambda row: (row[0], row[1] != row[0], row[1]))
+
+
+schema_cli = AppGroup('schema', help='Schema health checks.')
+
+
+@schema_cli.command('check-plans')
+def check_plans_command():
+    """Fail if a hot query falls back to a sequential scan."""
+    failures = check_plans()
+    for name, scans in failures.items():
+        click.echo(f'{name}: {"; ".join(scans)}')
+    click.echo(f'{len(hot_queries()) - len(failures)}/{len(hot_queries())} hot queries use indexes')
+    if failures:
+        raise SystemExit(1)
+
+
+@schema_cli.command('sizes')
+def sizes_command():
+    """Print the size of every table and its indexes."""
+    with db.engine.connect() as connection:
+        sizes = relation_sizes(connection)
+    for table, relation, size in sizes:
+        click.echo(f'{relation if relation == table else "  " + relation:<48} {size / 1024:>12,.0f} KiB')
+    indexes = sum(size for table, relation, size in sizes if relation != table)
+    click.echo(f'{"total":<48} {sum(size for _, _, size in sizes) / 1024:>12,.0f} KiB, indexes {indexes / 1024:,.0f} KiB')
+
+
+def init_app(app: Flask):
+    app.cli.add_command(schema_cli)
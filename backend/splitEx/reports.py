@@ -0,0 +1,151 @@
+"""aggregate expense reports, grouped in SQL.
+
+A report covers the expenses a user takes part in (optionally within a date
+range), grouped by month, payer, split method or the user's item, with per
+group expense count, total amount, the user's share and what the user paid.
+
+Reports are cached per (user, dimension, range). Instead of deleting keys,
+every user has a generation token that is part of the cache key; writes
+(everything wrapped in ledger.track_balances) replace the token of every
+affected user on commit, so older entries are simply never read again.
+With a shared cache (CACHE_URL) tokens are only kept locally for a few
+seconds, so other processes see a write that quickly. Reports read from the
+replica aren't cached: only the writer is kept on the primary after a write.
+"""
+
+import uuid
+from datetime import date
+from typing import Optional
+
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import case, event, func, select
+from sqlalchemy.orm import Session
+
+from .cache import LocalCache, TieredCache, make_shared_backend
+from .models import db
+from .models.expense import Expense, ExpenseParticipant
+from .models.routing import read_replica_used
+from .models.user import User
+
+REPORT_DIMENSIONS = ('month', 'payer', 'split_method', 'item')
+
+# seconds a process trusts its local copy of a generation token
+GENERATION_LOCAL_TTL = 5
+
+
+def _month(column):
+    """YYYY-MM of a date column"""
+    if db.engine.dialect.name == 'postgresql':
+        return func.to_char(column, 'YYYY-MM')
+    return func.strftime('%Y-%m', column)
+
+
+def _dimension(by):
+    if by == 'month':
+        return _month(Expense.date)
+    if by == 'payer':
+        return User.username
+    if by == 'split_method':
+        return Expense.split_method
+    if by == 'item':
+        return ExpenseParticipant.item
+    raise ValueError(f'by must be one of {", ".join(REPORT_DIMENSIONS)}')
+
+
+def report_query(user_id: uuid.UUID, by: str, since: Optional[date] = None, until: Optional[date] = None):
+    """GROUP BY select behind build_report"""
+    key = _dimension(by).label('key')
+
+    # the user's own participant rows, one per expense (unique constraint)
+    query = select(
+        key,
+        func.count().label('expense_count'),
+        func.sum(Expense.total_amount).label('total_amount'),
+        func.sum(ExpenseParticipant.amount).label('share'),
+        func.sum(case((Expense.payer_id == user_id, Expense.total_amount), else_=0)).label('paid'),
+    ).select_from(ExpenseParticipant).join(
+        Expense, Expense.id == ExpenseParticipant.expense_id
+    ).where(
+        ExpenseParticipant.user_id == user_id
+    ).group_by(key).order_by(key)
+
+    if by == 'payer':
+        query = query.outerjoin(User, User.id == Expense.payer_id)
+    if since is not None:
+        query = query.where(Expense.date >= since)
+    if until is not None:
+        query = query.where(Expense.date <= until)
+    return query
+
+
+def build_report(user_id: uuid.UUID, by: str, since: Optional[date] = None, until: Optional[date] = None) -> list[dict]:
+    """one row per `by` value: expense_count, total_amount, share, paid"""
+    return [{
+        'key': row.key.value if by == 'split_method' else row.key,
+        'expense_count': row.expense_count,
+        'total_amount': row.total_amount,
+        'share': row.share,
+        'paid': row.paid,
+    } for row in db.session.execute(report_query(user_id, by, since, until))]
+
+
+def _generation_key(user_id):
+    return f'report-generation:{user_id}'
+
+
+def _generation(user_id):
+    """current token of the user, a missing (expired / evicted) one starts a new generation"""
+    generations = current_app.extensions['report_generations']
+    key = _generation_key(user_id)
+    token = generations.get(key)
+    if token is None:
+        token = uuid.uuid4().hex
+        generations.set(key, token)
+    return token
+
+
+def user_report(user_id: uuid.UUID, by: str, since: Optional[date] = None, until: Optional[date] = None) -> list[dict]:
+    """build_report through the per (user, dimension, range) cache"""
+    cache = current_app.extensions['report_cache']
+    key = f'report:{user_id}:{_generation(user_id)}:{by}:{since or ""}:{until or ""}'
+
+    rows = cache.get(key)
+    if rows is None:
+        rows = build_report(user_id, by, since, until)
+        # the generation is already the one after the latest write, a lagging
+        # replica's rows would be cached as current until REPORT_CACHE_TTL
+        if not read_replica_used():
+            cache.set(key, rows)
+    return rows
+
+
+def invalidate_reports(user_ids, session=None):
+    """drop the cached reports of these users once the current transaction commits"""
+    session = session or db.session()
+    session.info.setdefault('report_user_ids', set()).update(user_ids)
+
+
+def _bump_after_commit(session):
+    user_ids = session.info.pop('report_user_ids', ())
+    if not user_ids or not has_app_context() or 'report_generations' not in current_app.extensions:
+        return
+    generations = current_app.extensions['report_generations']
+    for user_id in user_ids:
+        generations.set(_generation_key(user_id), uuid.uuid4().hex)
+
+
+def _forget_after_rollback(session, previous_transaction):
+    session.info.pop('report_user_ids', None)
+
+
+def init_app(app: Flask):
+    size, ttl = app.config.get('REPORT_CACHE_SIZE', 2048), app.config.get('REPORT_CACHE_TTL', 600)
+    shared = make_shared_backend(app.config.get('CACHE_URL'), prefix='splitEx:reports:', ttl=ttl)
+    app.extensions['report_cache'] = TieredCache(LocalCache(maxsize=size, ttl=ttl), shared)
+    app.extensions['report_generations'] = TieredCache(
+        LocalCache(maxsize=size, ttl=GENERATION_LOCAL_TTL if shared is not None else ttl), shared
+    )
+
+    if not event.contains(Session, 'after_commit', _bump_after_commit):
+        event.listen(Session, 'after_commit', _bump_after_commit)
+        event.listen(Session, 'after_soft_rollback', _forget_after_rollback)
@@ -0,0 +1,177 @@
+"""ETags and cached JSON payloads for expense reads (single and batched).
+
+The ETag of an expense is derived from `Expense.updated_at`, the number of
+participants and the latest `User.updated_at` of its payer and participants
+(their names are in the payloads); every write route bumps updated_at and
+calls `invalidate_expense` after committing, and a user's rename moves the
+version of every expense they're in. Payloads are cached per expense and
+stored with the ETag they were built for, so a cache entry that missed an
+invalidation (another process) is never served once the version moved on.
+"""
+
+import hashlib
+import uuid
+from typing import NamedTuple, Optional
+
+from flask import Flask, current_app, request
+from sqlalchemy import exists, func, or_, select
+
+from .cache import LocalCache, TieredCache, make_shared_backend
+from .models import db
+from .models.expense import Expense, ExpenseParticipant
+from .models.group import GroupMember
+from .models.user import User
+
+PAYLOAD_KINDS = ('details', 'participants')
+
+
+class ExpenseVersion(NamedTuple):
+    etag: str
+    is_member: bool
+    payer_id: Optional[uuid.UUID]
+
+
+def _expense_versions_query(user_id):
+    participant_count = select(func.count(ExpenseParticipant.id)).where(
+        ExpenseParticipant.expense_id == Expense.id
+    ).scalar_subquery()
+    participants_updated_at = select(func.max(User.updated_at)).join(
+        ExpenseParticipant, ExpenseParticipant.user_id == User.id
+    ).where(ExpenseParticipant.expense_id == Expense.id).scalar_subquery()
+    payer_updated_at = select(User.updated_at).where(User.id == Expense.payer_id).scalar_subquery()
+    # participants and members of the expense's group may read it
+    is_member = or_(
+        exists().where(ExpenseParticipant.expense_id == Expense.id, ExpenseParticipant.user_id == user_id),
+        exists().where(GroupMember.group_id == Expense.group_id, GroupMember.user_id == user_id),
+    )
+    return select(
+        Expense.id, Expense.updated_at, participant_count, is_member, Expense.payer_id,
+        participants_updated_at, payer_updated_at
+    )
+
+
+def expense_version_query(expense_id, user_id):
+    """the query behind expense_version"""
+    return _expense_versions_query(user_id).where(Expense.id == expense_id)
+
+
+def _version_from_row(row):
+    if row is None:
+        return None
+    expense_id, updated_at, count, member, payer_id, participants_updated_at, payer_updated_at = row
+    version = f'{expense_id}:{updated_at}:{count}:{participants_updated_at}:{payer_updated_at}'
+    return ExpenseVersion(hashlib.sha1(version.encode()).hexdigest(), bool(member), payer_id)
+
+
+def expense_version(expense_id: uuid.UUID, user_id: uuid.UUID) -> Optional[ExpenseVersion]:
+    """ETag, membership of user_id and payer of an expense in one query, None if it doesn't exist"""
+    row = db.session.execute(expense_version_query(expense_id, user_id)).one_or_none()
+    return _version_from_row(row)
+
+
+def expense_versions(expense_ids, user_id: uuid.UUID) -> dict[uuid.UUID, ExpenseVersion]:
+    """expense_version of several expenses in one query, ids that don't exist are left out"""
+    rows = db.session.execute(_expense_versions_query(user_id).where(Expense.id.in_(expense_ids)))
+    return {row[0]: _version_from_row(row) for row in rows}
+
+
+async def expense_version_async(session, expense_id: uuid.UUID, user_id: uuid.UUID) -> Optional[ExpenseVersion]:
+    """expense_version on an AsyncSession"""
+    row = (await session.execute(expense_version_query(expense_id, user_id))).one_or_none()
+    return _version_from_row(row)
+
+
+def _cache_key(expense_id, kind):
+    return f'expense:{expense_id}:{kind}'
+
+
+def _cached_body(expense_id, kind, etag):
+    cached = current_app.extensions['response_cache'].get(_cache_key(expense_id, kind))
+    if cached is not None and cached['etag'] == etag:
+        return cached['body']
+    return None
+
+
+def _json_response(body, etag, status=200):
+    if body is None:
+        response = current_app.response_class(status=status)
+    else:
+        response = current_app.response_class(body + '\n', status=status, mimetype='application/json')
+    response.set_etag(etag)
+    # always revalidate, the 304 makes that cheap
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _variant(kind, etag, variant):
+    """cache kind and etag for one representation (e.g. a ?fields= selection) of a payload.
+
+    only the plain kinds are deleted by invalidate_expense, variants can't be
+    served stale either way since the stored etag is compared on read
+    """
+    if not variant:
+        return kind, etag
+    suffix = hashlib.sha1(variant.encode()).hexdigest()[:12]
+    return f'{kind}:{suffix}', f'{etag}-{suffix}'
+
+
+def cached_json_response(expense_id, kind, etag, build, variant=None):
+    """304 if the client has `etag`, else the cached payload, else build() serialized and cached"""
+    kind, etag = _variant(kind, etag, variant)
+    if request.if_none_match.contains(etag):
+        return _json_response(None, etag, status=304)
+
+    body = _cached_body(expense_id, kind, etag)
+    if body is None:
+        body = current_app.json.dumps(build())
+        current_app.extensions['response_cache'].set(_cache_key(expense_id, kind), {'etag': etag, 'body': body})
+    return _json_response(body, etag)
+
+
+def cached_json_bodies(etags, kind, build, variant=None) -> dict:
+    """serialized payloads of several expenses ({expense_id: etag}), the cached ones
+    as stored, the rest from one build(missing ids) -> {expense_id: payload} call and
+    cached. expenses build() doesn't return are left out
+    """
+    bodies, missing = {}, {}
+    for expense_id, etag in etags.items():
+        variant_kind, variant_etag = _variant(kind, etag, variant)
+        body = _cached_body(expense_id, variant_kind, variant_etag)
+        if body is None:
+            missing[expense_id] = (variant_kind, variant_etag)
+        else:
+            bodies[expense_id] = body
+
+    if missing:
+        cache = current_app.extensions['response_cache']
+        for expense_id, payload in build(list(missing)).items():
+            variant_kind, variant_etag = missing[expense_id]
+            bodies[expense_id] = current_app.json.dumps(payload)
+            cache.set(_cache_key(expense_id, variant_kind), {'etag': variant_etag, 'body': bodies[expense_id]})
+    return bodies
+
+
+async def cached_json_response_async(expense_id, kind, etag, build, variant=None):
+    """cached_json_response for an async build()"""
+    kind, etag = _variant(kind, etag, variant)
+    if request.if_none_match.contains(etag):
+        return _json_response(None, etag, status=304)
+
+    body = _cached_body(expense_id, kind, etag)
+    if body is None:
+        body = current_app.json.dumps(await build())
+        current_app.extensions['response_cache'].set(_cache_key(expense_id, kind), {'etag': etag, 'body': body})
+    return _json_response(body, etag)
+
+
+def invalidate_expense(expense_id):
+    cache = current_app.extensions['response_cache']
+    for kind in PAYLOAD_KINDS:
+        cache.delete(_cache_key(expense_id, kind))
+
+
+def init_app(app: Flask):
+    app.extensions['response_cache'] = TieredCache(
+        LocalCache(maxsize=app.config.get('RESPONSE_CACHE_SIZE', 2048), ttl=app.config.get('RESPONSE_CACHE_TTL', 300)),
+        make_shared_backend(app.config.get('CACHE_URL'), ttl=app.config.get('RESPONSE_CACHE_TTL', 300)),
+    )
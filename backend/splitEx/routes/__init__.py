@@ -1,8 +1,16 @@
 from .auth_routes import auth_bp
 from .expense_routes import expense_bp
 from .participant_routes import participant_bp
+from .balance_routes import balance_bp
+from .group_routes import group_bp
+from .report_routes import report_bp
+from .job_routes import job_bp
 
 def init_app(app):
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(expense_bp, url_prefix='/api/expenses')
     app.register_blueprint(participant_bp, url_prefix='/api/participants')
+    app.register_blueprint(balance_bp, url_prefix='/api/balances')
+    app.register_blueprint(group_bp, url_prefix='/api/groups')
+    app.register_blueprint(report_bp, url_prefix='/api/reports')
+    app.register_blueprint(job_bp, url_prefix='/api/jobs')
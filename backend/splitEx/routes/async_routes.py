@@ -0,0 +1,129 @@
+"""async versions of the hot read routes, used in the async serving mode.
+
+splitEx/asgi.py dispatches requests for these endpoints (of expense_bp /
+participant_bp) to the views here on the server's event loop, after checking
+the jwt, so urls and responses don't change. Under WSGI the sync views run.
+"""
+
+from flask import jsonify
+from flask_jwt_extended import get_jwt_identity, get_current_user
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, selectinload
+import uuid
+
+from ..async_db import async_session
+from ..changes import current_seq_query
+from ..models.expense import Expense, ExpenseParticipant
+from ..response_cache import cached_json_response_async, expense_version_async
+from ..serializers import (
+    PARTICIPANT_FIELDS, expense_to_dict, expenses_to_columns, expenses_to_dicts, participants_to_dicts,
+    request_fields, wants_columns
+)
+
+
+def _eager(query):
+    return query.options(
+        selectinload(Expense.participants).joinedload(ExpenseParticipant.user),
+        joinedload(Expense.paid_by)
+    )
+
+
+async def get_user_expenses():
+    """Get all expenses for the current user"""
+    try:
+        user = get_current_user()
+
+        try:
+            fields = request_fields()
+            columns = wants_columns()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        async with async_session() as session:
+            # before the expenses, as in the sync view
+            headers = {'X-Change-Seq': str(await session.scalar(current_seq_query(user.id)) or 0)}
+            expenses = (await session.scalars(
+                _eager(select(Expense).join(Expense.participants).where(ExpenseParticipant.user_id == user.id))
+            )).unique().all()
+            result = expenses_to_columns(expenses, fields) if columns else expenses_to_dicts(expenses, fields)
+
+        return jsonify(result), 200, headers
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+async def get_expense_details(expense_id):
+    """Get details of a specific expense (public route requiring participant membership)"""
+    user_id = get_jwt_identity()
+
+    try:
+        try:
+            fields = request_fields()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        expense_id = uuid.UUID(expense_id)
+        async with async_session() as session:
+            version = await expense_version_async(session, expense_id, uuid.UUID(user_id))
+            if not version:
+                return jsonify({'error': 'Expense not found'}), 404
+
+            if not version.is_member:
+                return jsonify({'error': 'You do not have permission to view this expense'}), 403
+
+            async def build():
+                expense = (await session.scalars(
+                    _eager(select(Expense).where(Expense.id == expense_id))
+                )).one()
+                return expense_to_dict(expense, fields)
+
+            return await cached_json_response_async(
+                expense_id, 'details', version.etag, build, variant=fields and ','.join(fields)
+            )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+async def get_expense_participants(expense_id):
+    """Get all participants for an expense"""
+    user_id = get_jwt_identity()
+
+    try:
+        try:
+            fields = request_fields(PARTICIPANT_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        expense_id = uuid.UUID(expense_id)
+        async with async_session() as session:
+            version = await expense_version_async(session, expense_id, uuid.UUID(user_id))
+            if not version:
+                return jsonify({'error': 'Expense not found'}), 404
+
+            if not version.is_member:
+                return jsonify({'error': 'You do not have permission to view this expense'}), 403
+
+            async def build():
+                participants = (await session.scalars(
+                    select(ExpenseParticipant)
+                    .where(ExpenseParticipant.expense_id == expense_id)
+                    .options(joinedload(ExpenseParticipant.user))
+                )).all()
+                return participants_to_dicts(participants, version.payer_id, fields)
+
+            return await cached_json_response_async(
+                expense_id, 'participants', version.etag, build, variant=fields and ','.join(fields)
+            )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+ASYNC_VIEWS = {
+    'expenses.get_user_expenses': get_user_expenses,
+    'expenses.get_expense_details': get_expense_details,
+    'participants.get_expense_participants': get_expense_participants,
+}
+
@@ -1,11 +1,11 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import get_jwt_identity, jwt_required, create_access_token
-from werkzeug.security import generate_password_hash
+from flask_jwt_extended import get_current_user, jwt_required, create_access_token
 import re
-from uuid import UUID
 
 from ..models import db
 from ..models.user import User
+from ..models.routing import replica_read
+from ..passwords import PasswordPoolSaturated, PasswordPoolTimeout, hash_password, needs_rehash, verify_password
 
 
 auth_bp = Blueprint("auth_bp", __name__)
@@ -14,6 +14,12 @@ auth_bp = Blueprint("auth_bp", __name__)
 def is_valid_password(password):
     return re.match(r'^(?=.*[A-Z])(?=.*\d)[A-Za-z\d@$!%*?&]{6,16}$', password) is not None
 
+def _too_busy():
+    return jsonify({"error": "Too many login attempts right now, try again shortly."}), 429, {"Retry-After": "1"}
+
+def _timed_out():
+    return jsonify({"error": "Authentication is taking too long right now, try again shortly."}), 503, {"Retry-After": "5"}
+
 @auth_bp.route("/register", methods=['POST'])
 def register_user():
     data = request.json or {}
@@ -34,11 +40,18 @@ def register_user():
     if not is_valid_password(password):
         return jsonify({"error": "Password must be 6-16 characters, include at least 1 uppercase letter and 1 number."}), 400
 
+    try:
+        password_hash = hash_password(password)
+    except PasswordPoolSaturated:
+        return _too_busy()
+    except PasswordPoolTimeout:
+        return _timed_out()
+
     new_user = User(
         email=email,
         username=username.lower(),
         name=username,
-        password_hash=generate_password_hash(password),
+        password_hash=password_hash,
         ipAddress=ipAddress,
     )
 
@@ -63,21 +76,29 @@ def login_user():
 
     user = user_data
 
-    if not user.check_password(password):
-        return jsonify({"error": "Invalid password."}), 401
+    try:
+        if not verify_password(user.password_hash, password):
+            return jsonify({"error": "Invalid password."}), 401
+
+        # hash parameters changed since this hash was made, upgrade it now
+        # that we have the plain password
+        if needs_rehash(user.password_hash):
+            user.password_hash = hash_password(password)
+            db.session.commit()
+    except PasswordPoolSaturated:
+        return _too_busy()
+    except PasswordPoolTimeout:
+        return _timed_out()
 
     access_token = create_access_token(identity=user.id)
     return jsonify({"token":access_token}), 200
 
 @auth_bp.route('/u', methods=["GET"])
+@replica_read
 @jwt_required()
 def get_user_data():
-    current_user_id = get_jwt_identity()
-    user = User.query.filter_by(id=UUID(current_user_id)).first()
-    # .first_or_404()
-
-    if not user:
-        return jsonify({'error':'user not found'}), 404
+    # resolved through the user cache, polling this doesn't hit the db
+    user = get_current_user()
 
     return jsonify({
         "email": user.email,
@@ -0,0 +1,91 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select
+import uuid
+
+from ..models import db
+from ..models.user import User
+from ..models.expense import ExpenseParticipant
+from ..ledger import user_balances, balance_between, net_balances, settle, usernames
+
+balance_bp = Blueprint('balances', __name__)
+
+
+@balance_bp.route('/', methods=['GET'])
+@jwt_required()
+def get_balances():
+    """Net balance between the current user and everyone they share expenses with.
+
+    a positive amount means that user owes the current user
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        balances = user_balances(uuid.UUID(user_id))
+        users = usernames(list(balances))
+
+        result = []
+        for other_id, amount in balances.items():
+            username, name = users.get(other_id, (None, None))
+            result.append({
+                'username': username,
+                'name': name,
+                'amount': amount
+            })
+        result.sort(key=lambda row: row['amount'], reverse=True)
+
+        return jsonify({
+            'balances': result,
+            'total': sum(balances.values())
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def user_expense_ids_query(user_id):
+    """ids of the expenses the user takes part in"""
+    return select(ExpenseParticipant.expense_id).where(ExpenseParticipant.user_id == user_id)
+
+
+@balance_bp.route('/settle', methods=['GET'])
+@jwt_required()
+def get_settlement():
+    """Suggested transfers settling every expense the current user is part of"""
+    user_id = get_jwt_identity()
+
+    try:
+        transfers = settle(net_balances(user_expense_ids_query(uuid.UUID(user_id))))
+        users = usernames(list({uid for transfer in transfers for uid in transfer[:2]}))
+
+        return jsonify({
+            'transfers': [{
+                'from': users.get(debtor, (None,))[0],
+                'to': users.get(creditor, (None,))[0],
+                'amount': amount
+            } for debtor, creditor, amount in transfers]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@balance_bp.route('/<username>', methods=['GET'])
+@jwt_required()
+def get_balance_with(username):
+    """Net balance between the current user and one other user"""
+    user_id = get_jwt_identity()
+
+    try:
+        other_user = User.query.filter_by(username=username).first()
+        if not other_user:
+            return jsonify({'error': f'User {username} not found'}), 404
+
+        return jsonify({
+            'username': other_user.username,
+            'name': other_user.name,
+            'amount': balance_between(uuid.UUID(user_id), other_user.id)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,17 +1,52 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_current_user
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
+import csv
+import io
+import time
 import uuid
 from datetime import datetime
 
 from ..models import db
-from ..models.expense import Expense, SplitMethod
+from ..models.expense import Expense, SplitMethod, lock_expense
 from ..models.user import User
 from ..models.expense import ExpenseParticipant
+from ..models.group import GroupMember, is_group_member
+from ..models.routing import replica_read
+from ..idempotency import idempotent
+from ..ledger import track_balances
+from ..changes import ChangesGone, changes_since, current_seq
+from ..jobs import LeaseLost, checkpoint, enqueue, job_handler, job_to_dict
+from ..response_cache import (
+    cached_json_bodies, cached_json_response, expense_version, expense_versions, invalidate_expense
+)
+from ..serializers import (
+    expense_serializer, expense_to_dict, expenses_to_columns, expenses_to_dicts, request_fields, wants_columns
+)
+from ..splits import apply_equal_split, equal_split, is_amount
+from ..utils import encode_cursor, decode_cursor
 
 expense_bp = Blueprint('expenses', __name__)
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+EXPORT_BATCH_SIZE = 500
+MAX_BULK_ITEMS = 5000
+BULK_CHUNK_SIZE = 500
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 2000
+CHANGE_STREAM_RETRY_MS = 3000
+MAX_BATCH_IDS = 100
+EXPORT_CSV_HEADER = [
+    'id', 'title', 'date', 'split_method', 'total_amount', 'created_at', 'paid_by',
+    'participant_username', 'participant_amount', 'participant_item'
+]
+
 @expense_bp.route('/', methods=['POST'])
 @jwt_required()
+@idempotent
 def create_expense():
     """new expense"""
     user_id = get_jwt_identity()
@@ -29,34 +64,54 @@ def create_expense():
         if 'split_method' in data and data['split_method'] == 'unequal':
             split_method = SplitMethod.UNEQUAL
 
+        # optional group, every member of it takes part in the expense
+        group_id = None
+        if data.get('group_id'):
+            try:
+                group_id = uuid.UUID(data['group_id'])
+            except ValueError:
+                return jsonify({'error': 'Invalid group_id'}), 400
+            if not is_group_member(group_id, uuid.UUID(user_id)):
+                return jsonify({'error': 'You are not a member of this group'}), 403
+
         new_expense = Expense(
             title=data['title'],
             total_amount=data['total_amount'],
             split_method=split_method,
             date=datetime.strptime(data.get('date', datetime.now().strftime('%Y-%m-%d')), '%Y-%m-%d'),
-            payer_id=uuid.UUID(user_id)
+            payer_id=uuid.UUID(user_id),
+            group_id=group_id
         )
 
-        # add current user as a participant
-        current_user = User.query.get(uuid.UUID(user_id))
-        if not current_user:
-            return jsonify({'error': 'User not found'}), 404
-
-        new_expense.users.append(current_user)
-
-        # calculate default amount for equal split (just the user for now)
-        default_amount = data['total_amount']
-
-        # add the current user as a participant
-        participant = ExpenseParticipant(
-            expense_id=new_expense.id,
-            user_id=uuid.UUID(user_id),
-            amount=default_amount,
-            item=data.get('item')
-        )
-        new_expense.participants.append(participant)
+        with track_balances([new_expense.id]):
+            member_ids = []
+            if group_id:
+                member_ids = db.session.scalars(select(GroupMember.user_id).where(
+                    GroupMember.group_id == group_id, GroupMember.user_id != uuid.UUID(user_id)
+                )).all()
+
+            # the payer covers everything unless the split is equal, payer
+            # first so it absorbs the leftover units
+            if split_method == SplitMethod.EQUAL:
+                default_amount, *member_amounts = equal_split(data['total_amount'], len(member_ids) + 1)
+            else:
+                default_amount, member_amounts = data['total_amount'], [0] * len(member_ids)
+
+            # add the current user as a participant
+            participant = ExpenseParticipant(
+                expense_id=new_expense.id,
+                user_id=uuid.UUID(user_id),
+                amount=default_amount,
+                item=data.get('item')
+            )
+            new_expense.participants.append(participant)
+            new_expense.participants.extend(
+                ExpenseParticipant(expense_id=new_expense.id, user_id=member_id, amount=amount)
+                for member_id, amount in zip(member_ids, member_amounts)
+            )
+
+            db.session.add(new_expense)
 
-        db.session.add(new_expense)
         db.session.commit()
 
         return jsonify({
@@ -69,104 +124,660 @@ def create_expense():
         return jsonify({'error': str(e)}), 500
 
 
+def _bulk_expense_rows(item, payer_id, user_ids):
+    """expense and expense_participants rows for one bulk item.
+
+    raises ValueError with a client facing message if the item is invalid
+    """
+    if not isinstance(item, dict):
+        raise ValueError('Each expense must be an object')
+    for field in ('title', 'total_amount'):
+        if field not in item:
+            raise ValueError(f'Missing required field: {field}')
+
+    split_method = SplitMethod.UNEQUAL if item.get('split_method') == 'unequal' else SplitMethod.EQUAL
+    expense_date = datetime.strptime(item['date'], '%Y-%m-%d').date() if 'date' in item else datetime.utcnow().date()
+
+    # participants can be given as usernames or {username, amount, item} objects
+    participants = item.get('participants', [])
+    if not isinstance(participants, list):
+        raise ValueError('participants must be a list')
+    others = []
+    for participant in participants:
+        if isinstance(participant, str):
+            participant = {'username': participant}
+        if not isinstance(participant, dict) or not isinstance(participant.get('username'), str):
+            raise ValueError('Each participant needs a username')
+        participant_id = user_ids.get(participant['username'])
+        if participant_id is None:
+            raise ValueError(f'User {participant["username"]} not found')
+        if participant_id == payer_id or any(other[0] == participant_id for other in others):
+            raise ValueError(f'User {participant["username"]} is already a participant')
+        others.append((participant_id, participant.get('amount', 0), participant.get('item')))
+
+    total_amount = item['total_amount']
+    if not is_amount(total_amount) or any(not is_amount(amount) for _, amount, _ in others):
+        raise ValueError('Amounts must be integers (minor units)')
+
+    if split_method == SplitMethod.EQUAL:
+        # payer first, so the payer absorbs the leftover units
+        payer_amount, *amounts = equal_split(total_amount, len(others) + 1)
+        others = [
+            (participant_id, amount, participant_item)
+            for (participant_id, _, participant_item), amount in zip(others, amounts)
+        ]
+    else:
+        # whatever the others don't cover is the payer's own share
+        payer_amount = total_amount - sum(amount for _, amount, _ in others)
+        if payer_amount < 0 or any(amount < 0 for _, amount, _ in others):
+            raise ValueError('Participant amounts exceed the total')
+
+    expense_id = uuid.uuid4()
+    expense_row = {
+        'id': expense_id,
+        'title': item['title'],
+        'date': expense_date,
+        'split_method': split_method,
+        'total_amount': total_amount,
+        'payer_id': payer_id,
+    }
+    participant_rows = [{
+        'expense_id': expense_id,
+        'user_id': payer_id,
+        'amount': payer_amount,
+        'item': item.get('item'),
+    }] + [{
+        'expense_id': expense_id,
+        'user_id': participant_id,
+        'amount': amount,
+        'item': participant_item,
+    } for participant_id, amount, participant_item in others]
+
+    return expense_row, participant_rows
+
+
+def _create_bulk(payer_id, items, results, before_commit=None):
+    """create the bulk items after the first len(results), appending their results.
+
+    one transaction per chunk, `before_commit(results)` runs before each
+    chunk's commit, so what it writes (a job's progress) commits with the chunk
+    """
+    # resolve every username in the batch with one query, malformed items
+    # are skipped here and rejected one by one by _bulk_expense_rows
+    usernames = {
+        participant if isinstance(participant, str) else participant.get('username')
+        for item in items if isinstance(item, dict) and isinstance(item.get('participants'), list)
+        for participant in item['participants']
+        if isinstance(participant, str) or isinstance(participant, dict) and isinstance(participant.get('username'), str)
+    }
+    user_ids = dict(db.session.execute(
+        select(User.username, User.id).where(User.username.in_(usernames))
+    ).all()) if usernames else {}
+
+    for start in range(len(results), len(items), BULK_CHUNK_SIZE):
+        chunk_results = []
+        expense_rows, participant_rows = [], []
+
+        for index, item in enumerate(items[start:start + BULK_CHUNK_SIZE], start):
+            try:
+                expense_row, participants = _bulk_expense_rows(item, payer_id, user_ids)
+            except (ValueError, TypeError) as e:
+                chunk_results.append({'index': index, 'status': 400, 'error': str(e)})
+                continue
+            expense_rows.append(expense_row)
+            participant_rows.extend(participants)
+            chunk_results.append({'index': index, 'status': 201, 'expense_id': str(expense_row['id'])})
+
+        # each table written with a single executemany
+        if expense_rows:
+            try:
+                with track_balances([row['id'] for row in expense_rows]):
+                    db.session.execute(insert(Expense), expense_rows)
+                    db.session.execute(insert(ExpenseParticipant), participant_rows)
+                if before_commit:
+                    before_commit(results + chunk_results)
+                db.session.commit()
+            except LeaseLost:
+                # the job moved to another worker, which redoes this chunk
+                db.session.rollback()
+                raise
+            except Exception as e:
+                db.session.rollback()
+                for result in chunk_results:
+                    if result['status'] == 201:
+                        result.update({'status': 500, 'error': str(e)})
+                        del result['expense_id']
+
+        results.extend(chunk_results)
+    return results
+
+
+def _bulk_summary(results):
+    created = sum(1 for result in results if result['status'] == 201)
+    return {
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }
+
+
+def _respond_async(item_count):
+    """hand a bulk create off to the job queue? (large, or the client asked with `Prefer: respond-async`)"""
+    if not current_app.config.get('JOBS_ENABLED'):
+        return False
+    return 'respond-async' in request.headers.get('Prefer', '') or \
+        item_count > current_app.config.get('JOBS_BULK_INLINE_MAX', 500)
+
+
+@expense_bp.route('/bulk', methods=['POST'])
+@jwt_required()
+@idempotent
+def bulk_create_expenses():
+    """Create many expenses, with their participants, in one request.
+
+    body: {"expenses": [{title, total_amount, date?, split_method?, item?,
+    participants?: [username | {username, amount?, item?}]}]}, the current
+    user pays for all of them. Returns one result per item, in order.
+    Large batches (or with a `Prefer: respond-async` header) are created by
+    a background job instead: 202 with the job, whose result at
+    /api/jobs/<id> is this same body.
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+
+    try:
+        items = data.get('expenses')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'expenses must be a non empty list'}), 400
+        if len(items) > MAX_BULK_ITEMS:
+            return jsonify({'error': f'At most {MAX_BULK_ITEMS} expenses per request'}), 400
+
+        payer_id = uuid.UUID(user_id)
+
+        if _respond_async(len(items)):
+            job = enqueue('bulk_create_expenses', {'payer_id': user_id, 'expenses': items}, user_id=payer_id)
+            db.session.commit()
+            return jsonify(job_to_dict(job)), 202, {'Location': url_for('jobs.get_job', job_id=job.id)}
+
+        summary = _bulk_summary(_create_bulk(payer_id, items, []))
+        return jsonify(summary), 201 if summary['failed'] == 0 else 207
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@job_handler('bulk_create_expenses')
+def run_bulk_create_job(job):
+    """a queued /bulk request; resumes after the chunks an earlier attempt committed"""
+    data = job.data
+    results = _create_bulk(
+        uuid.UUID(data['payer_id']), data['expenses'], job.progress or [],
+        before_commit=lambda results: checkpoint(job, results)
+    )
+    return _bulk_summary(results)
+
+
+def user_expenses_query(user_id):
+    """expenses the user takes part in, with participants (+ their users) and the
+    payer eager loaded so serializing them doesn't hit the db per expense"""
+    return db.session.query(Expense).join(
+        Expense.participants
+    ).filter(
+        ExpenseParticipant.user_id == user_id
+    ).options(*expense_load_options())
+
+
+def expense_load_options():
+    """participants (+ their users) and the payer, everything expense_to_dict reads"""
+    return (
+        selectinload(Expense.participants).joinedload(ExpenseParticipant.user),
+        joinedload(Expense.paid_by)
+    )
+
+
 @expense_bp.route('/', methods=['GET'])
+@replica_read
 @jwt_required()
 def get_user_expenses():
-    """Get all expenses for the current user"""
+    """Get all expenses for the current user
+
+    query params: fields (comma separated), format (objects / columns)
+    the X-Change-Seq header is the `since` to keep it up to date with /changes
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        # Get user object (cached, see identity.py), a deleted user's token is a 404 before this
+        user = get_current_user()
+
+        try:
+            fields = request_fields()
+            columns = wants_columns()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # read before the expenses: `changes?since=` from here may repeat a
+        # change already in this list, but never misses one
+        headers = {'X-Change-Seq': str(current_seq(user.id))}
+
+        expenses = user_expenses_query(user.id).all()
+        if columns:
+            return jsonify(expenses_to_columns(expenses, fields)), 200, headers
+
+        return jsonify(expenses_to_dicts(expenses, fields)), 200, headers
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def page_query(query, limit, cursor=None):
+    """`limit` rows of an Expense query, newest first, after the (date, id) `cursor`.
+
+    keyset pagination on (date, id), walks a (..., date, id) index backwards
+    """
+    if cursor is not None:
+        cursor_date, cursor_id = cursor
+        query = query.filter(or_(
+            Expense.date < cursor_date,
+            and_(Expense.date == cursor_date, Expense.id < cursor_id)
+        ))
+    return query.order_by(Expense.date.desc(), Expense.id.desc()).limit(limit)
+
+
+def export_query(user_id):
+    """the user's whole history, oldest first"""
+    return user_expenses_query(user_id).order_by(Expense.date, Expense.id)
+
+
+def expense_page(query):
+    """one page of `query` (an Expense query with eager options) as a (response, status) pair.
+
+    reads the page query params documented on get_user_expenses_page
+    """
+    try:
+        fields = request_fields()
+        columns = wants_columns()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    try:
+        if 'since' in request.args:
+            query = query.filter(Expense.date >= datetime.strptime(request.args['since'], '%Y-%m-%d').date())
+        if 'until' in request.args:
+            query = query.filter(Expense.date <= datetime.strptime(request.args['until'], '%Y-%m-%d').date())
+    except ValueError:
+        return jsonify({'error': 'since and until must be in YYYY-MM-DD format'}), 400
+
+    if 'split_method' in request.args:
+        try:
+            query = query.filter(Expense.split_method == SplitMethod(request.args['split_method']))
+        except ValueError:
+            return jsonify({'error': 'split_method must be equal or unequal'}), 400
+
+    cursor = None
+    if 'cursor' in request.args:
+        try:
+            cursor = decode_cursor(request.args['cursor'])
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    # fetch one extra row to know if there's a next page
+    expenses = page_query(query, limit + 1, cursor).all()
+    has_more = len(expenses) > limit
+    expenses = expenses[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = expenses[-1]
+        next_cursor = encode_cursor(last.date, last.id)
+
+    return jsonify({
+        'expenses': expenses_to_columns(expenses, fields) if columns else expenses_to_dicts(expenses, fields),
+        'next_cursor': next_cursor
+    }), 200
+
+
+@expense_bp.route('/page', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_user_expenses_page():
+    """Get one page of the current user's expenses, newest first.
+
+    query params: limit, cursor (next_cursor of the previous page),
+    since / until (YYYY-MM-DD, inclusive), split_method (equal / unequal),
+    fields (comma separated), format (objects / columns)
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        return expense_page(user_expenses_query(uuid.UUID(user_id)))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@expense_bp.route('/export', methods=['GET'])
+@replica_read
+@jwt_required()
+def export_user_expenses():
+    """Stream the current user's full expense history as NDJSON or CSV.
+
+    query params: format (ndjson / csv, default ndjson), fields (ndjson only)
+    """
+    user_id = get_jwt_identity()
+
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        fields = request_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # rows are pulled from a server side cursor in batches, so memory stays
+    # flat no matter how long the history is
+    expenses = export_query(uuid.UUID(user_id)).yield_per(EXPORT_BATCH_SIZE)
+
+    if export_format == 'ndjson':
+        def generate():
+            serialize = expense_serializer(fields)
+            for expense in expenses:
+                yield current_app.json.dumps(serialize(expense)) + '\n'
+
+        mimetype = 'application/x-ndjson'
+    else:
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+
+            def flush():
+                data = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+                return data
+
+            writer.writerow(EXPORT_CSV_HEADER)
+            yield flush()
+
+            # one row per participant, expense columns repeated
+            for expense in expenses:
+                row = expense_to_dict(expense)
+                for participant in row['participants']:
+                    writer.writerow([
+                        row['id'], row['title'], row['date'], row['split_method'],
+                        row['total_amount'], row['created_at'], row['paid_by'],
+                        participant['username'], participant['amount'], participant['item']
+                    ])
+                yield flush()
+
+        mimetype = 'text/csv'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=expenses.{export_format}'}
+    )
+
+
+def _changes_payload(user_id, since, limit, fields):
+    """/changes body: current state of the changed expenses, ids of the deleted ones"""
+    changed_ids, deleted_ids, next_since, has_more = changes_since(user_id, since, limit)
+
+    expenses = db.session.query(Expense).filter(Expense.id.in_(changed_ids)).options(
+        *expense_load_options()
+    ).all() if changed_ids else []
+    order = {expense_id: i for i, expense_id in enumerate(changed_ids)}
+    expenses.sort(key=lambda expense: order[expense.id])
+
+    # deleted after its change entry was read, its tombstone is further on
+    found = {expense.id for expense in expenses}
+    deleted_ids += [expense_id for expense_id in changed_ids if expense_id not in found]
+
+    return {
+        'changed': expenses_to_dicts(expenses, fields),
+        'deleted': [str(expense_id) for expense_id in deleted_ids],
+        'next_since': next_since,
+        'has_more': has_more
+    }
+
+
+def _parse_since(value):
+    since = int(value)
+    if since < 0:
+        raise ValueError()
+    return since
+
+
+@expense_bp.route('/changes', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_expense_changes():
+    """Expenses changed or deleted since a previous sync, oldest change first.
+
+    query params: since (next_since of the previous call, or the X-Change-Seq
+    header of GET /api/expenses/), limit, fields (comma separated).
+    Keep calling with next_since while has_more; 410 means since is older
+    than the kept history and the full list has to be fetched again.
+
+    The feed covers what GET /api/expenses/ lists: expenses the user pays or
+    takes part in. Expenses of the user's groups they aren't a participant of
+    don't show up here (nor in the stream), sync those with
+    GET /api/groups/<id>/expenses.
+    """
     user_id = get_jwt_identity()
 
     try:
-        # Get user object
-        user = User.query.get(uuid.UUID(user_id))
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-
-        # Query all expenses for user
-        expenses = db.session.query(Expense).join(
-            Expense.users
-        ).filter(
-            User.id == uuid.UUID(user_id)
-        ).all()
-
-        result = []
-        for expense in expenses:
-            participants_data = []
-            for participant in expense.participants:
-                participant_user = User.query.get(participant.user_id)
-                participants_data.append({
-                    'username': participant_user.username,
-                    'amount': participant.amount,
-                    'item': participant.item
-                })
-
-            # Format paid_by username
-            paid_by = None
-            if expense.payer_id:
-                payer = User.query.get(expense.payer_id)
-                paid_by = payer.username if payer else None
-
-            result.append({
-                'id': str(expense.id),
-                'title': expense.title,
-                'date': expense.date.strftime('%Y-%m-%d'),
-                'split_method': expense.split_method.value,
-                'total_amount': expense.total_amount,
-                'created_at': expense.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'paid_by': paid_by,
-                'participants': participants_data
-            })
-
-        return jsonify(result), 200
+        since = _parse_since(request.args['since'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'since must be a non negative integer'}), 400
+    try:
+        limit = int(request.args.get('limit', DEFAULT_CHANGES_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1 or limit > MAX_CHANGES_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_CHANGES_LIMIT}'}), 400
+    try:
+        fields = request_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        return jsonify(_changes_payload(uuid.UUID(user_id), since, limit, fields)), 200
+
+    except ChangesGone:
+        return jsonify({'error': 'since is older than the kept change history, fetch the full list again'}), 410
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# no replica_read: a stream woken up by a commit must read the primary to see it.
+# EventSource can't set headers, so the token may come as ?jwt= too
+@expense_bp.route('/changes/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_expense_changes():
+    """Server-sent events of the change feed.
+
+    Every batch of changes is a `changes` event with the /changes body, its
+    event id is next_since, so a reconnecting EventSource resumes through
+    Last-Event-ID. A `gone` event means since was purged (see /changes 410).
+    query params: since, fields. Streams close after CHANGE_STREAM_MAX_SECONDS,
+    clients reconnect.
+
+    Off unless CHANGE_STREAM_ENABLED: a stream occupies its worker the whole
+    time, it needs a gevent (or other async) worker. At most
+    CHANGE_STREAM_MAX_STREAMS are open per process, the next get a 503.
+    """
+    config = current_app.config
+    if not config.get('CHANGE_STREAM_ENABLED', False):
+        return jsonify({'error': 'Change streams are disabled'}), 404
+
+    user_id = uuid.UUID(get_jwt_identity())
+    try:
+        since = _parse_since(request.headers.get('Last-Event-ID') or request.args['since'])
+    except (KeyError, ValueError):
+        return jsonify({'error': 'since must be a non negative integer'}), 400
+    try:
+        fields = request_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    notifier = current_app.extensions['change_notifier']
+    poll = config.get('CHANGE_STREAM_POLL_SECONDS', 5)
+    heartbeat = config.get('CHANGE_STREAM_HEARTBEAT_SECONDS', 15)
+    max_seconds = config.get('CHANGE_STREAM_MAX_SECONDS', 300)
+
+    if not notifier.open_stream():
+        response = jsonify({'error': 'Too many open change streams, poll /changes or retry later'})
+        response.headers['Retry-After'] = str(CHANGE_STREAM_RETRY_MS // 1000)
+        return response, 503
+
+    def generate(since):
+        yield f'retry: {CHANGE_STREAM_RETRY_MS}\n\n'
+        started = last_sent = time.monotonic()
+
+        while time.monotonic() - started < max_seconds:
+            version = notifier.version(user_id)
+            try:
+                payload = _changes_payload(user_id, since, DEFAULT_CHANGES_LIMIT, fields)
+            except ChangesGone:
+                yield 'event: gone\ndata: {}\n\n'
+                return
+            finally:
+                # no connection is held while waiting for the next change
+                db.session.close()
+
+            if payload['next_since'] != since:
+                since = payload['next_since']
+                yield f'id: {since}\nevent: changes\ndata: {current_app.json.dumps(payload)}\n\n'
+                last_sent = time.monotonic()
+                if payload['has_more']:
+                    continue
+            elif time.monotonic() - last_sent >= heartbeat:
+                yield ': keepalive\n\n'
+                last_sent = time.monotonic()
+
+            # woken up right away by commits in this process, polls for the others
+            notifier.wait(user_id, version, poll)
+
+    response = Response(
+        stream_with_context(generate(since)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # the slot is given back when the server closes the response, whether or
+    # not the stream ever started
+    response.call_on_close(notifier.close_stream)
+    return response
+
+
+@expense_bp.route('/batch', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_expenses_batch():
+    """Get several expenses in one call, with one result per id
+
+    query params: ids (comma separated, at most MAX_BATCH_IDS), fields (comma separated)
+    results follow the order of ids, each with the id and a status: 200 with
+    the expense, or 400 (not an id), 403, 404 with an error. 207 unless all are 200
+    """
+    user_id = get_jwt_identity()
+
+    raw_ids = list(dict.fromkeys(raw.strip() for raw in request.args.get('ids', '').split(',') if raw.strip()))
+    if not raw_ids:
+        return jsonify({'error': 'ids is required'}), 400
+    if len(raw_ids) > MAX_BATCH_IDS:
+        return jsonify({'error': f'At most {MAX_BATCH_IDS} ids per request'}), 400
+    try:
+        fields = request_fields()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        expense_ids = {}
+        for raw in raw_ids:
+            try:
+                expense_ids[raw] = uuid.UUID(raw)
+            except ValueError:
+                expense_ids[raw] = None
+
+        # one membership query for all of them, then one eager load of
+        # those not in the response cache
+        versions = expense_versions([expense_id for expense_id in expense_ids.values() if expense_id], uuid.UUID(user_id))
+
+        def build(missing_ids):
+            expenses = db.session.query(Expense).filter(Expense.id.in_(missing_ids)).options(
+                *expense_load_options()
+            ).all()
+            return {expense.id: expense_to_dict(expense, fields) for expense in expenses}
+
+        bodies = cached_json_bodies(
+            {expense_id: version.etag for expense_id, version in versions.items() if version.is_member},
+            'details', build, variant=fields and ','.join(fields)
+        )
+
+        # the cached payloads are json already, spliced in as they are
+        dumps = current_app.json.dumps
+        results, found = [], 0
+        for raw, expense_id in expense_ids.items():
+            if expense_id is None:
+                results.append(dumps({'id': raw, 'status': 400, 'error': 'Invalid expense id'}))
+            elif versions.get(expense_id) and not versions[expense_id].is_member:
+                results.append(dumps({'id': raw, 'status': 403, 'error': 'You do not have permission to view this expense'}))
+            elif expense_id not in bodies:
+                results.append(dumps({'id': raw, 'status': 404, 'error': 'Expense not found'}))
+            else:
+                results.append(f'{{"id":{dumps(raw)},"status":200,"expense":{bodies[expense_id]}}}')
+                found += 1
+
+        body = f'{{"found":{found},"failed":{len(results) - found},"results":[{",".join(results)}]}}\n'
+        return current_app.response_class(body, status=200 if found == len(results) else 207, mimetype='application/json')
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
 @expense_bp.route('/<expense_id>', methods=['GET'])
+@replica_read
 @jwt_required()
 def get_expense_details(expense_id):
-    """Get details of a specific expense (public route requiring participant membership)"""
+    """Get details of a specific expense (public route requiring participant membership)
+
+    query params: fields (comma separated)
+    """
     user_id = get_jwt_identity()
 
     try:
-        # Get the expense
-        expense = Expense.query.get(uuid.UUID(expense_id))
-        if not expense:
+        try:
+            fields = request_fields()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # version + membership check, without loading the expense
+        expense_id = uuid.UUID(expense_id)
+        version = expense_version(expense_id, uuid.UUID(user_id))
+        if not version:
             return jsonify({'error': 'Expense not found'}), 404
 
         # Check if current user is a participant
-        user_is_participant = any(str(user.id) == user_id for user in expense.users)
-        if not user_is_participant:
+        if not version.is_member:
             return jsonify({'error': 'You do not have permission to view this expense'}), 403
 
-        # Get participant details
-        participants_data = []
-        for participant in expense.participants:
-            participant_user = User.query.get(participant.user_id)
-            participants_data.append({
-                'username': participant_user.username,
-                'amount': participant.amount,
-                'item': participant.item
-            })
-
-        # Format paid_by username
-        paid_by = None
-        if expense.payer_id:
-            payer = User.query.get(expense.payer_id)
-            paid_by = payer.username if payer else None
-
-        result = {
-            'id': str(expense.id),
-            'title': expense.title,
-            'date': expense.date.strftime('%Y-%m-%d'),
-            'split_method': expense.split_method.value,
-            'total_amount': expense.total_amount,
-            'created_at': expense.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'paid_by': paid_by,
-            'participants': participants_data
-        }
-
-        return jsonify(result), 200
+        def build():
+            expense = db.session.query(Expense).filter(Expense.id == expense_id).options(
+                *expense_load_options()
+            ).one()
+            return expense_to_dict(expense, fields)
+
+        return cached_json_response(expense_id, 'details', version.etag, build, variant=fields and ','.join(fields))
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -174,13 +785,14 @@ def get_expense_details(expense_id):
 
 @expense_bp.route('/<expense_id>', methods=['PUT'])
 @jwt_required()
+@idempotent
 def update_expense(expense_id):
     """Update an expense (only by the owner/payer)"""
     user_id = get_jwt_identity()
     data = request.get_json()
 
     try:
-        expense = Expense.query.get(uuid.UUID(expense_id))
+        expense = lock_expense(uuid.UUID(expense_id))
         if not expense:
             return jsonify({'error': 'Expense not found'}), 404
 
@@ -188,24 +800,34 @@ def update_expense(expense_id):
         if str(expense.payer_id) != user_id:
             return jsonify({'error': 'Only the payer can update this expense'}), 403
 
-        if 'title' in data:
-            expense.title = data['title']
+        with track_balances([expense.id]):
+            if 'title' in data:
+                expense.title = data['title']
 
-        if 'date' in data:
-            expense.date = datetime.strptime(data['date'], '%Y-%m-%d')
+            if 'date' in data:
+                expense.date = datetime.strptime(data['date'], '%Y-%m-%d')
 
-        if 'total_amount' in data:
-            expense.total_amount = data['total_amount']
+            if 'total_amount' in data:
+                expense.total_amount = data['total_amount']
 
-        if 'split_method' in data:
-            expense.split_method = SplitMethod.UNEQUAL if data['split_method'] == 'unequal' else SplitMethod.EQUAL
+            if 'split_method' in data:
+                expense.split_method = SplitMethod.UNEQUAL if data['split_method'] == 'unequal' else SplitMethod.EQUAL
+
+            # keep equal shares adding up to the (possibly new) total
+            if expense.split_method == SplitMethod.EQUAL and ('total_amount' in data or 'split_method' in data):
+                apply_equal_split(expense.id)
 
         # update the expense
         expense.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_expense(expense.id)
 
         return jsonify({'message': 'Expense updated successfully'}), 200
 
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'The expense was changed by a concurrent request, retry'}), 409
+
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -213,12 +835,13 @@ def update_expense(expense_id):
 
 @expense_bp.route('/<expense_id>', methods=['DELETE'])
 @jwt_required()
+@idempotent
 def delete_expense(expense_id):
     """Delete an expense (only by the owner/payer)"""
     user_id = get_jwt_identity()
 
     try:
-        expense = Expense.query.get(uuid.UUID(expense_id))
+        expense = lock_expense(uuid.UUID(expense_id))
         if not expense:
             return jsonify({'error': 'Expense not found'}), 404
 
@@ -227,11 +850,17 @@ def delete_expense(expense_id):
             return jsonify({'error': 'Only the payer can delete this expense'}), 403
 
         # Delete
-        db.session.delete(expense)
+        with track_balances([expense.id]):
+            db.session.delete(expense)
         db.session.commit()
+        invalidate_expense(expense.id)
 
         return jsonify({'message': 'Expense deleted successfully'}), 200
 
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'The expense was changed by a concurrent request, retry'}), 409
+
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
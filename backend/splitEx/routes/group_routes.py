@@ -0,0 +1,342 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func, insert, select
+import uuid
+
+from ..models import db
+from ..models.user import User
+from ..models.balance import GroupBalance
+from ..models.expense import Expense
+from ..models.group import Group, GroupMember, is_group_member
+from ..models.routing import replica_read
+from ..idempotency import idempotent
+from ..ledger import group_balances, settle, usernames
+from .expense_routes import expense_load_options, expense_page
+
+group_bp = Blueprint('groups', __name__)
+
+
+def _member_group(group_id, user_id):
+    """(group, None) if user_id is a member of group_id, else (None, error response)"""
+    try:
+        group = db.session.get(Group, uuid.UUID(group_id))
+    except ValueError:
+        group = None
+    if not group:
+        return None, (jsonify({'error': 'Group not found'}), 404)
+    if not is_group_member(group.id, uuid.UUID(user_id)):
+        return None, (jsonify({'error': 'You are not a member of this group'}), 403)
+    return group, None
+
+
+def _add_members(group_id, usernames):
+    """insert the given users into the group with one executemany, (added usernames, error)"""
+    users = db.session.execute(
+        select(User.username, User.id).where(User.username.in_(usernames))
+    ).all() if usernames else []
+    found = {username: member_id for username, member_id in users}
+    missing = [username for username in usernames if username not in found]
+    if missing:
+        return None, f'User(s) not found: {", ".join(missing)}'
+
+    existing = set(db.session.scalars(select(GroupMember.user_id).where(
+        GroupMember.group_id == group_id, GroupMember.user_id.in_(found.values())
+    )))
+    added = [username for username, member_id in found.items() if member_id not in existing]
+    if added:
+        db.session.execute(insert(GroupMember), [
+            {'group_id': group_id, 'user_id': found[username]} for username in added
+        ])
+    return added, None
+
+
+@group_bp.route('/', methods=['POST'])
+@jwt_required()
+@idempotent
+def create_group():
+    """new group, the current user is its first member
+
+    body: name, members (optional list of usernames)
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json()
+
+    try:
+        if not data or not data.get('name'):
+            return jsonify({'error': 'Missing required field: name'}), 400
+
+        group = Group(name=data['name'], created_by=uuid.UUID(user_id))
+        db.session.add(group)
+        db.session.flush()
+        db.session.add(GroupMember(group_id=group.id, user_id=uuid.UUID(user_id)))
+        db.session.flush()
+
+        _, error = _add_members(group.id, list(dict.fromkeys(data.get('members', []))))
+        if error:
+            db.session.rollback()
+            return jsonify({'error': error}), 404
+
+        db.session.commit()
+
+        return jsonify({
+            'message': 'Group created successfully',
+            'group_id': str(group.id)
+        }), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+def user_groups_query(user_id):
+    """(group, member count) of every group of the user"""
+    member_count = select(func.count()).where(
+        GroupMember.group_id == Group.id
+    ).correlate(Group).scalar_subquery()
+    return (
+        select(Group, member_count)
+        .join(GroupMember, GroupMember.group_id == Group.id)
+        .where(GroupMember.user_id == user_id)
+        .order_by(Group.created_at)
+    )
+
+
+def group_expenses_query(group_id):
+    """the group's expenses, eager loaded like the user's feed; keyset pages walk ix_expenses_group_id_date_id"""
+    return db.session.query(Expense).filter(Expense.group_id == group_id).options(*expense_load_options())
+
+
+def group_payer_totals_query(group_id):
+    """(payer, count, total, first date, last date) per payer of the group's
+    expenses: one pass over ix_expenses_group_id_payer_id (covering)"""
+    return (
+        select(Expense.payer_id, func.count(), func.sum(Expense.total_amount),
+               func.min(Expense.date), func.max(Expense.date))
+        .where(Expense.group_id == group_id)
+        .group_by(Expense.payer_id)
+    )
+
+
+def group_members_balance_query(group_id):
+    """(user id, username, net position) of every member, with or without
+    activity: a pk range read of group_members with the position left joined
+    on the group_balances pk"""
+    return (
+        select(GroupMember.user_id, User.username, func.coalesce(GroupBalance.amount, 0))
+        .join(User, User.id == GroupMember.user_id)
+        .outerjoin(GroupBalance, (GroupBalance.group_id == GroupMember.group_id)
+                   & (GroupBalance.user_id == GroupMember.user_id))
+        .where(GroupMember.group_id == group_id)
+        .order_by(GroupMember.joined_at, User.username)
+    )
+
+
+@group_bp.route('/', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_user_groups():
+    """Groups the current user is a member of"""
+    user_id = get_jwt_identity()
+
+    try:
+        rows = db.session.execute(user_groups_query(uuid.UUID(user_id))).all()
+
+        return jsonify([{
+            'id': str(group.id),
+            'name': group.name,
+            'created_at': group.created_at.isoformat(' ', 'seconds'),
+            'member_count': count
+        } for group, count in rows]), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@group_bp.route('/<group_id>', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_group(group_id):
+    """Group details with its members"""
+    user_id = get_jwt_identity()
+
+    try:
+        group, error = _member_group(group_id, user_id)
+        if error:
+            return error
+
+        members = db.session.execute(
+            select(User.username, User.name)
+            .join(GroupMember, GroupMember.user_id == User.id)
+            .where(GroupMember.group_id == group.id)
+            .order_by(GroupMember.joined_at)
+        ).all()
+
+        return jsonify({
+            'id': str(group.id),
+            'name': group.name,
+            'created_at': group.created_at.isoformat(' ', 'seconds'),
+            'members': [{'username': username, 'name': name} for username, name in members]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@group_bp.route('/<group_id>/members', methods=['POST'])
+@jwt_required()
+@idempotent
+def add_group_members(group_id):
+    """Add users to a group, they can see all of its expenses right away
+
+    body: username or usernames (list)
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+
+    try:
+        group, error = _member_group(group_id, user_id)
+        if error:
+            return error
+
+        usernames = data.get('usernames') or ([data['username']] if data.get('username') else [])
+        if not usernames:
+            return jsonify({'error': 'Missing required field: username'}), 400
+
+        added, error = _add_members(group.id, list(dict.fromkeys(usernames)))
+        if error:
+            return jsonify({'error': error}), 404
+
+        db.session.commit()
+
+        return jsonify({
+            'message': f'{len(added)} member(s) added to group',
+            'added': added
+        }), 201 if added else 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@group_bp.route('/<group_id>/members/<username>', methods=['DELETE'])
+@jwt_required()
+@idempotent
+def remove_group_member(group_id, username):
+    """Leave a group, or remove someone from a group you created"""
+    user_id = get_jwt_identity()
+
+    try:
+        group, error = _member_group(group_id, user_id)
+        if error:
+            return error
+
+        member = User.query.filter_by(username=username).first()
+        if not member:
+            return jsonify({'error': f'User {username} not found'}), 404
+
+        if str(member.id) != user_id and str(group.created_by) != user_id:
+            return jsonify({'error': 'Only the group creator can remove other members'}), 403
+
+        deleted = GroupMember.query.filter_by(group_id=group.id, user_id=member.id).delete()
+        if not deleted:
+            return jsonify({'error': f'User {username} is not a member of this group'}), 404
+
+        db.session.commit()
+
+        return jsonify({'message': f'User {username} removed from group'}), 200
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@group_bp.route('/<group_id>/expenses', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_group_expenses(group_id):
+    """One page of the group's expenses, newest first.
+
+    query params: same as /api/expenses/page
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        group, error = _member_group(group_id, user_id)
+        if error:
+            return error
+
+        return expense_page(group_expenses_query(group.id))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@group_bp.route('/<group_id>/summary', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_group_summary(group_id):
+    """Totals of a group: expense count and amount, date range, paid and net position per member"""
+    user_id = get_jwt_identity()
+
+    try:
+        group, error = _member_group(group_id, user_id)
+        if error:
+            return error
+
+        # nothing is loaded per expense; the overall totals are added up from the per payer rows
+        per_payer = db.session.execute(group_payer_totals_query(group.id)).all()
+        members = db.session.execute(group_members_balance_query(group.id)).all()
+
+        paid = {payer_id: total for payer_id, _, total, _, _ in per_payer if payer_id}
+        first_dates = [row[3] for row in per_payer]
+        last_dates = [row[4] for row in per_payer]
+
+        return jsonify({
+            'expense_count': sum(row[1] for row in per_payer),
+            'total_amount': sum(row[2] for row in per_payer),
+            'first_date': min(first_dates).isoformat() if first_dates else None,
+            'last_date': max(last_dates).isoformat() if last_dates else None,
+            'members': [{
+                'username': username,
+                'paid': paid.get(member_id, 0),
+                'balance': balance
+            } for member_id, username, balance in members]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@group_bp.route('/<group_id>/balances', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_group_balances(group_id):
+    """Net position of every member within the group and the transfers settling it
+
+    a positive amount means that member is owed money
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        group, error = _member_group(group_id, user_id)
+        if error:
+            return error
+
+        balances = group_balances(group.id)
+        transfers = settle(balances)
+        users = usernames(list(balances))
+
+        return jsonify({
+            'balances': [{
+                'username': users.get(member_id, (None,))[0],
+                'amount': amount
+            } for member_id, amount in balances.items()],
+            'transfers': [{
+                'from': users.get(debtor, (None,))[0],
+                'to': users.get(creditor, (None,))[0],
+                'amount': amount
+            } for debtor, creditor, amount in transfers]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,59 @@
+from flask import Blueprint, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import uuid
+
+from ..models import db
+from ..models.job import Job
+from ..models.routing import replica_read
+from ..jobs import job_to_dict
+
+job_bp = Blueprint('jobs', __name__)
+
+RECENT_JOBS = 50
+
+
+def user_jobs_query(user_id):
+    """the user's RECENT_JOBS most recent jobs, newest first"""
+    return db.session.query(Job).filter(Job.user_id == user_id).order_by(Job.created_at.desc()).limit(RECENT_JOBS)
+
+
+@job_bp.route('/', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_user_jobs():
+    """The current user's most recent jobs, newest first"""
+    user_id = get_jwt_identity()
+
+    try:
+        jobs = user_jobs_query(uuid.UUID(user_id)).all()
+
+        return jsonify({'jobs': [job_to_dict(job) for job in jobs]}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@job_bp.route('/<job_id>', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_job(job_id):
+    """Status of a job started by the current user, with its result once succeeded"""
+    user_id = get_jwt_identity()
+
+    try:
+        try:
+            job_id = uuid.UUID(job_id)
+        except ValueError:
+            return jsonify({'error': 'Job not found'}), 404
+
+        job = db.session.get(Job, job_id)
+        # other users' jobs don't exist as far as this user is concerned
+        if not job or job.user_id != uuid.UUID(user_id):
+            return jsonify({'error': 'Job not found'}), 404
+
+        # still queued / running: poll again
+        headers = {} if job.finished_at else {'Retry-After': '1'}
+        return jsonify(job_to_dict(job)), 200, headers
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,15 +1,41 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
 import uuid
+from datetime import datetime
 
 from ..models import db
-from ..models.expense import Expense, ExpenseParticipant, SplitMethod
+from ..models.expense import Expense, ExpenseParticipant, SplitMethod, is_participant, lock_expense
 from ..models.user import User
+from ..models.routing import replica_read
+from ..idempotency import idempotent
+from ..ledger import track_balances
+from ..splits import SPLITS, apply_equal_split, apply_split, is_amount
+from ..serializers import PARTICIPANT_FIELDS, participants_to_dicts, request_fields
+from ..response_cache import cached_json_response, expense_version, invalidate_expense
+from ..user_search import search_users
 
 participant_bp = Blueprint('participants', __name__)
 
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 25
+MAX_SEARCH_QUERY_LENGTH = 255
+
+def participant_query(expense_id, user_id):
+    return ExpenseParticipant.query.filter_by(expense_id=expense_id, user_id=user_id)
+
+
+def expense_participants_query(expense_id):
+    """the participants of an expense with their users"""
+    return ExpenseParticipant.query.filter_by(expense_id=expense_id).options(joinedload(ExpenseParticipant.user))
+
+
 @participant_bp.route('/<expense_id>/add', methods=['POST'])
 @jwt_required()
+@idempotent
 def add_participant(expense_id):
     """Add a participant to an expense"""
     user_id = get_jwt_identity()
@@ -22,12 +48,16 @@ def add_participant(expense_id):
             if field not in data:
                 return jsonify({'error': f'Missing required field: {field}'}), 400
 
-        expense = Expense.query.get(uuid.UUID(expense_id))
+        amount = data.get('amount', 0)
+        if not is_amount(amount):
+            return jsonify({'error': 'Amounts must be integers (minor units)'}), 400
+
+        expense = lock_expense(uuid.UUID(expense_id))
         if not expense:
             return jsonify({'error': 'Expense not found'}), 404
 
         # check if currentuser is payer or a participant
-        if str(expense.payer_id) != user_id and not any(str(user.id) == user_id for user in expense.users):
+        if str(expense.payer_id) != user_id and not is_participant(expense.id, uuid.UUID(user_id)):
             return jsonify({'error': 'You do not have permission to add participants to this expense'}), 403
 
         # find user to add
@@ -36,47 +66,43 @@ def add_participant(expense_id):
             return jsonify({'error': f'User {data["username"]} not found'}), 404
 
         # check if user is already a participant
-        if any(user.id == participant_user.id for user in expense.users):
+        if is_participant(expense.id, participant_user.id):
             return jsonify({'error': f'User {data["username"]} is already a participant'}), 400
 
-        # add user to expense participants
-        expense.users.append(participant_user)
-
-        # participant entry creation with amount
-        amount = data.get('amount', 0)
-        if expense.split_method == SplitMethod.EQUAL:
-            # recalculate equal amounts for all participants
-            num_participants = len(expense.users)
-            equal_amount = expense.total_amount / num_participants
-
-            # update all existing participants
-            for participant in expense.participants:
-                participant.amount = equal_amount
-
-            # create new participant with equal amount
-            participant = ExpenseParticipant(
-                expense_id=expense.id,
-                user_id=participant_user.id,
-                amount=equal_amount,
-                item=data.get('item')
-            )
-        else:
-            # for unequal split, use the specified amount
+        with track_balances([expense.id]):
+            # participant entry creation with amount, equal splits get
+            # their amount from the recalculation below
             participant = ExpenseParticipant(
                 expense_id=expense.id,
                 user_id=participant_user.id,
-                amount=amount,
+                amount=0 if expense.split_method == SplitMethod.EQUAL else amount,
                 item=data.get('item')
             )
+            db.session.add(participant)
+
+            if expense.split_method == SplitMethod.EQUAL:
+                # recalculate equal amounts for all participants
+                apply_equal_split(expense.id)
 
-        expense.participants.append(participant)
+        # participant changes are expense changes too (ETag, caches)
+        expense.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_expense(expense.id)
 
         return jsonify({
             'message': f'User {data["username"]} added to expense',
             'participant_id': str(participant.id)
         }), 201
 
+    except IntegrityError:
+        # the same user was added by a concurrent request
+        db.session.rollback()
+        return jsonify({'error': f'User {data["username"]} is already a participant'}), 400
+
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'The expense was changed by a concurrent request, retry'}), 409
+
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -84,13 +110,17 @@ def add_participant(expense_id):
 
 @participant_bp.route('/<expense_id>/update/<username>', methods=['PUT'])
 @jwt_required()
+@idempotent
 def update_participant(expense_id, username):
     """Update a participant's details in an expense"""
     user_id = get_jwt_identity()
     data = request.get_json()
 
     try:
-        expense = Expense.query.get(uuid.UUID(expense_id))
+        if 'amount' in data and not is_amount(data['amount']):
+            return jsonify({'error': 'Amounts must be integers (minor units)'}), 400
+
+        expense = lock_expense(uuid.UUID(expense_id))
         if not expense:
             return jsonify({'error': 'Expense not found'}), 404
 
@@ -104,26 +134,108 @@ def update_participant(expense_id, username):
             return jsonify({'error': f'User {username} not found'}), 404
 
         # find the participant entry
-        participant = ExpenseParticipant.query.filter_by(
-            expense_id=expense.id,
-            user_id=participant_user.id
-        ).first()
+        participant = participant_query(expense.id, participant_user.id).first()
 
         if not participant:
             return jsonify({'error': f'User {username} is not a participant in this expense'}), 404
 
-        if 'amount' in data:
-            participant.amount = data['amount']
+        with track_balances([expense.id]):
+            if 'amount' in data:
+                participant.amount = data['amount']
 
-        if 'item' in data:
-            participant.item = data['item']
+            if 'item' in data:
+                participant.item = data['item']
 
+        # participant changes are expense changes too (ETag, caches)
+        expense.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_expense(expense.id)
 
         return jsonify({
             'message': f'Participant {username} updated successfully'
         }), 200
 
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'The expense was changed by a concurrent request, retry'}), 409
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@participant_bp.route('/<expense_id>/split', methods=['POST'])
+@jwt_required()
+@idempotent
+def split_expense(expense_id):
+    """Re-split an expense between its participants (only by the payer)
+
+    body: {"method": "equal" | "weighted" | "percentage" | "shares",
+    "weights": {username: weight}}, weights are needed for every participant
+    unless the method is equal
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+
+    try:
+        if 'amount' in data and not is_amount(data['amount']):
+            return jsonify({'error': 'Amounts must be integers (minor units)'}), 400
+
+        expense = lock_expense(uuid.UUID(expense_id))
+        if not expense:
+            return jsonify({'error': 'Expense not found'}), 404
+
+        # current user is the payer check
+        if str(expense.payer_id) != user_id:
+            return jsonify({'error': 'Only the payer can split this expense'}), 403
+
+        method = data.get('method', 'equal')
+        if method != 'equal' and method not in SPLITS:
+            return jsonify({'error': f'method must be one of equal, {", ".join(SPLITS)}'}), 400
+
+        amounts = None
+        if method != 'equal':
+            weights = data.get('weights')
+            if not isinstance(weights, dict):
+                return jsonify({'error': 'weights must map usernames to weights'}), 400
+
+            participants = db.session.execute(
+                select(ExpenseParticipant.id, User.username)
+                .join(User, User.id == ExpenseParticipant.user_id)
+                .where(ExpenseParticipant.expense_id == expense.id)
+                .order_by(ExpenseParticipant.created_at, ExpenseParticipant.id)
+            ).all()
+
+            missing = [username for _, username in participants if username not in weights]
+            if missing:
+                return jsonify({'error': f'Missing weight for: {", ".join(missing)}'}), 400
+
+            try:
+                shares = SPLITS[method](expense.total_amount, [weights[username] for _, username in participants])
+            except (TypeError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+            amounts = {participant_id: share for (participant_id, _), share in zip(participants, shares)}
+
+        with track_balances([expense.id]):
+            if amounts is None:
+                expense.split_method = SplitMethod.EQUAL
+                apply_equal_split(expense.id)
+            else:
+                # fixed amounts from here on, adding someone won't re-split
+                expense.split_method = SplitMethod.UNEQUAL
+                apply_split(expense.id, amounts)
+
+        # participant changes are expense changes too (ETag, caches)
+        expense.updated_at = datetime.utcnow()
+        db.session.commit()
+        invalidate_expense(expense.id)
+
+        return jsonify({'message': 'Expense split successfully'}), 200
+
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'The expense was changed by a concurrent request, retry'}), 409
+
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -131,12 +243,16 @@ def update_participant(expense_id, username):
 
 @participant_bp.route('/<expense_id>/remove/<username>', methods=['DELETE'])
 @jwt_required()
+@idempotent
 def remove_participant(expense_id, username):
     """Remove a participant from an expense"""
     user_id = get_jwt_identity()
 
     try:
-        expense = Expense.query.get(uuid.UUID(expense_id))
+        if 'amount' in data and not is_amount(data['amount']):
+            return jsonify({'error': 'Amounts must be integers (minor units)'}), 400
+
+        expense = lock_expense(uuid.UUID(expense_id))
         if not expense:
             return jsonify({'error': 'Expense not found'}), 404
 
@@ -150,68 +266,95 @@ def remove_participant(expense_id, username):
             return jsonify({'error': f'User {username} not found'}), 404
 
         # check user is a participant
-        if not any(user.id == participant_user.id for user in expense.users):
+        participant = participant_query(expense.id, participant_user.id).first()
+        if not participant:
             return jsonify({'error': f'User {username} is not a participant in this expense'}), 404
 
-        # remove user from expense.users
-        expense.users.remove(participant_user)
-
-        # find and remove participant entry
-        participant = ExpenseParticipant.query.filter_by(
-            expense_id=expense.id,
-            user_id=participant_user.id
-        ).first()
-
-        if participant:
+        with track_balances([expense.id]):
             db.session.delete(participant)
 
-        # if equal split, recalculate for remaining participants
-        if expense.split_method == SplitMethod.EQUAL and expense.users:
-            num_participants = len(expense.users)
-            equal_amount = expense.total_amount / num_participants
-
-            for participant in expense.participants:
-                participant.amount = equal_amount
+            # if equal split, recalculate for remaining participants
+            if expense.split_method == SplitMethod.EQUAL:
+                apply_equal_split(expense.id)
 
+        # participant changes are expense changes too (ETag, caches)
+        expense.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_expense(expense.id)
 
         return jsonify({
             'message': f'Participant {username} removed successfully'
         }), 200
 
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'The expense was changed by a concurrent request, retry'}), 409
+
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
 @participant_bp.route('/<expense_id>/participants', methods=['GET'])
+@replica_read
 @jwt_required()
 def get_expense_participants(expense_id):
-    """Get all participants for an expense"""
+    """Get all participants for an expense
+
+    query params: fields (comma separated)
+    """
     user_id = get_jwt_identity()
 
     try:
-        expense = Expense.query.get(uuid.UUID(expense_id))
-        if not expense:
+        try:
+            fields = request_fields(PARTICIPANT_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # version + membership check, without loading the expense
+        expense_id = uuid.UUID(expense_id)
+        version = expense_version(expense_id, uuid.UUID(user_id))
+        if not version:
             return jsonify({'error': 'Expense not found'}), 404
 
         # check : current user is a participant
-        if not any(str(user.id) == user_id for user in expense.users):
+        if not version.is_member:
             return jsonify({'error': 'You do not have permission to view this expense'}), 403
 
-        # all participants
-        participants_data = []
-        for participant in expense.participants:
-            participant_user = User.query.get(participant.user_id)
-            participants_data.append({
-                'username': participant_user.username,
-                'name': participant_user.name,
-                'amount': participant.amount,
-                'item': participant.item,
-                'is_payer': str(participant_user.id) == str(expense.payer_id)
-            })
-
-        return jsonify(participants_data), 200
+        def build():
+            participants = expense_participants_query(expense_id).all()
+            return participants_to_dicts(participants, version.payer_id, fields)
+
+        return cached_json_response(expense_id, 'participants', version.etag, build, variant=fields and ','.join(fields))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@participant_bp.route('/search', methods=['GET'])
+@replica_read
+@jwt_required()
+def search_participant_users():
+    """Typeahead search of users to add as participants
+
+    query params: q (start of a username, or of an email), limit
+    """
+    user_id = get_jwt_identity()
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'q is required'}), 400
+    if len(query) > MAX_SEARCH_QUERY_LENGTH:
+        return jsonify({'error': f'q must be at most {MAX_SEARCH_QUERY_LENGTH} characters'}), 400
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    if limit < 1 or limit > MAX_SEARCH_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {MAX_SEARCH_LIMIT}'}), 400
+
+    try:
+        return jsonify({'users': search_users(uuid.UUID(user_id), query, limit)}), 200
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
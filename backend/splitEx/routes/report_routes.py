@@ -0,0 +1,42 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+import uuid
+from datetime import datetime
+
+from ..models.routing import replica_read
+from ..reports import REPORT_DIMENSIONS, user_report
+
+report_bp = Blueprint('reports', __name__)
+
+
+@report_bp.route('/', methods=['GET'])
+@replica_read
+@jwt_required()
+def get_report():
+    """Totals of the current user's expenses grouped in SQL
+
+    query params: by (month / payer / split_method / item, default month),
+    since / until (YYYY-MM-DD, inclusive)
+    """
+    user_id = get_jwt_identity()
+
+    try:
+        by = request.args.get('by', 'month')
+        if by not in REPORT_DIMENSIONS:
+            return jsonify({'error': f'by must be one of {", ".join(REPORT_DIMENSIONS)}'}), 400
+
+        try:
+            since = datetime.strptime(request.args['since'], '%Y-%m-%d').date() if 'since' in request.args else None
+            until = datetime.strptime(request.args['until'], '%Y-%m-%d').date() if 'until' in request.args else None
+        except ValueError:
+            return jsonify({'error': 'since and until must be in YYYY-MM-DD format'}), 400
+
+        return jsonify({
+            'by': by,
+            'since': since.isoformat() if since else None,
+            'until': until.isoformat() if until else None,
+            'rows': user_report(uuid.UUID(user_id), by, since, until)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,115 @@
+"""expense / participant serialization shared by the sync and async routes.
+
+Serializers take an optional field selection (`?fields=id,title` sparse
+fieldsets). List endpoints can also return a compact columnar payload
+(`?format=columns`): the column names once and one row (list) per expense,
+instead of repeating every key for every item.
+"""
+
+from operator import attrgetter
+
+from flask import request
+
+SHARE_COLUMNS = ('username', 'amount', 'item')
+
+
+def _share_row(participant):
+    return [participant.user.username, participant.amount, participant.item]
+
+
+def _share_dict(participant):
+    return {'username': participant.user.username, 'amount': participant.amount, 'item': participant.item}
+
+
+def _paid_by(expense):
+    return expense.paid_by.username if expense.paid_by else None
+
+
+# field -> getter, in the default output order
+EXPENSE_FIELDS = {
+    'id': lambda expense: str(expense.id),
+    'title': attrgetter('title'),
+    'date': lambda expense: expense.date.isoformat(),
+    'split_method': lambda expense: expense.split_method.value,
+    'total_amount': attrgetter('total_amount'),
+    'created_at': lambda expense: expense.created_at.isoformat(' ', 'seconds'),
+    'paid_by': _paid_by,
+    'group_id': lambda expense: str(expense.group_id) if expense.group_id else None,
+    'participants': lambda expense: [_share_dict(participant) for participant in expense.participants],
+}
+
+PARTICIPANT_FIELDS = {
+    'username': lambda participant, payer_id: participant.user.username,
+    'name': lambda participant, payer_id: participant.user.name,
+    'amount': lambda participant, payer_id: participant.amount,
+    'item': lambda participant, payer_id: participant.item,
+    'is_payer': lambda participant, payer_id: participant.user_id == payer_id,
+}
+
+
+def parse_fields(value, available):
+    """tuple of the requested field names, None for all of them.
+
+    raises ValueError naming the unknown fields
+    """
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f'Unknown field(s): {", ".join(unknown)}')
+    return fields or None
+
+
+def request_fields(available=EXPENSE_FIELDS):
+    """?fields= of the current request, see parse_fields"""
+    return parse_fields(request.args.get('fields'), available)
+
+
+def wants_columns():
+    """?format=columns, raises ValueError for unknown formats"""
+    output_format = request.args.get('format', 'objects')
+    if output_format not in ('objects', 'columns'):
+        raise ValueError('format must be objects or columns')
+    return output_format == 'columns'
+
+
+def expense_serializer(fields=None):
+    """expense -> dict function for `fields`, getters are looked up once per call site"""
+    getters = [(name, EXPENSE_FIELDS[name]) for name in (fields or EXPENSE_FIELDS)]
+
+    def serialize(expense):
+        return {name: getter(expense) for name, getter in getters}
+
+    return serialize
+
+
+def expense_to_dict(expense, fields=None):
+    return expense_serializer(fields)(expense)
+
+
+def expenses_to_dicts(expenses, fields=None):
+    serialize = expense_serializer(fields)
+    return [serialize(expense) for expense in expenses]
+
+
+def expenses_to_columns(expenses, fields=None):
+    """columnar payload: {'columns', 'participant_columns', 'rows'}"""
+    columns = tuple(fields or EXPENSE_FIELDS)
+    getters = [
+        (lambda expense: [_share_row(participant) for participant in expense.participants])
+        if name == 'participants' else EXPENSE_FIELDS[name]
+        for name in columns
+    ]
+    payload = {
+        'columns': list(columns),
+        'rows': [[getter(expense) for getter in getters] for expense in expenses],
+    }
+    if 'participants' in columns:
+        payload['participant_columns'] = list(SHARE_COLUMNS)
+    return payload
+
+
+def participants_to_dicts(participants, payer_id, fields=None):
+    getters = [(name, PARTICIPANT_FIELDS[name]) for name in (fields or PARTICIPANT_FIELDS)]
+    return [{name: getter(participant, payer_id) for name, getter in getters} for participant in participants]
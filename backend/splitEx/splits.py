@@ -0,0 +1,123 @@
+"""splitting an expense total between participants.
+
+Amounts are integer minor units (cents). Every split hands out the leftover
+units with the largest remainder method, so shares always add up exactly to
+the total.
+"""
+
+import uuid
+from fractions import Fraction
+
+from sqlalchemy import case, func, select, update
+
+from .models import db
+from .models.expense import Expense, ExpenseParticipant
+
+
+def is_amount(value) -> bool:
+    """an integer amount of minor units (bools are ints too, but not amounts)"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def largest_remainder(total: int, weights: list) -> list[int]:
+    """split `total` proportionally to `weights`, exactly.
+
+    each share gets the floor of its exact quota, the units left over go one
+    each to the largest fractional remainders (earlier entries win ties)
+    """
+    weights = [Fraction(str(weight)) if isinstance(weight, float) else Fraction(weight) for weight in weights]
+    if not weights:
+        return []
+    if any(weight < 0 for weight in weights):
+        raise ValueError('weights must not be negative')
+    weight_sum = sum(weights)
+    if weight_sum == 0:
+        raise ValueError('weights must not all be zero')
+
+    quotas = [total * weight / weight_sum for weight in weights]
+    shares = [quota.numerator // quota.denominator for quota in quotas]
+
+    leftover = total - sum(shares)
+    by_remainder = sorted(range(len(quotas)), key=lambda i: (-(quotas[i] - shares[i]), i))
+    for i in by_remainder[:leftover]:
+        shares[i] += 1
+    return shares
+
+
+def equal_split(total: int, count: int) -> list[int]:
+    """`count` shares differing by at most one unit, the larger ones first"""
+    if count <= 0:
+        return []
+    base, leftover = divmod(total, count)
+    return [base + 1] * leftover + [base] * (count - leftover)
+
+
+def weighted_split(total: int, weights: list) -> list[int]:
+    """proportional to arbitrary non negative weights"""
+    return largest_remainder(total, weights)
+
+
+def percentage_split(total: int, percentages: list) -> list[int]:
+    """percentages must add up to 100"""
+    if sum(Fraction(str(p)) if isinstance(p, float) else Fraction(p) for p in percentages) != 100:
+        raise ValueError('percentages must add up to 100')
+    return largest_remainder(total, percentages)
+
+
+def shares_split(total: int, shares: list) -> list[int]:
+    """whole number of shares per participant, e.g. 2 for a couple"""
+    if any(not isinstance(share, int) or isinstance(share, bool) for share in shares):
+        raise ValueError('shares must be whole numbers')
+    return largest_remainder(total, shares)
+
+
+SPLITS = {
+    'weighted': weighted_split,
+    'percentage': percentage_split,
+    'shares': shares_split,
+}
+
+
+def apply_equal_split(expense_id: uuid.UUID) -> int:
+    """rewrite every participant amount of an expense as an equal split.
+
+    one UPDATE for the whole expense: everyone gets total // n, and the first
+    total % n participants (oldest first, so the payer before the others) get
+    one extra unit. returns the number of participants.
+    """
+    db.session.flush()
+    total_amount, count = db.session.execute(
+        select(Expense.total_amount, func.count(ExpenseParticipant.id))
+        .join(ExpenseParticipant, ExpenseParticipant.expense_id == Expense.id)
+        .where(Expense.id == expense_id)
+        .group_by(Expense.id, Expense.total_amount)
+    ).one_or_none() or (0, 0)
+    if not count:
+        return 0
+
+    base, leftover = divmod(total_amount, count)
+    first = select(ExpenseParticipant.id).where(
+        ExpenseParticipant.expense_id == expense_id
+    ).order_by(
+        ExpenseParticipant.created_at, ExpenseParticipant.id
+    ).limit(leftover)
+
+    db.session.execute(
+        update(ExpenseParticipant)
+        .where(ExpenseParticipant.expense_id == expense_id)
+        .values(amount=case((ExpenseParticipant.id.in_(first), base + 1), else_=base))
+        .execution_options(synchronize_session='fetch')
+    )
+    return count
+
+
+def apply_split(expense_id: uuid.UUID, amounts: dict[uuid.UUID, int]):
+    """set participant amounts (participant id -> amount) with one UPDATE"""
+    if not amounts:
+        return
+    db.session.execute(
+        update(ExpenseParticipant)
+        .where(ExpenseParticipant.expense_id == expense_id)
+        .values(amount=case(amounts, value=ExpenseParticipant.id, else_=ExpenseParticipant.amount))
+        .execution_options(synchronize_session='fetch')
+    )
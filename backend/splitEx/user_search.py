@@ -0,0 +1,137 @@
+"""typeahead search of users, for picking participants.
+
+A query matches the start of a lowercased username, or of an email once the
+query contains an '@' (typing a friend's address finds them, but emails
+can't be enumerated letter by letter). Prefixes are range scans of the
+lower(...) expression indexes from migration 0007, byte ordered (COLLATE
+"C") on Postgres so that a range is exactly a prefix whatever the database
+collation. On Postgres queries of 3+ characters also match inside usernames,
+through a pg_trgm index.
+
+The query is folded the way the database folds the column: SQLite's lower()
+only folds ASCII, Postgres' folds any letter, so a prefix never compares a
+Python-lowered string against a differently lowered key.
+
+Users the caller has split expenses with (a balances row either way) are
+ranked first, then other prefix matches in username order, then infix
+matches by similarity.
+"""
+
+import string
+import sys
+import uuid
+
+from sqlalchemy import and_, func, select, union
+
+from .models import db
+from .models.balance import Balance
+from .models.user import User
+
+# shortest query the trigram index can serve
+MIN_INFIX_LENGTH = 3
+
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+SURROGATES = range(0xD800, 0xE000)
+
+
+def _is_postgres():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def search_key(column):
+    """lower(column), in the order of its search index"""
+    key = func.lower(column)
+    if _is_postgres():
+        return key.collate('C')
+    return key
+
+
+def fold(query: str) -> str:
+    """query lowercased like search_key lowercases the column"""
+    if _is_postgres():
+        return query.lower()
+    return query.translate(ASCII_LOWER)
+
+
+def _prefix_upper(prefix: str):
+    """the smallest string after every string starting with `prefix`, None if there's none"""
+    while prefix:
+        code_point = ord(prefix[-1]) + 1
+        if code_point in SURROGATES:
+            # not storable, the next character is the first after them
+            code_point = SURROGATES.stop
+        if code_point <= sys.maxunicode:
+            return prefix[:-1] + chr(code_point)
+        # U+10FFFF can't be incremented, carry over to the previous character
+        prefix = prefix[:-1]
+    return None
+
+
+def prefix_clause(column, prefix: str):
+    """search_key(column) starts with `prefix`, as an index range"""
+    key = search_key(column)
+    upper = _prefix_upper(prefix)
+    if upper is None:
+        return key >= prefix
+    return and_(key >= prefix, key < upper)
+
+
+def prefix_query(column, prefix: str, limit: int):
+    return (
+        select(User.id, User.username, User.name)
+        .where(prefix_clause(column, prefix))
+        .order_by(search_key(column))
+        .limit(limit)
+    )
+
+
+def _contacts(user_id: uuid.UUID):
+    return union(
+        select(Balance.debtor_id).where(Balance.creditor_id == user_id),
+        select(Balance.creditor_id).where(Balance.debtor_id == user_id),
+    )
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_users(user_id: uuid.UUID, query: str, limit: int) -> list[dict]:
+    """up to `limit` users matching `query` (the caller excluded), best first"""
+    prefix = fold(query.strip())
+    if not prefix:
+        return []
+    columns = [User.username, User.email] if '@' in prefix else [User.username]
+
+    found = {}
+
+    def add(rows, shared=False):
+        for id_, username, name in rows:
+            if id_ != user_id and id_ not in found and len(found) < limit:
+                found[id_] = {'id': str(id_), 'username': username, 'name': name, 'shared': shared}
+
+    # contacts are few, matched through the users pk
+    for column in columns:
+        add(db.session.execute(
+            select(User.id, User.username, User.name)
+            .where(User.id.in_(_contacts(user_id)), prefix_clause(column, prefix))
+            .order_by(User.username)
+            .limit(limit)
+        ), shared=True)
+
+    # everyone else, fetching enough to skip the ones already found
+    for column in columns:
+        if len(found) >= limit:
+            break
+        add(db.session.execute(prefix_query(column, prefix, limit + len(found) + 1)))
+
+    if _is_postgres() and len(prefix) >= MIN_INFIX_LENGTH and len(found) < limit:
+        key = func.lower(User.username)
+        add(db.session.execute(
+            select(User.id, User.username, User.name)
+            .where(key.like(f'%{_escape_like(prefix)}%', escape='\\'))
+            .order_by(func.similarity(key, prefix).desc(), User.username)
+            .limit(limit + len(found) + 1)
+        ))
+
+    return list(found.values())
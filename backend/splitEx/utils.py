@@ -0,0 +1,20 @@
+import base64
+import uuid
+from datetime import date
+
+
+def encode_cursor(cursor_date: date, cursor_id: uuid.UUID) -> str:
+    """opaque pagination cursor for a (date, id) keyset position"""
+    raw = f"{cursor_date.isoformat()}|{cursor_id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[date, uuid.UUID]:
+    """inverse of encode_cursor, raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        cursor_date, cursor_id = raw.split("|")
+        return date.fromisoformat(cursor_date), uuid.UUID(hex=cursor_id)
+    except (UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError("invalid cursor") from e
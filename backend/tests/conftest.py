@@ -0,0 +1,34 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from splitEx import create_app
+from splitEx.models import db
+from splitEx.models.user import User
+
+
+@pytest.fixture
+def app(tmp_path):
+    # a file database so requests on other threads see the same data
+    app = create_app('test', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'SQLALCHEMY_BINDS': {},
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    """make_user(username) -> (User, auth headers)"""
+    def make(username):
+        user = User(email=f'{username}@example.com', username=username, name=username, password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        return user, {'Authorization': f'Bearer {create_access_token(identity=str(user.id))}'}
+    return make
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+from splitEx import create_app
+from splitEx.asgi import AsgiApp
+from splitEx.models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app('test', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'SQLALCHEMY_BINDS': {},
+        'ASYNC_DB_ENABLED': True,
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+async def call(asgi_app, path, headers):
+    """(status, headers, json body) of a GET through the asgi app"""
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(scope, receive, send)
+    start, *body = messages
+    return start['status'], dict(start['headers']), json.loads(b''.join(message.get('body', b'') for message in body))
+
+
+async def serve(asgi_app, requests):
+    """run `requests` concurrently through asgi_app between lifespan startup and shutdown"""
+    lifespan = asyncio.Queue()
+    for message in ('lifespan.startup', 'lifespan.shutdown'):
+        lifespan.put_nowait({'type': message})
+    sent = []
+
+    async def send(message):
+        sent.append(message['type'])
+
+    results = await asyncio.gather(*(call(asgi_app, *r) for r in requests))
+    await asgi_app({'type': 'lifespan'}, lifespan.get, send)
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+    return results
+
+
+@pytest.mark.parametrize('async_views', [None, {}], ids=['async', 'sync'])
+def test_asgi_responses_match_wsgi(app, client, make_user, async_views):
+    _, headers = make_user('payer')
+    make_user('friend')
+    expense_id = client.post('/api/expenses/', json={'title': 'lunch', 'total_amount': 1200}, headers=headers).json['expense_id']
+    client.post(f'/api/participants/{expense_id}/add', json={'username': 'friend'}, headers=headers)
+
+    paths = ['/api/expenses/', f'/api/expenses/{expense_id}', f'/api/participants/{expense_id}/participants']
+    expected = [client.get(path, headers=headers) for path in paths]
+
+    asgi_app = AsgiApp(app, async_views=async_views)
+    results = asyncio.run(serve(asgi_app, [(path, headers) for path in paths] + [('/api/expenses/', {})]))
+
+    for (status, response_headers, body), response in zip(results, expected):
+        assert status == response.status_code == 200
+        assert body == response.json
+    assert results[0][1][b'x-change-seq'] == expected[0].headers['X-Change-Seq'].encode()
+    # no token: the jwt is checked for async views too
+    assert results[-1][0] == 401
+    # lifespan shutdown closed the loop's pool
+    assert not app.extensions['async_db']
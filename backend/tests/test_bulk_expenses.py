@@ -0,0 +1,54 @@
+def test_bulk_rejects_malformed_items_one_by_one(client, make_user):
+    _, headers = make_user('alice')
+    make_user('bob')
+
+    response = client.post('/api/expenses/bulk', json={'expenses': [
+        {'title': 'lunch', 'total_amount': 1000, 'participants': ['bob']},
+        {'title': 'not a list', 'total_amount': 100, 'participants': 5},
+        {'title': 'bad username', 'total_amount': 100, 'participants': [{'username': ['bob']}]},
+        {'title': 'unknown', 'total_amount': 100, 'participants': ['nobody']},
+        'not an object',
+    ]}, headers=headers)
+
+    assert response.status_code == 207
+    assert response.json['created'] == 1
+    assert [result['status'] for result in response.json['results']] == [201, 400, 400, 400, 400]
+    assert response.json['results'][1]['error'] == 'participants must be a list'
+
+
+def test_bulk_splits_equally(client, make_user):
+    _, headers = make_user('alice')
+    make_user('bob')
+
+    response = client.post('/api/expenses/bulk', json={'expenses': [
+        {'title': 'lunch', 'total_amount': 1001, 'participants': ['bob']},
+    ]}, headers=headers)
+    assert response.status_code == 201
+
+    expense = client.get(f'/api/expenses/{response.json["results"][0]["expense_id"]}', headers=headers).json
+    assert sorted(participant['amount'] for participant in expense['participants']) == [500, 501]
+
+
+def test_bulk_unequal_rejects_amounts_past_the_total(client, make_user):
+    _, headers = make_user('alice')
+    make_user('bob')
+    make_user('carol')
+
+    response = client.post('/api/expenses/bulk', json={'expenses': [
+        {'title': 'too much', 'total_amount': 1000, 'split_method': 'unequal',
+         'participants': [{'username': 'bob', 'amount': 700}, {'username': 'carol', 'amount': 400}]},
+        {'title': 'negative', 'total_amount': 1000, 'split_method': 'unequal',
+         'participants': [{'username': 'bob', 'amount': -200}]},
+        {'title': 'bool', 'total_amount': 1000, 'split_method': 'unequal',
+         'participants': [{'username': 'bob', 'amount': True}]},
+        {'title': 'fits', 'total_amount': 1000, 'split_method': 'unequal',
+         'participants': [{'username': 'bob', 'amount': 600}, {'username': 'carol', 'amount': 400}]},
+    ]}, headers=headers)
+
+    assert response.status_code == 207
+    assert [(result['status'], result.get('error')) for result in response.json['results']] == [
+        (400, 'Participant amounts exceed the total'),
+        (400, 'Participant amounts exceed the total'),
+        (400, 'Amounts must be integers (minor units)'),
+        (201, None),
+    ]
@@ -0,0 +1,35 @@
+from splitEx.changes import ChangeNotifier
+
+
+def open_stream(client, headers):
+    response = client.get('/api/expenses/changes/stream?since=0', headers=headers, buffered=False)
+    if response.status_code == 200:
+        assert next(response.response).startswith(b'retry:')
+    return response
+
+
+def test_stream_is_off_by_default(client, make_user):
+    _, headers = make_user('payer')
+    assert open_stream(client, headers).status_code == 404
+
+
+def test_open_streams_are_capped_per_process(app, client, make_user):
+    app.config['CHANGE_STREAM_ENABLED'] = True
+    app.extensions['change_notifier'] = ChangeNotifier(max_streams=2)
+    _, headers = make_user('payer')
+
+    first, second = open_stream(client, headers), open_stream(client, headers)
+    assert first.status_code == second.status_code == 200
+
+    full = open_stream(client, headers)
+    assert full.status_code == 503
+    assert full.headers['Retry-After']
+
+    # a closed stream frees its slot (closed last in, first out: in this
+    # thread they share one request context stack)
+    second.close()
+    third = open_stream(client, headers)
+    assert third.status_code == 200
+    third.close()
+    first.close()
+    assert app.extensions['change_notifier'].open_stream()
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from splitEx.changes import purge_changes
+from splitEx.models import db
+from splitEx.models.change import ExpenseChange
+
+
+def feed(client, headers, since=0):
+    return client.get(f'/api/expenses/changes?since={since}', headers=headers)
+
+
+def test_seqs_are_per_user(client, make_user):
+    _, payer = make_user('payer')
+    _, friend = make_user('friend')
+    _, other = make_user('other')
+
+    assert client.get('/api/expenses/', headers=friend).headers['X-Change-Seq'] == '0'
+    shared = client.post('/api/expenses/', json={'title': 'dinner', 'total_amount': 1000}, headers=payer).json
+    client.post(f'/api/participants/{shared["expense_id"]}/add', json={'username': 'friend'}, headers=payer)
+    client.post('/api/expenses/', json={'title': 'taxi', 'total_amount': 300}, headers=other)
+
+    # payer: created, then friend added; friend: added
+    assert client.get('/api/expenses/', headers=payer).headers['X-Change-Seq'] == '2'
+    assert client.get('/api/expenses/', headers=friend).headers['X-Change-Seq'] == '1'
+    assert client.get('/api/expenses/', headers=other).headers['X-Change-Seq'] == '1'
+
+    response = feed(client, friend).json
+    assert [expense['id'] for expense in response['changed']] == [shared['expense_id']]
+    assert response['next_since'] == 1
+    assert feed(client, payer, since=2).json['changed'] == []
+
+
+def test_purge_is_tracked_per_user(client, make_user):
+    _, payer = make_user('payer')
+    _, other = make_user('other')
+    client.post('/api/expenses/', json={'title': 'old', 'total_amount': 1000}, headers=payer)
+    client.post('/api/expenses/', json={'title': 'new', 'total_amount': 1000}, headers=payer)
+    client.post('/api/expenses/', json={'title': 'also old', 'total_amount': 1000}, headers=other)
+    db.session.execute(update(ExpenseChange).where(ExpenseChange.seq == 1).values(
+        changed_at=datetime.utcnow() - timedelta(days=60)
+    ))
+    db.session.commit()
+
+    assert purge_changes(30) == 2
+
+    assert feed(client, payer).status_code == 410
+    assert [expense['title'] for expense in feed(client, payer, since=1).json['changed']] == ['new']
+    assert feed(client, other).status_code == 410
+    assert feed(client, other, since=1).json['changed'] == []
@@ -0,0 +1,148 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, select, update
+
+from splitEx.models import db
+from splitEx.models.expense import Expense, ExpenseParticipant
+from splitEx.routes import participant_routes
+
+CONCURRENT_REQUESTS = 8
+
+
+def concurrently(app, request, count=CONCURRENT_REQUESTS):
+    """run request(client, i) on `count` threads released at the same time, the responses in order"""
+    barrier = threading.Barrier(count)
+
+    def run(i):
+        client = app.test_client()
+        barrier.wait()
+        return request(client, i)
+
+    with ThreadPoolExecutor(count) as pool:
+        return list(pool.map(run, range(count)))
+
+
+def participant_amounts(expense_id):
+    db.session.remove()
+    return db.session.scalars(
+        select(ExpenseParticipant.amount).where(ExpenseParticipant.expense_id == expense_id)
+    ).all()
+
+
+def test_concurrent_retries_with_one_idempotency_key_create_one_expense(app, make_user):
+    _, headers = make_user('payer')
+    headers = {**headers, 'Idempotency-Key': 'create-dinner'}
+    body = {'title': 'dinner', 'total_amount': 3000}
+
+    responses = concurrently(app, lambda client, i: client.post('/api/expenses/', json=body, headers=headers))
+
+    # one request ran the write, the ones racing it were told it's in progress or got its response
+    created = [r for r in responses if r.status_code == 201 and 'Idempotent-Replayed' not in r.headers]
+    assert len(created) == 1
+    assert all(r.status_code == 409 or r.headers.get('Idempotent-Replayed') == 'true'
+               for r in responses if r is not created[0])
+
+    retry = app.test_client().post('/api/expenses/', json=body, headers=headers)
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.json == created[0].json
+
+    db.session.remove()
+    assert db.session.scalar(select(func.count()).select_from(Expense).where(Expense.title == 'dinner')) == 1
+
+
+def test_concurrent_participant_adds_keep_the_split_consistent(app, make_user):
+    _, headers = make_user('payer')
+    usernames = [make_user(f'friend{i}')[0].username for i in range(CONCURRENT_REQUESTS)]
+    expense_id = app.test_client().post(
+        '/api/expenses/', json={'title': 'dinner', 'total_amount': 9001}, headers=headers
+    ).json['expense_id']
+
+    responses = concurrently(app, lambda client, i: client.post(
+        f'/api/participants/{expense_id}/add', json={'username': usernames[i]}, headers=headers
+    ))
+
+    # every add either landed or was refused as a conflict, none was lost or half applied
+    added = [r for r in responses if r.status_code == 201]
+    assert added
+    assert all(r.status_code in (201, 409) for r in responses)
+    amounts = participant_amounts(expense_id)
+    assert len(amounts) == 1 + len(added)
+    assert sum(amounts) == 9001
+    assert max(amounts) - min(amounts) <= 1
+
+
+def test_concurrent_adds_of_one_user_create_one_participant(app, make_user):
+    _, headers = make_user('payer')
+    make_user('friend')
+    expense_id = app.test_client().post(
+        '/api/expenses/', json={'title': 'dinner', 'total_amount': 1000}, headers=headers
+    ).json['expense_id']
+
+    responses = concurrently(app, lambda client, i: client.post(
+        f'/api/participants/{expense_id}/add', json={'username': 'friend'}, headers=headers
+    ))
+
+    assert [r.status_code for r in responses].count(201) == 1
+    assert all(r.status_code in (201, 400, 409) for r in responses)
+    assert sorted(participant_amounts(expense_id)) == [500, 500]
+
+
+def test_write_on_a_stale_version_is_a_conflict(app, make_user, monkeypatch):
+    _, headers = make_user('payer')
+    make_user('friend')
+    client = app.test_client()
+    expense_id = client.post(
+        '/api/expenses/', json={'title': 'dinner', 'total_amount': 1000}, headers=headers
+    ).json['expense_id']
+
+    # another writer commits a change to the expense after this request loaded it
+    is_participant = participant_routes.is_participant
+    concurrent_write = []
+
+    def changed_meanwhile(expense_id, user_id):
+        if not concurrent_write:
+            with db.engine.begin() as connection:
+                concurrent_write.append(connection.execute(
+                    update(Expense).where(Expense.id == expense_id).values(version=Expense.version + 1)
+                ).rowcount)
+        return is_participant(expense_id, user_id)
+
+    monkeypatch.setattr(participant_routes, 'is_participant', changed_meanwhile)
+    response = client.post(f'/api/participants/{expense_id}/add', json={'username': 'friend'}, headers=headers)
+
+    assert concurrent_write == [1]
+    assert response.status_code == 409
+    assert participant_amounts(expense_id) == [1000]
+
+
+def test_retry_after_a_conflict_with_the_same_idempotency_key_applies_the_write(app, make_user, monkeypatch):
+    _, headers = make_user('payer')
+    make_user('friend')
+    client = app.test_client()
+    expense_id = client.post(
+        '/api/expenses/', json={'title': 'dinner', 'total_amount': 1000}, headers=headers
+    ).json['expense_id']
+    headers = {**headers, 'Idempotency-Key': 'add-friend'}
+
+    is_participant = participant_routes.is_participant
+
+    def changed_meanwhile(expense_id, user_id):
+        with db.engine.begin() as connection:
+            connection.execute(update(Expense).where(Expense.id == expense_id).values(version=Expense.version + 1))
+        return is_participant(expense_id, user_id)
+
+    monkeypatch.setattr(participant_routes, 'is_participant', changed_meanwhile)
+    conflict = client.post(f'/api/participants/{expense_id}/add', json={'username': 'friend'}, headers=headers)
+    assert conflict.status_code == 409
+
+    # the retry the 409 asks for runs the write, it isn't a replay of the conflict
+    monkeypatch.setattr(participant_routes, 'is_participant', is_participant)
+    retry = client.post(f'/api/participants/{expense_id}/add', json={'username': 'friend'}, headers=headers)
+    assert retry.status_code == 201
+    assert 'Idempotent-Replayed' not in retry.headers
+    assert sorted(participant_amounts(expense_id)) == [500, 500]
+
+    replay = client.post(f'/api/participants/{expense_id}/add', json={'username': 'friend'}, headers=headers)
+    assert (replay.status_code, replay.headers['Idempotent-Replayed']) == (201, 'true')
@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import event
+
+from splitEx.models import db
+
+
+def count_queries(fn):
+    """(fn(), number of statements it ran)"""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        result = fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return result, len(statements)
+
+
+def add_expenses(client, headers, count, usernames):
+    for i in range(count):
+        created = client.post('/api/expenses/', json={'title': f'expense {i}', 'total_amount': 1000}, headers=headers)
+        assert created.status_code == 201
+        for username in usernames:
+            added = client.post(
+                f'/api/participants/{created.json["expense_id"]}/add', json={'username': username}, headers=headers
+            )
+            assert added.status_code == 201
+
+
+@pytest.mark.parametrize('expense_count, participant_count', [(1, 1), (5, 2), (20, 4)])
+def test_feed_query_count_is_constant(client, make_user, expense_count, participant_count):
+    _, headers = make_user('payer')
+    usernames = [make_user(f'friend{i}')[0].username for i in range(participant_count)]
+    add_expenses(client, headers, expense_count, usernames)
+
+    # first request warms the identity cache
+    assert client.get('/api/expenses/', headers=headers).status_code == 200
+
+    response, queries = count_queries(lambda: client.get('/api/expenses/', headers=headers))
+    assert response.status_code == 200
+    assert len(response.json) == expense_count
+    assert all(len(expense['participants']) == participant_count + 1 for expense in response.json)
+    # change seq, expenses (+ payer), participants (+ users), whatever the feed size
+    assert queries == 3
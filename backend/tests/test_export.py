@@ -0,0 +1,64 @@
+import json
+import tracemalloc
+
+SMALL_EXPORT_ROWS = 2000
+LARGE_EXPORT_ROWS = 10000
+BULK_REQUEST_SIZE = 5000
+
+
+def add_expenses(app, client, headers, count):
+    app.config['JOBS_ENABLED'] = False
+    for start in range(0, count, BULK_REQUEST_SIZE):
+        items = [
+            {'title': f'expense {i}', 'total_amount': 1000 + i, 'date': '2026-01-01', 'participants': ['friend']}
+            for i in range(min(BULK_REQUEST_SIZE, count - start))
+        ]
+        response = client.post('/api/expenses/bulk', json={'expenses': items}, headers=headers)
+        assert response.status_code == 201
+
+
+def stream_export(client, headers, export_format):
+    """(lines, bytes, peak traced memory) of an export, request included, consumed chunk by chunk"""
+    lines = size = 0
+    tracemalloc.start()
+    try:
+        response = client.get(f'/api/expenses/export?format={export_format}', headers=headers, buffered=False)
+        assert response.status_code == 200
+        for chunk in response.response:
+            lines += chunk.count(b'\n')
+            size += len(chunk)
+        response.close()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return lines, size, peak
+
+
+def test_export_memory_stays_flat(app, client, make_user):
+    _, headers = make_user('payer')
+    make_user('friend')
+
+    add_expenses(app, client, headers, SMALL_EXPORT_ROWS)
+    small = {export_format: stream_export(client, headers, export_format) for export_format in ('ndjson', 'csv')}
+    add_expenses(app, client, headers, LARGE_EXPORT_ROWS - SMALL_EXPORT_ROWS)
+    large = {export_format: stream_export(client, headers, export_format) for export_format in ('ndjson', 'csv')}
+
+    assert large['ndjson'][0] == LARGE_EXPORT_ROWS
+    # header + a row per participant (payer and friend)
+    assert large['csv'][0] == 1 + 2 * LARGE_EXPORT_ROWS
+
+    # 5x the rows, same peak: a few export batches at a time, never the whole history
+    for export_format in ('ndjson', 'csv'):
+        _, small_size, small_peak = small[export_format]
+        _, large_size, large_peak = large[export_format]
+        assert large_size > 4 * small_size
+        assert large_peak < 1.5 * small_peak
+
+
+def test_export_ndjson_rows(client, make_user):
+    _, headers = make_user('payer')
+    client.post('/api/expenses/', json={'title': 'lunch', 'total_amount': 1200}, headers=headers)
+
+    response = client.get('/api/expenses/export', headers=headers)
+    rows = [json.loads(line) for line in response.data.splitlines()]
+    assert [row['title'] for row in rows] == ['lunch']
@@ -0,0 +1,40 @@
+def test_summary_lists_members_without_activity(client, make_user):
+    _, headers = make_user('payer')
+    make_user('friend')
+    make_user('quiet')
+    group_id = client.post('/api/groups/', json={'name': 'trip', 'members': ['friend']},
+                           headers=headers).json['group_id']
+    created = client.post('/api/expenses/', json={'title': 'dinner', 'total_amount': 1000, 'group_id': group_id},
+                          headers=headers)
+    assert created.status_code == 201
+    # joins after the only expense, nothing paid or owed
+    assert client.post(f'/api/groups/{group_id}/members', json={'username': 'quiet'}, headers=headers).status_code == 201
+
+    response = client.get(f'/api/groups/{group_id}/summary', headers=headers)
+    assert response.status_code == 200
+    members = {member['username']: member for member in response.json['members']}
+    assert members == {
+        'payer': {'username': 'payer', 'paid': 1000, 'balance': 500},
+        'friend': {'username': 'friend', 'paid': 0, 'balance': -500},
+        'quiet': {'username': 'quiet', 'paid': 0, 'balance': 0},
+    }
+
+
+def test_change_feed_leaves_out_group_expenses_the_user_is_not_on(client, make_user):
+    _, headers = make_user('payer')
+    _, friend = make_user('friend')
+    _, late = make_user('late')
+    group_id = client.post('/api/groups/', json={'name': 'trip', 'members': ['friend']},
+                           headers=headers).json['group_id']
+    expense_id = client.post('/api/expenses/', json={'title': 'dinner', 'total_amount': 1000, 'group_id': group_id},
+                             headers=headers).json['expense_id']
+    # late joins after the expense, the group lists it but late isn't on it
+    client.post(f'/api/groups/{group_id}/members', json={'username': 'late'}, headers=headers)
+
+    def changed(headers):
+        return [expense['id'] for expense in client.get('/api/expenses/changes?since=0', headers=headers).json['changed']]
+
+    assert changed(headers) == changed(friend) == [expense_id]
+    assert changed(late) == []
+    group_expenses = client.get(f'/api/groups/{group_id}/expenses', headers=late).json
+    assert [expense['id'] for expense in group_expenses['expenses']] == [expense_id]
@@ -0,0 +1,25 @@
+from splitEx.models import db
+
+
+def test_deleted_user_gets_404(client, make_user):
+    user, headers = make_user('alice')
+    # cached on the first request, evicted when the row goes
+    assert client.get('/api/auth/u', headers=headers).json['username'] == 'alice'
+
+    db.session.delete(user)
+    db.session.commit()
+
+    for method, path in [('GET', '/api/auth/u'), ('GET', '/api/expenses/'), ('POST', '/api/expenses/')]:
+        response = client.open(path, method=method, json={'title': 'lunch', 'total_amount': 100}, headers=headers)
+        assert response.status_code == 404
+        assert response.json == {'error': 'User not found'}
+
+
+def test_renamed_user_is_not_served_stale(client, make_user):
+    user, headers = make_user('alice')
+    assert client.get('/api/auth/u', headers=headers).json['name'] == 'alice'
+
+    user.name = 'Alice Liddell'
+    db.session.commit()
+
+    assert client.get('/api/auth/u', headers=headers).json['name'] == 'Alice Liddell'
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select, update
+
+from splitEx.jobs import JOB_HANDLERS, LeaseLost, checkpoint, claim_job, run_job
+from splitEx.models import db
+from splitEx.models.expense import Expense
+from splitEx.models.job import Job, JobStatus
+
+BULK = {'expenses': [{'title': f'expense {i}', 'total_amount': 1000} for i in range(3)]}
+ASYNC = {'Prefer': 'respond-async'}
+
+
+def queue_bulk(app, client, headers):
+    app.config['JOBS_ENABLED'] = True
+    response = client.post('/api/expenses/bulk', json=BULK, headers={**headers, **ASYNC})
+    assert response.status_code == 202
+    return response.json['id']
+
+
+def expire_lease(job_id):
+    # the worker holding it stalled past JOB_LEASE_SECONDS
+    db.session.execute(update(Job).where(Job.id == job_id).values(run_at=datetime.utcnow() - timedelta(seconds=1)))
+    db.session.commit()
+
+
+def claim_elsewhere(app, worker_id):
+    """claim the next job as another worker process would, in its own session"""
+    with app.app_context():
+        job = claim_job(worker_id)
+        db.session.remove()
+    return job.id
+
+
+def expense_count():
+    return db.session.scalar(select(func.count()).select_from(Expense))
+
+
+def test_bulk_runs_inline_while_jobs_are_disabled(client, make_user):
+    _, headers = make_user('payer')
+    response = client.post('/api/expenses/bulk', json=BULK, headers={**headers, **ASYNC})
+    assert response.status_code == 201
+    assert response.json['created'] == 3
+
+
+def test_checkpoint_after_losing_the_lease_raises(app, client, make_user):
+    _, headers = make_user('payer')
+    queue_bulk(app, client, headers)
+    job = claim_job('worker-a')
+    expire_lease(job.id)
+    claim_elsewhere(app, 'worker-b')
+
+    with pytest.raises(LeaseLost):
+        checkpoint(job, ['stale'])
+    db.session.rollback()
+    assert db.session.get(Job, job.id).progress is None
+
+
+def test_lost_lease_does_not_create_the_bulk_twice(app, client, make_user):
+    _, headers = make_user('payer')
+    job_id = queue_bulk(app, client, headers)
+    stalled = claim_job('worker-a')
+    expire_lease(stalled.id)
+    claim_elsewhere(app, 'worker-b')
+
+    # the stalled worker resumes: its chunk is rolled back, the job left alone
+    job = run_job(stalled)
+    assert (job.status, job.locked_by) == (JobStatus.RUNNING, 'worker-b')
+    assert expense_count() == 0
+
+    with app.app_context():
+        job = db.session.get(Job, stalled.id)
+        job.lease_owner = 'worker-b'
+        assert run_job(job).status == JobStatus.SUCCEEDED
+        db.session.remove()
+
+    db.session.remove()
+    assert expense_count() == 3
+    assert client.get(f'/api/jobs/{job_id}', headers=headers).json['result']['created'] == 3
+
+
+def test_outcome_of_a_lost_lease_is_dropped(app, client, make_user, monkeypatch):
+    _, headers = make_user('payer')
+    queue_bulk(app, client, headers)
+    stalled = claim_job('worker-a')
+    expire_lease(stalled.id)
+    claim_elsewhere(app, 'worker-b')
+
+    # a handler without checkpoints finishing late can't mark the job done either
+    monkeypatch.setitem(JOB_HANDLERS, 'bulk_create_expenses', lambda job: {'created': 0})
+    job = run_job(stalled)
+    assert (job.status, job.locked_by, job.result) == (JobStatus.RUNNING, 'worker-b', None)
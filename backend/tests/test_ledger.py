@@ -0,0 +1,50 @@
+
+from sqlalchemy import select
+
+from splitEx.ledger import apply_deltas, apply_group_deltas, balance_drift
+from splitEx.models import db
+from splitEx.models.balance import Balance, GroupBalance
+from splitEx.models.group import Group
+
+
+def stored_balances():
+    return {(row.creditor_id, row.debtor_id): row.amount for row in db.session.scalars(select(Balance))}
+
+
+def test_apply_deltas_creates_and_adds(make_user):
+    alice, bob, carol = (make_user(name)[0] for name in ('alice', 'bob', 'carol'))
+
+    apply_deltas({(alice.id, bob.id): 300, (alice.id, carol.id): 0})
+    # the same new pair twice in a transaction (two writers racing on it) adds up
+    apply_deltas({(alice.id, bob.id): 200, (bob.id, carol.id): 50})
+    db.session.commit()
+
+    assert stored_balances() == {(alice.id, bob.id): 500, (bob.id, carol.id): 50}
+
+
+def test_apply_group_deltas_creates_and_adds(make_user):
+    alice, bob = (make_user(name)[0] for name in ('alice', 'bob'))
+    group = Group(name='trip', created_by=alice.id)
+    db.session.add(group)
+    db.session.commit()
+
+    apply_group_deltas({(group.id, alice.id): 100, (group.id, bob.id): -100})
+    apply_group_deltas({(group.id, alice.id): 20, (group.id, bob.id): -20})
+    db.session.commit()
+
+    assert {row.user_id: row.amount for row in db.session.scalars(select(GroupBalance))} == {
+        alice.id: 120, bob.id: -120
+    }
+
+
+def test_writes_keep_balances_in_sync(client, make_user):
+    _, headers = make_user('alice')
+    make_user('bob')
+
+    created = client.post('/api/expenses/', json={'title': 'dinner', 'total_amount': 1000}, headers=headers)
+    client.post(f'/api/participants/{created.json["expense_id"]}/add', json={'username': 'bob'}, headers=headers)
+    client.post('/api/expenses/bulk', json={'expenses': [
+        {'title': 'taxi', 'total_amount': 300, 'participants': ['bob']}
+    ]}, headers=headers)
+
+    assert balance_drift() == []
@@ -0,0 +1,25 @@
+from splitEx import create_app
+
+
+def test_metrics_off_by_default(client):
+    assert client.get('/metrics').status_code == 404
+    # per request timings still come back on the response
+    assert 'Server-Timing' in client.get('/metrics').headers
+
+
+def make_app(tmp_path, **config):
+    return create_app('test', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "metrics.db"}', 'SQLALCHEMY_BINDS': {}, **config
+    })
+
+
+def test_metrics_token(tmp_path):
+    client = make_app(tmp_path, METRICS_ENABLED=True, METRICS_TOKEN='s3cret').test_client()
+
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer ünïcode'}).status_code == 401
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert response.status_code == 200
+    assert b'# TYPE' in response.data
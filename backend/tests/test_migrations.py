@@ -0,0 +1,67 @@
+import pytest
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect, text
+
+from splitEx import create_app
+from splitEx.changes import current_seq
+from splitEx.models import MIGRATIONS_DIR, db
+from splitEx.models.balance import Balance
+from splitEx.models.change import ChangeCounter
+from splitEx.models.expense import Expense
+from splitEx.models.user import User
+
+BASELINE_TABLES = {'alembic_version', 'users', 'expenses', 'expense_participants', 'user_expenses'}
+
+
+@pytest.fixture
+def unmigrated_app(tmp_path):
+    app = create_app('test', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "test.db"}',
+        'SQLALCHEMY_BINDS': {},
+        'AUTO_MIGRATE': False,
+    })
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def expense_indexes():
+    return {index['name'] for index in inspect(db.engine).get_indexes('expenses')}
+
+
+def test_initial_revision_is_the_baseline_schema(unmigrated_app):
+    upgrade(directory=MIGRATIONS_DIR, revision='0001')
+    assert set(inspect(db.engine).get_table_names()) == BASELINE_TABLES
+    assert 'ix_expenses_date_id' not in expense_indexes()
+
+
+@pytest.mark.parametrize('made_by_create_all', [(), ('feed index',), ('feed index', 'balances')])
+def test_pre_migration_databases_upgrade_after_stamp(unmigrated_app, made_by_create_all):
+    # a db.create_all() database from before migrations, at one of the points
+    # the models went through: the 0001 schema plus what was added since
+    upgrade(directory=MIGRATIONS_DIR, revision='0001')
+    if 'feed index' in made_by_create_all:
+        next(index for index in Expense.__table__.indexes if index.name == 'ix_expenses_date_id').create(db.engine)
+    if 'balances' in made_by_create_all:
+        Balance.__table__.create(db.engine)
+
+    stamp(directory=MIGRATIONS_DIR, revision='0001')
+    upgrade(directory=MIGRATIONS_DIR)
+
+    assert 'ix_expenses_date_id' in expense_indexes()
+    assert 'ix_balances_debtor_id' in {index['name'] for index in inspect(db.engine).get_indexes('balances')}
+
+
+def test_change_counters_continue_from_the_shared_counter(unmigrated_app):
+    upgrade(directory=MIGRATIONS_DIR, revision='0009')
+    user = User(email='alice@example.com', username='alice', name='alice', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    db.session.execute(text('UPDATE change_counter SET value = 7, purged_through = 3'))
+    db.session.commit()
+
+    upgrade(directory=MIGRATIONS_DIR)
+
+    # a `since` of 7 handed out before stays valid, the next entry is 8
+    assert current_seq(user.id) == 7
+    assert db.session.get(ChangeCounter, user.id).purged_through == 3
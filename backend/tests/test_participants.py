@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.mark.parametrize('amount', [12.5, '300', True, None])
+def test_add_and_update_reject_amounts_that_are_not_integers(client, make_user, amount):
+    _, headers = make_user('alice')
+    make_user('bob')
+    make_user('carol')
+    created = client.post('/api/expenses/', json={
+        'title': 'dinner', 'total_amount': 1000, 'split_method': 'unequal'
+    }, headers=headers)
+    expense_id = created.json['expense_id']
+    client.post(f'/api/participants/{expense_id}/add', json={'username': 'bob', 'amount': 300}, headers=headers)
+
+    added = client.post(f'/api/participants/{expense_id}/add', json={'username': 'carol', 'amount': amount},
+                        headers=headers)
+    updated = client.put(f'/api/participants/{expense_id}/update/bob', json={'amount': amount}, headers=headers)
+
+    for response in (added, updated):
+        assert response.status_code == 400
+        assert response.json['error'] == 'Amounts must be integers (minor units)'
+    participants = client.get(f'/api/expenses/{expense_id}', headers=headers).json['participants']
+    assert sorted(participant['amount'] for participant in participants) == [300, 1000]
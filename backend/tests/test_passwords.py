@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from splitEx.passwords import PasswordPool, PasswordPoolSaturated, PasswordPoolTimeout
+
+
+def slow_echo(value, seconds):
+    time.sleep(seconds)
+    return value
+
+
+@pytest.fixture
+def pool():
+    pool = PasswordPool(workers=1, queue_depth=0, timeout=0.2)
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_runs_jobs(pool):
+    assert pool.run(slow_echo, 'done', 0) == 'done'
+
+
+def test_slot_held_until_timed_out_job_finishes(pool):
+    with pytest.raises(PasswordPoolTimeout):
+        pool.run(slow_echo, 'slow', 1)
+
+    # the timed out job still runs in the pool and keeps its slot
+    with pytest.raises(PasswordPoolSaturated):
+        pool.run(slow_echo, 'next', 0)
+
+    time.sleep(1.2)
+    assert pool.run(slow_echo, 'next', 0) == 'next'
+
+
+class FailingPool:
+    def __init__(self, error):
+        self.error = error
+
+    def run(self, fn, *args):
+        raise self.error()
+
+
+@pytest.mark.parametrize('error, status', [(PasswordPoolSaturated, 429), (PasswordPoolTimeout, 503)])
+def test_busy_pool_statuses(app, client, make_user, error, status):
+    make_user('alice')
+    app.extensions['password_pool'] = FailingPool(error)
+
+    login = client.post('/api/auth/login', json={'email': 'alice@example.com', 'password': 'Secret123'})
+    register = client.post('/api/auth/register', json={
+        'username': 'bob', 'email': 'bob@example.com', 'password': 'Secret123'
+    })
+    for response in (login, register):
+        assert response.status_code == status
+        assert 'Retry-After' in response.headers
@@ -0,0 +1,15 @@
+from sqlalchemy import text
+
+from benchmarks.seed import seed
+from splitEx.models import db
+from splitEx.query_plans import check_plans, hot_queries
+
+
+def test_hot_queries_use_indexes_on_seeded_data(app):
+    seed(users=30, expenses=300, groups=3, seed=1)
+    # planner statistics of the seeded tables, as on a live database
+    with db.engine.begin() as connection:
+        connection.execute(text('ANALYZE'))
+
+    assert len(hot_queries()) >= 20
+    assert check_plans() == {}
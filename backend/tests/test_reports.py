@@ -0,0 +1,49 @@
+import shutil
+
+import pytest
+
+from splitEx import create_app
+from splitEx.models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """an app with a read replica that only catches up when told to (catch_up())"""
+    primary, replica = tmp_path / 'primary.db', tmp_path / 'replica.db'
+    app = create_app('test', {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{primary}',
+        'SQLALCHEMY_BINDS': {'replica': f'sqlite:///{replica}'},
+    })
+
+    def catch_up():
+        db.engines['replica'].dispose()
+        shutil.copyfile(primary, replica)
+
+    app.catch_up = catch_up
+    with app.app_context():
+        catch_up()
+        yield app
+        db.session.remove()
+
+
+def _request(app, method, url, **kwargs):
+    """a request in its own app context (own g), like requests of a real server"""
+    with app.app_context():
+        return app.test_client().open(url, method=method, **kwargs)
+
+
+def test_report_read_from_a_lagging_replica_is_not_cached(app, make_user):
+    _, payer = make_user('payer')
+    _, friend = make_user('friend')
+    app.catch_up()
+
+    created = _request(app, 'POST', '/api/expenses/', json={'title': 'dinner', 'total_amount': 1000}, headers=payer)
+    _request(app, 'POST', f'/api/participants/{created.json["expense_id"]}/add',
+             json={'username': 'friend'}, headers=payer)
+
+    # friend didn't write, reads the replica, which hasn't seen the expense yet
+    assert _request(app, 'GET', '/api/reports/', headers=friend).json['rows'] == []
+
+    app.catch_up()
+    rows = _request(app, 'GET', '/api/reports/', headers=friend).json['rows']
+    assert [(row['expense_count'], row['share']) for row in rows] == [(1, 500)]
@@ -0,0 +1,24 @@
+from splitEx.models import db
+
+
+def test_rename_moves_the_etag(client, make_user):
+    _, headers = make_user('alice')
+    bob, _ = make_user('bob')
+    expense_id = client.post('/api/expenses/', json={'title': 'lunch', 'total_amount': 100}, headers=headers).json['expense_id']
+    client.post(f'/api/participants/{expense_id}/add', json={'username': 'bob'}, headers=headers)
+
+    paths = [f'/api/expenses/{expense_id}', f'/api/participants/{expense_id}/participants']
+    etags = {path: client.get(path, headers=headers).headers['ETag'] for path in paths}
+    batch = client.get(f'/api/expenses/batch?ids={expense_id}', headers=headers)
+    for path, etag in etags.items():
+        assert client.get(path, headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    bob.username, bob.name = 'robert', 'Robert'
+    db.session.commit()
+
+    for path, etag in etags.items():
+        response = client.get(path, headers={**headers, 'If-None-Match': etag})
+        assert response.status_code == 200
+        assert b'robert' in response.data and b'"bob"' not in response.data
+    renamed = client.get(f'/api/expenses/batch?ids={expense_id}', headers=headers)
+    assert b'"bob"' in batch.data and b'robert' in renamed.data and b'"bob"' not in renamed.data
@@ -0,0 +1,32 @@
+import pytest
+
+from splitEx.user_search import _prefix_upper
+
+
+def search(client, headers, query):
+    response = client.get('/api/participants/search', query_string={'q': query}, headers=headers)
+    assert response.status_code == 200
+    return [user['username'] for user in response.json['users']]
+
+
+def test_query_is_folded_like_the_index(client, make_user):
+    _, headers = make_user('payer')
+    make_user('Emma')
+    make_user('Émile')
+
+    assert search(client, headers, 'EM') == ['Emma']
+    # sqlite's lower() keeps non ascii letters as they are, so must the query
+    assert search(client, headers, 'Ém') == ['Émile']
+
+
+@pytest.mark.parametrize('query', ['\U0010ffff', 'a\U0010ffff', '퟿'])
+def test_prefixes_at_the_end_of_a_code_point_range(client, make_user, query):
+    _, headers = make_user('payer')
+    assert search(client, headers, query) == []
+
+
+def test_prefix_upper_bound():
+    assert _prefix_upper('ab') == 'ac'
+    assert _prefix_upper('a\U0010ffff') == 'b'
+    assert _prefix_upper('퟿') == ''
+    assert _prefix_upper('\U0010ffff') is None
@@ -0,0 +1,10 @@
+from splitEx import create_app
+from splitEx.jobs import work
+import os
+
+app = create_app(os.environ.get("CONFIG", "prod"))
+
+
+if __name__ == "__main__":
+  with app.app_context():
+    work()